@@ -0,0 +1,91 @@
+"""
+Benchmark: search_candidates with and without build_database.py's
+extra_hashes on simulated loose / tight detections of reference images.
+
+    python build_database.py <image folder> --out /tmp/db.csv
+    python benchmarks/bench_augmented_hashes.py <image folder> --csv /tmp/db.csv [--count 200]
+"""
+
+import os
+import sys
+import csv
+import argparse
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import final_main
+from hash_index import build_hash_index
+from build_database import index_images, find_image
+
+INSETS = (-0.04, 0.10)
+PAD = 60
+
+
+def detection_sample(image, rng):
+    h, w = image.shape[:2]
+    photo = cv2.copyMakeBorder(image, PAD, PAD, PAD, PAD, cv2.BORDER_CONSTANT, value=(40, 40, 40))
+    photo = cv2.GaussianBlur(photo, (3, 3), 0)
+    inset = rng.uniform(*INSETS)
+    dx, dy = int(w * inset), int(h * inset)
+    return photo, (PAD + dx, PAD + dy, PAD + w - dx, PAD + h - dy)
+
+
+def run(samples, hash_db):
+    final_main._candidate_scheduler = None
+    correct = early = hashed = 0
+    for card_id, photo, (x1, y1, x2, y2) in samples:
+        crop = photo[y1:y2, x1:x2]
+        contour, clean_quad = final_main.find_card_quad(crop)
+        card = {'contour': contour, 'clean_quad': clean_quad, 'crop_x1': x1, 'crop_y1': y1,
+                'raw_img': crop, 'debug_prefix': 'bench'}
+        (candidates, best), = final_main.search_candidates(photo, [card], hash_db)
+        hashed += len(candidates)
+        if best is None: continue
+        early += best['dist'] <= final_main.EARLY_EXIT_THRESHOLD
+        correct += best['match'] is not None and best['match']['id'] == card_id
+    n = len(samples)
+    return correct / n, early / n, hashed / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hash index with vs without build_database.py's extra hashes.")
+    parser.add_argument('images', help="the reference image folder the database was built from")
+    parser.add_argument('--csv', default=final_main.DATABASE_FILE)
+    parser.add_argument('--count', type=int, default=200)
+    args = parser.parse_args()
+
+    final_main.CANDIDATE_POOL = None
+    final_main.CANDIDATE_STATS_FILE = None
+    final_main.DEBUG_LEVEL = 'off'
+
+    with open(args.csv, 'r', newline='', encoding='utf-8') as f:
+        rows = [row for row in csv.DictReader(f) if row.get('p_hash')]
+    if not any(row.get('extra_hashes') for row in rows):
+        sys.exit(f"{args.csv} has no extra_hashes, build it with build_database.py first")
+
+    by_relpath, by_stem = index_images(args.images)
+    rng = np.random.default_rng(0)
+    with_image = [(row, path) for row in rows for path in [find_image(row, by_relpath, by_stem)] if path]
+    samples = []
+    for i in rng.permutation(len(with_image))[:args.count]:
+        row, path = with_image[i]
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is not None:
+            samples.append((row['id'],) + detection_sample(image, rng))
+
+    main_pairs = [(row['p_hash'], row) for row in rows]
+    main_hashes = {int(h, 16) for h, _ in main_pairs}
+    extra_pairs = [(h, row) for row in rows for h in (row.get('extra_hashes') or '').split() if int(h, 16) not in main_hashes]
+
+    print(f"{len(samples)} simulated detections, box {INSETS[0]:+.0%}..{INSETS[1]:+.0%} inside the card")
+    print(f"{'index':<16}{'hashes':>9}{'top-1':>8}{'early exit':>12}{'candidates':>12}")
+    for label, pairs in (('p_hash only', main_pairs), ('+ extra_hashes', main_pairs + extra_pairs)):
+        hash_db = build_hash_index(pairs, 'brute')
+        accuracy, early, hashed = run(samples, hash_db)
+        print(f"{label:<16}{len(hash_db):>9}{accuracy:>8.3f}{early:>12.3f}{hashed:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
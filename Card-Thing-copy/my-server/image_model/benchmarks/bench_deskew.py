@@ -0,0 +1,113 @@
+"""
+Benchmark: ROTATION_MODE 'sweep' vs 'deskew' on synthetically tilted cards
+(top-1 accuracy, best distance, candidates hashed, time per card).
+
+    python benchmarks/bench_deskew.py [--cards dir] [--count 60] [--perspective 8]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import final_main
+from hash_index import build_hash_index
+
+ANGLES = [-15, -10, -7, -4, -2, 0, 3, 5, 8, 12]
+PHOTO_SIZE = 1100
+
+
+def synthetic_card(seed, w=420, h=590):
+    rng = np.random.default_rng(seed)
+    img = np.zeros((h, w, 3), np.uint8)
+    img[:] = rng.integers(0, 255, 3)
+    for _ in range(25):
+        color = tuple(int(x) for x in rng.integers(0, 255, 3))
+        p1 = tuple(int(x) for x in rng.integers(0, [w, h]))
+        p2 = tuple(int(x) for x in rng.integers(0, [w, h]))
+        cv2.rectangle(img, p1, p2, color, -1)
+    return img
+
+
+def load_cards(folder, count):
+    if not folder:
+        return [synthetic_card(1000 + i) for i in range(count)]
+    names = sorted(n for n in os.listdir(folder) if n.lower().endswith(('.jpg', '.jpeg', '.png')))[:count]
+    cards = [cv2.imread(os.path.join(folder, n)) for n in names]
+    # same size as a card in the synthetic photos
+    return [cv2.resize(c, (420, 590), interpolation=cv2.INTER_AREA) for c in cards if c is not None]
+
+
+def tilted_photo(card, angle, perspective, rng):
+    """(photo, detection box) of card rotated clockwise by angle on a noisy background"""
+    h, w = card.shape[:2]
+    background = cv2.GaussianBlur(rng.integers(20, 90, (PHOTO_SIZE, PHOTO_SIZE, 3)).astype(np.uint8), (0, 0), 3)
+    src = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+    theta = np.radians(angle)
+    rotation = np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+    dst = (src - [w / 2, h / 2]) @ rotation.T + PHOTO_SIZE / 2
+    if perspective:
+        dst += rng.normal(0, perspective, dst.shape)
+    M = cv2.getPerspectiveTransform(src, dst.astype(np.float32))
+    warped = cv2.warpPerspective(card, M, (PHOTO_SIZE, PHOTO_SIZE))
+    mask = cv2.warpPerspective(np.full((h, w), 255, np.uint8), M, (PHOTO_SIZE, PHOTO_SIZE))
+    photo = background.copy()
+    photo[mask > 0] = warped[mask > 0]
+    (x1, y1), (x2, y2) = dst.min(axis=0), dst.max(axis=0)
+    margin = rng.uniform(0.01, 0.06) * w
+    return photo, (int(x1 - margin), int(y1 - margin), int(x2 + margin), int(y2 + margin))
+
+
+def run(mode, samples, hash_db):
+    final_main.ROTATION_MODE = mode
+    correct, hashed, dists, elapsed = 0, 0, [], 0.0
+    for card_id, photo, (x1, y1, x2, y2) in samples:
+        crop = photo[y1:y2, x1:x2]
+        contour, clean_quad = final_main.find_card_quad(crop)
+        card = {'contour': contour, 'clean_quad': clean_quad, 'crop_x1': x1, 'crop_y1': y1,
+                'raw_img': crop, 'debug_prefix': 'bench'}
+        start = time.perf_counter()
+        (candidates, best), = final_main.search_candidates(photo, [card], hash_db)
+        elapsed += time.perf_counter() - start
+        hashed += len(candidates)
+        dists.append(best['dist'] if best else final_main.HASH_SIMILARITY_THRESHOLD + 1)
+        correct += best is not None and best['match'] is not None and best['match']['card'] == card_id
+    n = len(samples)
+    return correct / n, float(np.mean(dists)), hashed / n, elapsed / n * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rotation sweep vs measured deskew on tilted photos.")
+    parser.add_argument('--cards', help="folder of straight card scans (synthetic cards without)")
+    parser.add_argument('--count', type=int, default=60)
+    parser.add_argument('--perspective', type=float, default=8, help="random corner jitter in px for the second run")
+    args = parser.parse_args()
+
+    # every candidate of every card, serially, so both modes do comparable work
+    final_main.ADAPTIVE_CANDIDATES = False
+    final_main.CANDIDATE_POOL = None
+    final_main.DEBUG_LEVEL = 'off'
+
+    cards = load_cards(args.cards, args.count)
+    hash_db = build_hash_index([(final_main.compute_phash(c), {'card': i}) for i, c in enumerate(cards)], 'brute')
+    rng = np.random.default_rng(5)
+
+    for perspective in (0, args.perspective):
+        samples = []
+        for card_id, card in enumerate(cards):
+            for angle in ANGLES:
+                photo, box = tilted_photo(card, angle + rng.uniform(-1, 1), perspective, rng)
+                samples.append((card_id, photo, box))
+        print(f"{len(samples)} photos, perspective jitter {perspective}px")
+        print(f"  {'mode':<8}{'top-1':>8}{'best dist':>11}{'candidates':>12}{'ms/card':>10}")
+        for mode in ('sweep', 'deskew'):
+            accuracy, dist, hashed, ms = run(mode, samples, hash_db)
+            print(f"  {mode:<8}{accuracy:>8.3f}{dist:>11.2f}{hashed:>12.2f}{ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark: detection latency per backend, and box agreement with the
+ultralytics path (box count, worst IoU). Backends that can't load are skipped.
+
+    python benchmarks/bench_detection.py [image ...] [--imgsz 640] [--int8]
+
+Without images the runs/detect/val jpgs are used.
+"""
+
+import os
+import sys
+import glob
+import time
+
+import cv2
+import numpy as np
+
+IMAGE_MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, IMAGE_MODEL_DIR)
+from detection_backends import DETECTION_BACKENDS, make_detector
+
+MODEL_PATH = os.path.join(IMAGE_MODEL_DIR, 'new_best.pt')
+YOLO_CONFIDENCE_THRESHOLD = 0.85
+REPEAT = 5
+
+
+def parse_args(argv):
+    paths, imgsz, int8 = [], 640, False
+    args = iter(argv)
+    for arg in args:
+        if arg == '--imgsz':
+            imgsz = int(next(args))
+        elif arg == '--int8':
+            int8 = True
+        else:
+            paths.append(arg)
+    return paths, imgsz, int8
+
+
+def iou(a, b):
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def compare(reference, detections):
+    """(images with a different box count, worst IoU of greedily matched boxes)"""
+    count_mismatch, worst = 0, 1.0
+    for ref_boxes, boxes in zip(reference, detections):
+        if len(ref_boxes) != len(boxes):
+            count_mismatch += 1
+        unused = list(boxes)
+        for ref in ref_boxes:
+            if not unused: break
+            best = max(unused, key=lambda b: iou(ref, b))
+            worst = min(worst, iou(ref, best))
+            unused.remove(best)
+    return count_mismatch, worst
+
+
+def main():
+    paths, imgsz, int8 = parse_args(sys.argv[1:])
+    paths = paths or sorted(glob.glob(os.path.join(IMAGE_MODEL_DIR, 'runs', 'detect', 'val', '*.jpg')))
+    images = [img for img in (cv2.imread(p) for p in paths) if img is not None]
+    if not images:
+        print("no images")
+        sys.exit(1)
+
+    results = {}
+    for kind in DETECTION_BACKENDS:
+        try:
+            detector = make_detector(kind, MODEL_PATH, imgsz, int8 and kind != 'ultralytics')
+        except Exception as e:
+            print(f"{kind}: skipped ({e})")
+            continue
+
+        detector.detect_batch(images[:1], YOLO_CONFIDENCE_THRESHOLD)
+        single = []
+        for _ in range(REPEAT):
+            for img in images:
+                start = time.perf_counter()
+                detector.detect_batch([img], YOLO_CONFIDENCE_THRESHOLD)
+                single.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            detections = detector.detect_batch(images, YOLO_CONFIDENCE_THRESHOLD)
+        batch_ms = (time.perf_counter() - start) * 1000 / REPEAT / len(images)
+        results[kind] = (np.percentile(single, 50), np.percentile(single, 95), batch_ms, detections)
+
+    reference = results.get('ultralytics', (None,) * 4)[3]
+    print(f"\n{len(images)} images, imgsz {imgsz}{', int8' if int8 else ''}")
+    print(f"{'backend':<13}{'p50 ms':>9}{'p95 ms':>9}{'batched ms/img':>16}{'boxes':>7}{'count diff':>12}{'worst IoU':>11}")
+    for kind, (p50, p95, batch_ms, detections) in results.items():
+        boxes = sum(len(d) for d in detections)
+        if reference is None:
+            diff, worst = '-', '-'
+        else:
+            diff, worst = compare(reference, detections)
+            worst = f"{worst:.3f}"
+        print(f"{kind:<13}{p50:>9.1f}{p95:>9.1f}{batch_ms:>16.1f}{boxes:>7}{diff:>12}{worst:>11}")
+
+
+if __name__ == "__main__":
+    main()
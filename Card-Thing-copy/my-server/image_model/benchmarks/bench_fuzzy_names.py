@@ -0,0 +1,101 @@
+"""
+Benchmark: full Levenshtein scan vs NameIndex on OCR-like queries; every
+result is checked against the scan.
+
+    python benchmarks/bench_fuzzy_names.py
+"""
+
+import os
+import sys
+import csv
+import time
+
+import numpy as np
+import Levenshtein
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from name_index import NameIndex
+
+DATABASE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'optimized_pokemon_database.csv')
+MAX_NAME_DISTANCE = 4
+
+OCR_SAMPLES = [
+    "Dialga V", "Dlalga V", "DialgaV", "Kleavor VSTAR", "Kleavor VSTAP", "Darkrai", "Darkral VSTAR",
+    "Turtwig", "Turtwlg", "Ferroseed", "Ferrosee", "M Charizard EX", "Charizard", "Charlzard ex",
+    "Pikachu", "Pikachv V", "Mewtwo GX", "Mew", "Eevee", "Radiant Charizard", "Professor's Research",
+    "Boss's Orders", "Quick Ball", "Ultra Bal", "Rare Candy", "Arceus VSTAR", "Lugia V", "Umbreon VMAX",
+    "Gardevoir ex", "Snorlax", "Zard", "chu", "Giratina", "Origin Forme Palkia V", "Iron Hands ex",
+    "Mr. Mime", "Farfetch'd", "Nidoran", "Porygon-Z", "Ho-Oh", "Flabébé", "Basic Pikachu 60",
+]
+
+
+def normalize_string(s):
+    if not s: return ""
+    return s.lower().strip()
+
+
+def legacy_matches(target, names):
+    matches = []
+    for name in names:
+        dist = Levenshtein.distance(target, name)
+        is_substring = (target in name) if len(target) > 3 else False
+        if dist <= MAX_NAME_DISTANCE or is_substring:
+            matches.append(name)
+    return matches
+
+
+def load_names(filepath):
+    names = {}
+    with open(filepath, 'r', newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            key = normalize_string(row.get('name', ''))
+            if key: names[key] = True
+    return list(names)
+
+
+def corrupt(name, rng):
+    chars = list(name)
+    for _ in range(rng.integers(0, 4)):
+        op = rng.integers(0, 3)
+        pos = rng.integers(0, len(chars) + 1)
+        letter = chr(rng.integers(ord('a'), ord('z') + 1))
+        if op == 0:
+            chars.insert(pos, letter)
+        elif chars and op == 1:
+            del chars[min(pos, len(chars) - 1)]
+        elif chars:
+            chars[min(pos, len(chars) - 1)] = letter
+    return ''.join(chars)
+
+
+def main():
+    names = load_names(DATABASE_FILE)
+    rng = np.random.default_rng(0)
+    queries = [normalize_string(q) for q in OCR_SAMPLES] + [corrupt(n, rng) for n in names]
+
+    start = time.perf_counter()
+    index = NameIndex(names)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    expected = [legacy_matches(q, names) for q in queries]
+    legacy_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    got = [index.query(q, MAX_NAME_DISTANCE) for q in queries]
+    index_s = time.perf_counter() - start
+
+    for q, e, g in zip(queries, expected, got):
+        assert e == g, (q, e, g)
+
+    per_query = lambda secs: secs / len(queries) * 1000
+    print(f"{len(names)} names, {len(queries)} queries, index built in {build_ms:.0f} ms")
+    print(f"full scan : {per_query(legacy_s):7.3f} ms/query")
+    print(f"name index: {per_query(index_s):7.3f} ms/query  ({legacy_s / index_s:.1f}x faster)")
+    for q in OCR_SAMPLES[:6]:
+        print(f"  {q!r:20} -> {index.query(normalize_string(q), MAX_NAME_DISTANCE)[:6]}")
+    print("candidate names identical")
+
+
+if __name__ == "__main__":
+    main()
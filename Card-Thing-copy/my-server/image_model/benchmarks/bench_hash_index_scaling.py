@@ -0,0 +1,88 @@
+"""
+Benchmark: brute force vs multi-index hashing on synthetic databases grown
+from the real p_hash column; matches are checked to be identical.
+
+    python benchmarks/bench_hash_index_scaling.py [--sizes 20000 200000 2000000] [--queries 200]
+"""
+
+import os
+import sys
+import csv
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from hash_index import BruteForceHashIndex, MultiIndexHashIndex, hash_to_int
+
+DATABASE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'optimized_pokemon_database.csv')
+HASH_SIMILARITY_THRESHOLD = 14
+
+
+def load_real_hashes(filepath):
+    with open(filepath, 'r', newline='', encoding='utf-8') as csvfile:
+        return np.array([hash_to_int(row['p_hash']) for row in csv.DictReader(csvfile) if row.get('p_hash')], dtype=np.uint64)
+
+
+def flip_random_bits(hashes, low, high, rng):
+    flips = rng.integers(low, high + 1, len(hashes))
+    noise = np.zeros(len(hashes), dtype=np.uint64)
+    for bit_count in np.unique(flips):
+        sel = np.flatnonzero(flips == bit_count)
+        for _ in range(bit_count):
+            noise[sel] |= np.uint64(1) << rng.integers(0, 64, len(sel)).astype(np.uint64)
+    return hashes ^ noise
+
+
+def synthetic_db(real, size, rng):
+    if size <= len(real):
+        return real[:size].copy()
+    extra = flip_random_bits(real[rng.integers(0, len(real), size - len(real))], 6, 20, rng)
+    return np.concatenate([real, extra])
+
+
+def time_queries(index, queries):
+    start = time.perf_counter()
+    results = index.best_matches(queries, HASH_SIMILARITY_THRESHOLD)
+    return (time.perf_counter() - start) / len(queries) * 1000, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20000, 200000, 2000000])
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    real = load_real_hashes(DATABASE_FILE)
+
+    print(f"{'rows':>9} | {'mih build':>9} | {'brute ms/q':>10} | {'mih ms/q':>8} | {'speedup':>7} | {'rows touched':>12} | hits")
+    for size in args.sizes:
+        hashes = synthetic_db(real, size, rng)
+        rows = np.arange(len(hashes))
+
+        hits = flip_random_bits(hashes[rng.integers(0, len(hashes), args.queries // 2)], 0, 10, rng)
+        misses = flip_random_bits(real[rng.integers(0, len(real), args.queries - len(hits))], 16, 28, rng)
+        queries = [int(q) for q in np.concatenate([hits, misses])]
+
+        brute = BruteForceHashIndex(hashes, rows)
+        start = time.perf_counter()
+        mih = MultiIndexHashIndex(hashes, rows, radius=HASH_SIMILARITY_THRESHOLD)
+        build_s = time.perf_counter() - start
+
+        brute_ms, brute_results = time_queries(brute, queries)
+        mih_ms, mih_results = time_queries(mih, queries)
+
+        for (b_row, b_dist), (m_row, m_dist) in zip(brute_results, mih_results):
+            assert b_row == m_row and (b_row is None or b_dist == m_dist), (b_row, b_dist, m_row, m_dist)
+
+        touched = np.mean([len(mih.candidates(q, HASH_SIMILARITY_THRESHOLD)) for q in queries]) / len(hashes)
+        found = sum(row is not None for row, _ in mih_results)
+        print(f"{len(hashes):>9} | {build_s:>8.2f}s | {brute_ms:>10.3f} | {mih_ms:>8.3f} | {brute_ms / mih_ms:>6.1f}x | {touched:>11.2%} | {found}/{len(queries)}")
+
+    print("matches within threshold identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: per-row ImageHash scan vs the packed uint64 index, results checked
+against the scan.
+
+    python benchmarks/bench_hash_search.py [--cards 50]
+"""
+
+import os
+import sys
+import csv
+import time
+import argparse
+
+import numpy as np
+import imagehash
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from hash_index import BruteForceHashIndex
+
+DATABASE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'optimized_pokemon_database.csv')
+HASH_SIMILARITY_THRESHOLD = 14
+CANDIDATES_PER_CARD = 11
+
+
+def legacy_find_best_hash_match(cropped_card_hash, database):
+    best_match = None
+    smallest_distance = float('inf')
+    for db_hash, card_info in database.items():
+        distance = cropped_card_hash - db_hash
+        if distance < smallest_distance:
+            smallest_distance = distance
+            best_match = card_info
+    if best_match and smallest_distance <= HASH_SIMILARITY_THRESHOLD:
+        return best_match, smallest_distance
+    return None, smallest_distance
+
+
+def load_rows(filepath):
+    with open(filepath, 'r', newline='', encoding='utf-8') as csvfile:
+        return [row for row in csv.DictReader(csvfile) if row.get('p_hash')]
+
+
+def make_queries(rows, count, seed=0):
+    rng = np.random.default_rng(seed)
+    queries = []
+    for _ in range(count):
+        bits = imagehash.hex_to_hash(rows[rng.integers(len(rows))]['p_hash']).hash.copy()
+        flips = rng.integers(0, 24)
+        flat = bits.reshape(-1)
+        flat[rng.choice(64, flips, replace=False)] ^= True
+        queries.append(imagehash.ImageHash(bits))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cards', type=int, default=50)
+    args = parser.parse_args()
+
+    rows = load_rows(DATABASE_FILE)
+    legacy_db = {}
+    for row in rows:
+        legacy_db[imagehash.hex_to_hash(row['p_hash'])] = row
+    index = BruteForceHashIndex.from_pairs((row['p_hash'], row) for row in rows)
+    print(f"{len(index)} hashes, {args.cards} cards x {CANDIDATES_PER_CARD} candidates")
+
+    queries = make_queries(rows, args.cards * CANDIDATES_PER_CARD)
+
+    start = time.perf_counter()
+    legacy = [legacy_find_best_hash_match(q, legacy_db) for q in queries]
+    legacy_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    packed = []
+    for i in range(0, len(queries), CANDIDATES_PER_CARD):
+        packed.extend(index.best_matches(queries[i:i + CANDIDATES_PER_CARD], HASH_SIMILARITY_THRESHOLD))
+    packed_s = time.perf_counter() - start
+
+    for (l_match, l_dist), (p_match, p_dist) in zip(legacy, packed):
+        assert l_dist == p_dist and l_match is p_match, (l_match, l_dist, p_match, p_dist)
+
+    per_card = lambda secs: secs / args.cards * 1000
+    print(f"legacy scan : {per_card(legacy_s):8.2f} ms/card")
+    print(f"packed index: {per_card(packed_s):8.2f} ms/card  ({legacy_s / packed_s:.0f}x faster)")
+    print("results identical")
+
+
+if __name__ == "__main__":
+    main()
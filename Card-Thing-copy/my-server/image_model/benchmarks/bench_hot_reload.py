@@ -0,0 +1,101 @@
+"""
+Benchmark: a database change in a running process. Lookups run while the csv
+is replaced, then the same change is applied as a delta; compared with a
+cold load of the new csv.
+
+    python benchmarks/bench_hot_reload.py [--csv db.csv] [--changed 200] [--threads 2]
+"""
+
+import os
+import sys
+import csv
+import time
+import shutil
+import random
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import final_main
+from live_database import LiveDatabase
+
+
+def lookup_loop(live, probe, stop, latencies):
+    query = [int(probe['p_hash'], 16)]
+    name = probe['name']
+    while not stop.is_set():
+        snapshot = live.current()
+        start = time.perf_counter()
+        snapshot.hash_db.best_matches(query, final_main.HASH_SIMILARITY_THRESHOLD)
+        final_main.find_candidates_fuzzy(name, '', snapshot.text_db)
+        latencies.append((time.perf_counter(), (time.perf_counter() - start) * 1000))
+
+
+def percentiles(values):
+    if not values:
+        return "-"
+    return f"p50 {np.percentile(values, 50):.2f} ms  p99 {np.percentile(values, 99):.2f} ms  max {max(values):.2f} ms  (n={len(values)})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot reload / delta vs restart for a changed card database.")
+    parser.add_argument('--csv', default=final_main.DATABASE_FILE)
+    parser.add_argument('--changed', type=int, default=200, help="rows re-hashed in the new csv")
+    parser.add_argument('--threads', type=int, default=2)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix='hot_reload_')
+    path = os.path.join(folder, 'db.csv')
+    shutil.copy(args.csv, path)
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        columns, rows = reader.fieldnames, [row for row in reader if row.get('p_hash')]
+    rng = random.Random(0)
+    changed = [dict(row, p_hash='%016x' % rng.getrandbits(64)) for row in rng.sample(rows, min(args.changed, len(rows)))]
+    by_id = {row['id']: row for row in changed}
+    new_path = os.path.join(folder, 'new.csv')
+    with open(new_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(by_id.get(row['id'], row) for row in rows)
+
+    start = time.perf_counter()
+    final_main.load_dual_database(new_path)
+    print(f"restart: cold load of the new csv {(time.perf_counter() - start) * 1000:.1f} ms (+ YOLO / OCR load, not measured)")
+
+    live = LiveDatabase(path, final_main.load_dual_database, check_interval=0.2)
+    stop, latencies = threading.Event(), []
+    threads = [threading.Thread(target=lookup_loop, args=(live, rows[0], stop, latencies)) for _ in range(args.threads)]
+    for thread in threads: thread.start()
+    time.sleep(1.0)
+
+    version = live.version
+    changed_at = time.perf_counter()
+    shutil.copy(new_path, path + '.new')
+    os.replace(path + '.new', path)
+    while live.version == version and time.perf_counter() - changed_at < 60:
+        time.sleep(0.005)
+    swapped_at = time.perf_counter()
+    time.sleep(0.5)
+    stop.set()
+    for thread in threads: thread.join()
+
+    print(f"reload: swapped {(swapped_at - changed_at) * 1000:.0f} ms after the change "
+          f"(load + warm-up {live.stats()['last_reload_ms']} ms, the rest is the check interval)")
+    print(f"  lookups before: {percentiles([ms for t, ms in latencies if t < changed_at])}")
+    print(f"  lookups during: {percentiles([ms for t, ms in latencies if changed_at <= t <= swapped_at])}")
+    print(f"  lookups after:  {percentiles([ms for t, ms in latencies if t > swapped_at])}")
+
+    live.reload(force=True)
+    start = time.perf_counter()
+    live.apply_delta([dict(row, p_hash='%016x' % rng.getrandbits(64)) for row in changed])
+    print(f"delta: {len(changed)} rows applied in {(time.perf_counter() - start) * 1000:.1f} ms, no reload")
+    live.close()
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark: OCR name reading in name_mode='detect' vs 'recognize' on labelled
+card crops (accuracy, p50 / p95 latency, detection fallbacks).
+
+    python benchmarks/bench_ocr_modes.py <sample_dir> [labels.csv]
+
+labels.csv (default <sample_dir>/labels.csv): header "file,name", one row per image.
+"""
+
+import os
+import sys
+import csv
+import time
+
+import cv2
+import numpy as np
+import Levenshtein
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pokemon_card_ocr import PokemonCardOCR
+
+OCR_CONFIDENCE_THRESHOLD = 0.6
+MODES = ['detect', 'recognize']
+
+
+def normalize_string(s):
+    if not s: return ""
+    return s.lower().strip()
+
+
+def parse_name(text):
+    # same split as final_main.parse_ocr_result: the last token with a digit starts the number
+    words = text.split()
+    for i, word in enumerate(reversed(words)):
+        if any(c.isdigit() for c in word):
+            return " ".join(words[:-(i + 1)])
+    return text
+
+
+def load_samples(sample_dir, labels_path):
+    samples = []
+    with open(labels_path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            img = cv2.imread(os.path.join(sample_dir, row['file']))
+            if img is None:
+                print(f"skipping {row['file']}: can't read it")
+                continue
+            samples.append((row['file'], img, row['name']))
+    return samples
+
+
+def score(results, samples):
+    exact = near = 0
+    for result, (_, _, label) in zip(results, samples):
+        name = normalize_string(parse_name(result['text']))
+        exact += name == normalize_string(label)
+        near += Levenshtein.distance(name, normalize_string(label)) <= 2
+    return exact / len(samples), near / len(samples)
+
+
+def run_mode(mode, samples):
+    start = time.perf_counter()
+    ocr = PokemonCardOCR(use_gpu=False, name_mode=mode, rec_min_confidence=OCR_CONFIDENCE_THRESHOLD)
+    init_s = time.perf_counter() - start
+    if ocr.ocr is None:
+        return None
+    if mode == 'recognize' and ocr.rec is None:
+        print("no recognition-only model, 'recognize' would just be 'detect'")
+        return None
+
+    latencies, results = [], []
+    for _, img, _ in samples:
+        start = time.perf_counter()
+        results.append(ocr.extract_text_from_card(img))
+        latencies.append((time.perf_counter() - start) * 1000)
+    fallbacks = ocr.detection_fallbacks
+
+    start = time.perf_counter()
+    batch_results = ocr.extract_text_batch([img for _, img, _ in samples])
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        'rec_model': ocr._rec_model()[0] if ocr.rec_kind == 'module' else ocr.rec_kind,
+        'init_s': init_s,
+        'accuracy': score(results, samples),
+        'batch_accuracy': score(batch_results, samples),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'batch_ms_per_card': batch_ms / len(samples),
+        'detection_fallbacks': fallbacks,
+        'misread': [(name, label, r['text']) for (name, _, label), r in zip(samples, results)
+                    if normalize_string(parse_name(r['text'])) != normalize_string(label)],
+    }
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(2)
+    sample_dir = sys.argv[1]
+    labels_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(sample_dir, 'labels.csv')
+    samples = load_samples(sample_dir, labels_path)
+    if not samples:
+        print("no samples")
+        sys.exit(1)
+
+    report = {mode: run_mode(mode, samples) for mode in MODES}
+
+    print(f"\n{len(samples)} labelled cards")
+    print(f"{'mode':<11}{'exact':>7}{'<=2 ed':>8}{'batch':>7}{'p50 ms':>9}{'p95 ms':>9}{'batch ms/card':>15}{'det. fallbacks':>16}{'init s':>8}")
+    for mode, r in report.items():
+        if r is None:
+            print(f"{mode:<11}  unavailable")
+            continue
+        fallbacks = r['detection_fallbacks'] if mode == 'recognize' else '-'
+        print(f"{mode:<11}{r['accuracy'][0]:>7.2f}{r['accuracy'][1]:>8.2f}{r['batch_accuracy'][0]:>7.2f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['batch_ms_per_card']:>15.1f}{fallbacks:>16}{r['init_s']:>8.1f}")
+    if report['recognize']:
+        print(f"recognition-only model: {report['recognize']['rec_model']}")
+    for mode, r in report.items():
+        if r and r['misread']:
+            print(f"\n{mode} misreads:")
+            for name, label, text in r['misread']:
+                print(f"  {name}: expected '{label}', got '{text}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Equality check + timings: imagehash.phash via PIL vs native_phash.
+
+    python benchmarks/bench_phash.py [image_dir ...]
+"""
+
+import os
+import sys
+import glob
+import time
+
+import cv2
+import numpy as np
+import imagehash
+from PIL import Image
+
+IMAGE_MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, IMAGE_MODEL_DIR)
+from native_phash import phash_bgr, phash_bgr_batch
+
+DEFAULT_DIRS = [
+    os.path.join(IMAGE_MODEL_DIR, 'runs', 'detect', '*'),
+    os.path.join(IMAGE_MODEL_DIR, '..', '..', 'my-client', 'src', 'images'),
+]
+CANDIDATES_PER_CARD = 11
+
+
+def imagehash_phash(image_bgr):
+    """The path identify_smart_hybrid used before: BGR -> RGB -> PIL -> imagehash."""
+    return int(str(imagehash.phash(Image.fromarray(cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)))), 16)
+
+
+def synthetic_card(rng, w, h):
+    img = np.zeros((h, w, 3), np.uint8)
+    img[:] = rng.integers(0, 255, 3)
+    for _ in range(25):
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        p1 = tuple(int(v) for v in rng.integers(0, [w, h]))
+        p2 = tuple(int(v) for v in rng.integers(0, [w, h]))
+        cv2.rectangle(img, p1, p2, color, -1)
+    return img
+
+
+def sample_images(dirs, rng):
+    images = []
+    for pattern in dirs:
+        for path in sorted(glob.glob(os.path.join(pattern, '*'))):
+            if path.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
+                img = cv2.imread(path)
+                if img is not None: images.append(img)
+    for img in list(images):
+        h, w = img.shape[:2]
+        images.append(img[rng.integers(0, h // 3 + 1):, rng.integers(0, w // 3 + 1):])
+    for _ in range(50):
+        images.append(synthetic_card(rng, int(rng.integers(8, 1000)), int(rng.integers(8, 1400))))
+    images.append(np.zeros((40, 32, 3), np.uint8))
+    images.append(np.full((32, 32, 3), 77, np.uint8))
+    images.append(rng.integers(0, 255, (32, 50, 3), dtype=np.uint8))
+    return images
+
+
+def time_ms(fn, repeat=10):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat): fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    images = sample_images(sys.argv[1:] or DEFAULT_DIRS, rng)
+
+    expected = [imagehash_phash(img) for img in images]
+    single = [phash_bgr(img) for img in images]
+    batch = [int(h) for h in phash_bgr_batch(images)]
+    mismatches = sum(e != s or e != b for e, s, b in zip(expected, single, batch))
+    print(f"{len(images)} images, {mismatches} mismatches")
+    assert mismatches == 0
+
+    # one card's worth of candidates at phone-crop resolution
+    card = synthetic_card(rng, 700, 980)
+    candidates = [card[i * 10:, i * 8:] for i in range(CANDIDATES_PER_CARD)]
+    legacy_ms = time_ms(lambda: [imagehash_phash(c) for c in candidates])
+    native_ms = time_ms(lambda: phash_bgr_batch(candidates))
+    print(f"imagehash (PIL) : {legacy_ms:7.2f} ms per {CANDIDATES_PER_CARD} candidates")
+    print(f"native batch    : {native_ms:7.2f} ms per {CANDIDATES_PER_CARD} candidates  ({legacy_ms / native_ms:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Memory report: RSS / PSS / USS of --workers processes that each load the
+card database as csv dicts, compiled with per-process indexes, or fully
+mapped (linux only, /proc/self/smaps_rollup).
+
+    python benchmarks/bench_worker_memory.py [--workers 4] [--rows 200000] [--hash-index mih]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = ('csv', 'per_proc', 'mapped')
+OCR_SAMPLES = [
+    "Dialga V", "Dlalga V", "Kleavor VSTAP", "Darkral VSTAR", "Turtwlg", "Charlzard ex",
+    "Pikachv V", "Mewtwo GX", "Ultra Bal", "Professor's Research", "Gardevoir ex", "Zard",
+]
+
+
+def memory_mb():
+    """{'rss', 'pss', 'uss'} of this process in MB"""
+    values = {}
+    with open('/proc/self/smaps_rollup', 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {'rss': values.get('Rss', 0.0), 'pss': values.get('Pss', 0.0),
+            'uss': values.get('Private_Clean', 0.0) + values.get('Private_Dirty', 0.0)}
+
+
+def load(mode, csv_path, hash_index):
+    import final_main
+    from card_database import load_card_database
+    from hash_index import make_hash_index
+    from name_index import NameIndex
+
+    final_main.HASH_INDEX = hash_index
+    if mode == 'csv':
+        return final_main.load_dual_database_csv(csv_path)
+    if mode == 'mapped':
+        return final_main.load_compiled_database(csv_path)
+    card_db = load_card_database(csv_path)
+    hash_db = make_hash_index(card_db.hashes, card_db.hash_row_sequence(), hash_index,
+                              radius=final_main.HASH_SIMILARITY_THRESHOLD)
+    text_db = card_db.text_index()
+    text_db.__dict__['name_index'] = NameIndex(list(text_db))
+    return hash_db, text_db
+
+
+def worker(mode, csv_path, hash_index, barrier, results):
+    # keep the pipeline's prints out of the report
+    sys.stdout = open(os.devnull, 'w')
+    import final_main  # noqa: F401, imports (cv2, numpy, ..) are not part of the database cost
+
+    before = memory_mb()
+    start = time.perf_counter()
+    hash_db, text_db = load(mode, csv_path, hash_index)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    rng = np.random.default_rng(os.getpid())
+    queries = [int(h) ^ (1 << int(rng.integers(0, 64))) for h in hash_db.hashes[rng.integers(0, len(hash_db), 64)]]
+    hash_db.best_matches(queries, final_main.HASH_SIMILARITY_THRESHOLD)
+    for sample in OCR_SAMPLES:
+        name, number = final_main.parse_ocr_result(sample)
+        final_main.find_candidates_fuzzy(name, number, text_db)
+
+    # every worker is loaded when they are measured, so PSS is split between all of them
+    barrier.wait()
+    after = memory_mb()
+    barrier.wait()
+    results.put({'mode': mode, 'load_ms': load_ms, 'before': before, 'after': after})
+
+
+def run_mode(mode, csv_path, hash_index, workers):
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, csv_path, hash_index, barrier, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    reports = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return reports
+
+
+def summarize(reports):
+    delta = {key: [r['after'][key] - r['before'][key] for r in reports] for key in ('rss', 'pss', 'uss')}
+    return {
+        'load_ms': float(np.mean([r['load_ms'] for r in reports])),
+        'rss_mb': float(np.mean(delta['rss'])),
+        'pss_mb': float(np.mean(delta['pss'])),
+        'uss_mb': float(np.mean(delta['uss'])),
+        'total_pss_mb': float(np.sum(delta['pss'])),
+    }
+
+
+def main():
+    import final_main
+    parser = argparse.ArgumentParser(description="Per-worker memory of the card database.")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--csv', default=final_main.DATABASE_FILE)
+    parser.add_argument('--rows', type=int, default=0, help="scale the csv up to this many synthetic rows first")
+    parser.add_argument('--hash-index', default='mih', choices=('brute', 'mih'))
+    parser.add_argument('--modes', default=','.join(MODES))
+    args = parser.parse_args()
+
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        sys.exit("needs /proc/self/smaps_rollup (linux)")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = args.csv
+        if args.rows:
+            from regression_suite import write_synthetic_csv
+            csv_path = os.path.join(tmp_dir, f"synthetic_{args.rows}.csv")
+            write_synthetic_csv(args.csv, args.rows, csv_path, np.random.default_rng(0))
+        # compile once up front so no worker pays for it
+        from card_database import load_card_database
+        load_card_database(csv_path)
+
+        print(f"{args.workers} workers, {csv_path}, hash index '{args.hash_index}'")
+        print(f"{'mode':<10} {'load ms':>9} {'rss MB':>9} {'pss MB':>9} {'uss MB':>9} {'pss total':>10}   (per worker, after - before load)")
+        for mode in args.modes.split(','):
+            s = summarize(run_mode(mode, csv_path, args.hash_index, args.workers))
+            print(f"{mode:<10} {s['load_ms']:>9.1f} {s['rss_mb']:>9.1f} {s['pss_mb']:>9.1f} {s['uss_mb']:>9.1f} {s['total_pss_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Benchmark + accuracy regression suite for final_main.
+
+  pipeline  - recognize_image_bytes on every labelled photo: top-1 accuracy,
+              throughput, latency per photo and per stage
+  db_<rows> - load / hash search / fuzzy search / identify on synthetic
+              scaled-up databases (real rows with mutated names and hashes)
+  ocr       - the OCR pool on the labelled crops, when PaddleOCR is installed
+
+With --baseline, any latency / RSS figure above it by more than --tolerance,
+throughput below it or accuracy drop is listed and the exit code is 1.
+
+    python benchmarks/regression_suite.py [labelled_dir] [--labels labels.csv] [--sizes 20000 200000]
+                                          [--repeat 3] [--baseline file.json] [--save-baseline] [--tolerance 0.15]
+
+labels.csv: header "file,id", one row per photo, an empty id = no card expected.
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+IMAGE_MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, IMAGE_MODEL_DIR)
+import final_main
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'regression_baseline.json')
+HASH_QUERIES = 500
+# differences below these never count as a regression, sub-millisecond timings are mostly noise
+MIN_DELTA_MS = 1.0
+MIN_DELTA_RSS_MB = 20.0
+NAME_LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+OCR_SAMPLES = [
+    "Dialga V", "Dlalga V 114/189", "Kleavor VSTAP", "Darkral VSTAR", "Turtwlg", "Charlzard ex 223",
+    "Pikachv V", "Mewtwo GX", "Ultra Bal", "Professor's Research", "Gardevoir ex", "Basic Pikachu 60",
+]
+
+
+def percentiles(values):
+    if not values:
+        return None
+    return {'n': len(values), 'mean': float(np.mean(values)), 'p50': float(np.percentile(values, 50)),
+            'p95': float(np.percentile(values, 95)), 'p99': float(np.percentile(values, 99))}
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def load_samples(labelled_dir, labels_path):
+    samples = []
+    with open(labels_path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            path = os.path.join(labelled_dir, row['file'])
+            try:
+                with open(path, 'rb') as img:
+                    samples.append((row['file'], img.read(), (row.get('id') or '').strip() or None))
+            except OSError:
+                print(f"skipping {row['file']}: can't read it")
+    return samples
+
+
+# --- full pipeline ---
+
+def bench_pipeline(samples, resources, repeat):
+    metrics = final_main.get_stage_metrics()
+    latencies, stage_ms, correct = [], {}, 0
+    start = time.perf_counter()
+    for run in range(repeat):
+        for name, image_bytes, expected in samples:
+            t = time.perf_counter()
+            with metrics.request(name) as profile:
+                _, output = final_main.recognize_image_bytes(image_bytes, resources)
+            latencies.append((time.perf_counter() - t) * 1000)
+            for stage_name, (ms, _) in profile.stages.items():
+                stage_ms.setdefault(stage_name, []).append(ms)
+            if run == 0:
+                correct += (output or {}).get('id') == expected
+    elapsed = time.perf_counter() - start
+    return {
+        'images': len(samples),
+        'top1_accuracy': correct / len(samples),
+        'throughput_per_s': len(latencies) / elapsed,
+        'latency_ms': percentiles(latencies),
+        'stage_latency_ms': {name: percentiles(values) for name, values in sorted(stage_ms.items())},
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def detected_cards(samples, model):
+    """(expected id, photo, crop, contour, x1, y1) of the first detection of every photo, the identify_smart_hybrid inputs"""
+    cards = []
+    for _, image_bytes, expected in samples:
+        image = final_main.decode_image(image_bytes)
+        if image is None: continue
+        detections = final_main.detect_cards(model, image)
+        if not detections: continue
+        x1, y1, x2, y2, _ = detections[0]
+        crop = image[y1:y2, x1:x2]
+        cards.append((expected, image, crop, final_main.find_card_contour(crop), x1, y1))
+    return cards
+
+
+# --- synthetic databases ---
+
+def mutate_name(name, rng):
+    letters = list(name)
+    for _ in range(int(rng.integers(1, 4))):
+        if not letters: break
+        letters[int(rng.integers(0, len(letters)))] = NAME_LETTERS[int(rng.integers(0, len(NAME_LETTERS)))]
+    return ''.join(letters)
+
+
+def flip_bits(value, count, rng):
+    for bit in rng.choice(64, size=count, replace=False):
+        value ^= 1 << int(bit)
+    return value
+
+
+def write_synthetic_csv(src_path, size, out_path, rng):
+    with open(src_path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        fields = reader.fieldnames
+        real = list(reader)
+    with open(out_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(real)
+        for i in range(max(0, size - len(real))):
+            row = dict(real[int(rng.integers(0, len(real)))])
+            row['id'] = f"syn{i}-{row['id']}"
+            row['lookup_key'] = f"syn{i}_{row['lookup_key']}"
+            row['name'] = mutate_name(row['name'], rng)
+            if row.get('p_hash'):
+                row['p_hash'] = '%016x' % flip_bits(int(row['p_hash'], 16), int(rng.integers(6, 21)), rng)
+            writer.writerow(row)
+
+
+def timed_ms(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def bench_database(size, tmp_dir, cards, rng):
+    csv_path = os.path.join(tmp_dir, f"synthetic_{size}.csv")
+    write_synthetic_csv(final_main.DATABASE_FILE, size, csv_path, rng)
+
+    cold_ms, (hash_db, text_db) = timed_ms(final_main.load_dual_database, csv_path)
+    warm_ms, (hash_db, text_db) = timed_ms(final_main.load_dual_database, csv_path)
+
+    # near duplicates of database hashes, 0-10 bits off
+    picked = hash_db.hashes[rng.integers(0, len(hash_db.hashes), HASH_QUERIES)]
+    queries = [flip_bits(int(h), int(rng.integers(0, 11)), rng) for h in picked]
+    hash_ms = [timed_ms(final_main.find_best_hash_match, q, hash_db)[0] for q in queries]
+
+    fuzzy_ms = []
+    for text in OCR_SAMPLES:
+        est_name, est_num = final_main.parse_ocr_result(text)
+        fuzzy_ms.append(timed_ms(final_main.find_candidates_fuzzy, est_name, est_num, text_db)[0])
+
+    identify_ms, correct = [], 0
+    for expected, image, crop, contour, x1, y1 in cards:
+        crop_rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        ms, (match, _, _) = timed_ms(final_main.identify_smart_hybrid, image, contour, x1, y1, crop_rgb,
+                                     hash_db, text_db, "bench", tmp_dir, None)
+        identify_ms.append(ms)
+        correct += (match or {}).get('id') == expected
+
+    return {
+        'rows': len(hash_db),
+        'load_cold_ms': cold_ms,
+        'load_warm_ms': warm_ms,
+        'hash_match_ms': percentiles(hash_ms),
+        'fuzzy_ms': percentiles(fuzzy_ms),
+        'identify_ms': percentiles(identify_ms),
+        'identify_top1_accuracy': correct / len(cards) if cards else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def bench_ocr(cards, ocr_pipeline, repeat):
+    if ocr_pipeline is None or not cards:
+        return None
+    crops = [crop for _, _, crop, _, _, _ in cards]
+    ocr_pipeline.extract_text_from_card(crops[0])
+    single = [timed_ms(ocr_pipeline.extract_text_from_card, crop)[0] for _ in range(repeat) for crop in crops]
+    batch_ms, _ = timed_ms(ocr_pipeline.extract_text_batch, crops)
+    return {'card_ms': percentiles(single), 'batch_ms_per_card': batch_ms / len(crops), 'peak_rss_mb': peak_rss_mb()}
+
+
+# --- baseline comparison ---
+
+def flatten(report, prefix=''):
+    flat = {}
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def find_regressions(report, baseline, tolerance):
+    current, previous = flatten(report['sections']), flatten(baseline['sections'])
+    regressions = []
+    for key, old in previous.items():
+        new = current.get(key)
+        if new is None or key.endswith('.n'): continue
+        if 'accuracy' in key:
+            if new < old - 1e-9:
+                regressions.append(f"{key}: {old:.3f} -> {new:.3f}")
+        elif 'throughput' in key:
+            if new < old * (1 - tolerance):
+                regressions.append(f"{key}: {old:.2f} -> {new:.2f}")
+        elif key.endswith('_ms') or '_ms.' in key or 'rss' in key:
+            min_delta = MIN_DELTA_RSS_MB if 'rss' in key else MIN_DELTA_MS
+            if old > 0 and new > old * (1 + tolerance) and new - old >= min_delta:
+                regressions.append(f"{key}: {old:.2f} -> {new:.2f} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def print_report(report):
+    for section, values in report['sections'].items():
+        if values is None:
+            print(f"\n[{section}] skipped")
+            continue
+        print(f"\n[{section}]")
+        for key, value in flatten(values).items():
+            if key.endswith('.n'): continue
+            print(f"  {key:<40}{value:>12.3f}" if isinstance(value, float) else f"  {key:<40}{value:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('labelled_dir', nargs='?')
+    parser.add_argument('--labels')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20000, 200000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    parser.add_argument('--output', help='also write this run\'s report here')
+    args = parser.parse_args()
+
+    # repeats must run the whole pipeline, and the suite shouldn't touch the repo's stats / debug files
+    final_main.RESULT_CACHE_SIZE = 0
+    final_main.CANDIDATE_STATS_FILE = None
+    final_main.PROFILE_STAGES = True
+    final_main.PROFILE_LOG_FILE = None
+    final_main.DEBUG_LEVEL = 'off'
+    tmp_dir = tempfile.mkdtemp(prefix='card_bench_')
+    final_main.OUTPUT_FOLDER = tmp_dir
+
+    samples = []
+    if args.labelled_dir:
+        samples = load_samples(args.labelled_dir, args.labels or os.path.join(args.labelled_dir, 'labels.csv'))
+        if not samples:
+            print("no labelled images")
+            sys.exit(1)
+
+    rng = np.random.default_rng(0)
+    sections = {}
+    try:
+        resources = final_main.load_resources()
+        if resources is None:
+            print("couldn't load the card database")
+            sys.exit(1)
+        sections['pipeline'] = bench_pipeline(samples, resources, args.repeat) if samples else None
+        cards = detected_cards(samples, resources['model'])
+        for size in args.sizes:
+            print(f"synthetic database with {size} rows...")
+            sections[f"db_{size}"] = bench_database(size, tmp_dir, cards, rng)
+        sections['ocr'] = bench_ocr(cards, resources['ocr_pipeline'], args.repeat)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    report = {'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': sys.version.split()[0],
+              'images': len(samples), 'sizes': args.sizes, 'sections': sections}
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nbaseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("\nno baseline yet, run again with --save-baseline")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = find_regressions(report, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against {args.baseline} (baseline from {baseline.get('created')}):")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nno regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
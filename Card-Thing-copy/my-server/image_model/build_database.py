@@ -0,0 +1,203 @@
+"""
+Offline card database builder: adds extra_hashes (pHashes of every
+CROP_LEVELS trim of the card image) to the csv, from a local folder of
+reference images found by image_url path or by card id.
+
+p_hash is only replaced with --rehash, when a row has none or when its image
+is newer than the csv. A manifest next to the csv lets a rebuild skip the
+sets whose images didn't change (--full hashes everything again).
+
+    python build_database.py <image folder> [--csv db.csv] [--out db.csv] [--workers N] [--full] [--rehash]
+"""
+
+import os
+import sys
+import csv
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import cv2
+
+from native_phash import phash_bgr_batch
+from card_database import load_card_database
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+MANIFEST_VERSION = 1
+
+
+def manifest_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + '.build.json'
+
+
+def set_of(card_id):
+    """'swsh6-10' -> 'swsh6'"""
+    return card_id.rsplit('-', 1)[0] if '-' in card_id else card_id
+
+
+def index_images(folder):
+    """relative path -> path and file stem -> path of every image under folder"""
+    by_relpath, by_stem = {}, {}
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if not name.lower().endswith(IMAGE_EXTENSIONS): continue
+            path = os.path.join(root, name)
+            by_relpath[os.path.relpath(path, folder).replace(os.sep, '/')] = path
+            by_stem.setdefault(os.path.splitext(name)[0], path)
+    return by_relpath, by_stem
+
+
+def find_image(row, by_relpath, by_stem):
+    if row.get('image_url'):
+        path = by_relpath.get(urlparse(row['image_url']).path.lstrip('/'))
+        if path: return path
+    return by_stem.get(row.get('id', ''))
+
+
+def set_signature(images, trims):
+    """changes when an image of the set is added, removed, replaced or the trims change"""
+    h = hashlib.sha1(json.dumps(trims).encode())
+    for card_id, path in sorted(images):
+        stat = os.stat(path)
+        h.update(f"{card_id}\0{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def trim(image, pct):
+    """same arithmetic as final_main.center_crop"""
+    if pct <= 0: return image
+    h, w = image.shape[:2]
+    y_inset, x_inset = int(h * pct), int(w * pct)
+    if y_inset * 2 >= h or x_inset * 2 >= w: return image
+    return image[y_inset:h - y_inset, x_inset:w - x_inset]
+
+
+def hash_set(images, trims):
+    """pool task: [(card_id, path)] -> {card_id: {'p_hash': hex, 'extra': [hex, ..]}}, unreadable images are left out"""
+    cv2.setNumThreads(1)
+    cards = {}
+    for card_id, path in images:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            print(f"could not read {path}", file=sys.stderr)
+            continue
+        hashes = ['%016x' % int(h) for h in phash_bgr_batch([image] + [trim(image, pct) for pct in trims])]
+        # a trim can hash like the full card, no point storing it twice
+        extra = [h for h in dict.fromkeys(hashes[1:]) if h != hashes[0]]
+        cards[card_id] = {'p_hash': hashes[0], 'extra': extra}
+    return cards
+
+
+def load_manifest(path, trims):
+    try:
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('trims') != trims:
+        return {}
+    return manifest.get('sets', {})
+
+
+def build(image_folder, csv_path, out_path=None, workers=None, full=False, trims=None, rehash=False):
+    """
+    rewrites the csv with fresh extra_hashes, returns (hashed sets, reused sets, cards without image).
+    p_hash is only replaced when rehash, when the row has none or when the image is newer than the csv.
+    """
+    import final_main
+    out_path = out_path or csv_path
+    trims = sorted(p for p in (final_main.CROP_LEVELS if trims is None else trims) if p > 0)
+    manifest_path = manifest_path_for(out_path)
+    previous = {} if full else load_manifest(manifest_path, trims)
+    csv_mtime_ns = os.stat(csv_path).st_mtime_ns
+
+    with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        columns = list(reader.fieldnames or [])
+        rows = list(reader)
+    if 'extra_hashes' not in columns:
+        columns.append('extra_hashes')
+
+    by_relpath, by_stem = index_images(image_folder)
+    sets, paths, missing = {}, {}, 0
+    for row in rows:
+        path = find_image(row, by_relpath, by_stem)
+        if path is None:
+            missing += 1
+            continue
+        paths[row['id']] = path
+        sets.setdefault(set_of(row['id']), []).append((row['id'], path))
+
+    results, todo = {}, {}
+    for set_id, images in sets.items():
+        signature = set_signature(images, trims)
+        known = previous.get(set_id)
+        if known and known.get('signature') == signature:
+            results[set_id] = known
+        else:
+            todo[set_id] = (signature, images)
+
+    print(f"{len(sets)} sets with images ({len(todo)} to hash, {len(sets) - len(todo)} unchanged), {missing} cards without an image")
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(hash_set, images, trims): set_id for set_id, (_, images) in todo.items()}
+            for done, future in enumerate(as_completed(futures), 1):
+                set_id = futures[future]
+                results[set_id] = {'signature': todo[set_id][0], 'cards': future.result()}
+                print(f"[{done}/{len(todo)}] {set_id}: {len(results[set_id]['cards'])} cards")
+
+    cards = {card_id: hashes for entry in results.values() for card_id, hashes in entry['cards'].items()}
+    rehashed = 0
+    for row in rows:
+        hashes = cards.get(row['id'])
+        if hashes is None:
+            # stale trims of an image that's gone would stay searchable
+            row['extra_hashes'] = ''
+            continue
+        if rehash or not row.get('p_hash') or os.stat(paths[row['id']]).st_mtime_ns > csv_mtime_ns:
+            rehashed += row.get('p_hash') != hashes['p_hash']
+            row['p_hash'] = hashes['p_hash']
+        # a trim that hashes like the kept p_hash adds nothing
+        row['extra_hashes'] = ' '.join(h for h in hashes['extra'] if h != row['p_hash'])
+    print(f"{rehashed} p_hash values replaced")
+
+    # readers never see a half written csv / manifest
+    tmp_path = f'{out_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, out_path)
+    tmp_path = f'{manifest_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': MANIFEST_VERSION, 'trims': trims, 'sets': results}, f)
+    os.replace(tmp_path, manifest_path)
+
+    # compiled now instead of by the first worker that maps it
+    load_card_database(out_path)
+    return len(todo), len(sets) - len(todo), missing
+
+
+def parse_args(argv):
+    import final_main
+    parser = argparse.ArgumentParser(description="Rebuild the card database hashes from reference images.")
+    parser.add_argument('images', help="folder of reference card images (image_url paths or <id>.png)")
+    parser.add_argument('--csv', default=final_main.DATABASE_FILE, help="card metadata to build from")
+    parser.add_argument('--out', help="csv to write (default: --csv, rewritten in place)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--full', action='store_true', help="hash every set again, ignore the manifest")
+    parser.add_argument('--trims', type=float, nargs='*', help="border fractions for extra_hashes (default: CROP_LEVELS)")
+    parser.add_argument('--rehash', action='store_true', help="replace every p_hash with the hash of its image")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    hashed, reused, missing = build(args.images, args.csv, args.out, args.workers, args.full, args.trims, args.rehash)
+    print(f"done: {hashed} sets hashed, {reused} unchanged, {missing} cards without an image -> {args.out or args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Bulk collection scanning with a pool of worker processes. One JSON line per
+image is appended to the output as it finishes:
+
+    {"path": "/photos/IMG_0001.jpg", "status": "ok", "card": {...}, "ms": 412.3}
+    {"path": "/photos/IMG_0003.jpg", "status": "error", "error": "Failed to load image", "ms": 2.0}
+
+Running again with the same output resumes; with --retry-errors the failed
+images are run again and the last line of a path counts.
+
+    python bulk_scan.py <dir | glob | @list.txt> [...] -o results.jsonl [--workers N] [--multi] [--retry-errors]
+    python final_main.py --bulk ...same arguments...
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+IN_FLIGHT_PER_WORKER = 4   # images handed to the pool ahead of time, keeps every worker busy without queueing the whole run
+
+# per worker process
+_resources = None
+_service = None
+
+
+def collect_images(inputs):
+    """directories (recursive), globs and @list files -> sorted unique absolute paths"""
+    paths = []
+    for item in inputs:
+        if item.startswith('@'):
+            with open(item[1:], 'r', encoding='utf-8') as f:
+                paths.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+        elif os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(IMAGE_EXTENSIONS))
+        elif any(c in item for c in '*?['):
+            paths.extend(p for p in glob.glob(item, recursive=True) if p.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            paths.append(item)
+    return sorted({os.path.abspath(p) for p in paths})
+
+
+def finished_paths(output_path, retry_errors=False):
+    """paths that already have a result line in output_path"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # the line an interrupted run was writing
+                continue
+            if retry_errors and result.get('status') == 'error':
+                continue
+            done.add(result.get('path'))
+    return done
+
+
+def _init_worker(verbose, debug):
+    global _resources, _service
+    # the pipeline's prints would end up in the results when they go to stdout
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+    else:
+        sys.stdout = sys.stderr
+
+    import cv2
+    import final_main
+    import recognition_service
+    # the process pool is the parallelism, no candidate pool per worker
+    cv2.setNumThreads(1)
+    final_main.CANDIDATE_POOL = None
+    if not debug:
+        final_main.DEBUG_LEVEL = 'off'
+    try:
+        _resources = final_main.load_resources()
+    except Exception as e:
+        # every image of this worker is reported as an error instead of breaking the pool
+        print(f"worker init failed: {e}", file=sys.stderr)
+    _service = recognition_service
+
+
+def _scan_one(path, multi):
+    start = time.perf_counter()
+    if _resources is None:
+        result = {'status': 'error', 'error': 'Worker failed to load the models / card database'}
+    else:
+        try:
+            result = _service.handle_request({'id': path, 'image_path': path, 'multi': multi}, _resources)
+            result.pop('id', None)
+        except Exception as e:
+            result = {'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+    result = dict({'path': path}, **result)
+    result['ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def scan(paths, out, workers, multi=False, verbose=False, debug=False):
+    """runs every path through the pool, writes one JSON line per result as soon as it's done"""
+    counts = {'ok': 0, 'no_card': 0, 'error': 0}
+
+    def write(result):
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+        counts[result['status'] if result['status'] in counts else 'error'] += 1
+
+    pending = list(reversed(paths))
+    start = time.perf_counter()
+    next_report = 50
+    while pending:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(verbose, debug))
+        in_flight = {}
+        try:
+            while pending or in_flight:
+                while pending and len(in_flight) < workers * IN_FLIGHT_PER_WORKER:
+                    path = pending.pop()
+                    in_flight[pool.submit(_scan_one, path, multi)] = path
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    # result() raises BrokenProcessPool while the path is still in in_flight, so the handler below writes it
+                    result = future.result()
+                    del in_flight[future]
+                    write(result)
+                total = sum(counts.values())
+                if total >= next_report:
+                    next_report += 50
+                    rate = total / (time.perf_counter() - start)
+                    print(f"{total}/{len(paths)} images, {rate:.1f}/s", file=sys.stderr)
+        except BrokenProcessPool:
+            # a worker died (e.g. out of memory): the images still in the pool are errors, the rest get a new pool
+            for future, path in in_flight.items():
+                if future.done() and future.exception() is None:
+                    write(future.result())
+                else:
+                    write({'path': path, 'status': 'error', 'error': 'Worker process died'})
+            print("worker process died, restarting the pool", file=sys.stderr)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    return counts, elapsed
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Recognize a whole collection of card photos.")
+    parser.add_argument('inputs', nargs='+', help="directories, globs or @files listing one image path per line")
+    parser.add_argument('-o', '--output', required=True, help="JSON-lines results file (appended to, '-' for stdout)")
+    parser.add_argument('--workers', type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)))
+    parser.add_argument('--multi', action='store_true', help="every detected card per photo instead of one")
+    parser.add_argument('--retry-errors', action='store_true', help="when resuming, run the images that failed again")
+    parser.add_argument('--no-resume', action='store_true', help="don't skip images already in the output")
+    parser.add_argument('--debug', action='store_true', help="keep final_main's debug images on")
+    parser.add_argument('--verbose', action='store_true', help="pipeline prints of the workers to stderr")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    paths = collect_images(args.inputs)
+    if args.output != '-' and not args.no_resume:
+        done = finished_paths(args.output, args.retry_errors)
+        skipped = sum(1 for p in paths if p in done)
+        paths = [p for p in paths if p not in done]
+        if skipped:
+            print(f"resuming: {skipped} images already in {args.output}", file=sys.stderr)
+    if not paths:
+        print("nothing to scan", file=sys.stderr)
+        return
+
+    # torch / onnx / opencv threads of all workers together shouldn't oversubscribe the cpu
+    os.environ.setdefault('OMP_NUM_THREADS', str(max(1, (os.cpu_count() or 1) // args.workers)))
+    print(f"scanning {len(paths)} images with {args.workers} workers", file=sys.stderr)
+
+    if args.output == '-':
+        counts, elapsed = scan(paths, sys.stdout, args.workers, args.multi, args.verbose, args.debug)
+    else:
+        # an interrupted run can leave a half written last line, start on a fresh one
+        needs_newline = False
+        if os.path.exists(args.output) and os.path.getsize(args.output) > 0:
+            with open(args.output, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b'\n'
+        with open(args.output, 'a', encoding='utf-8') as out:
+            if needs_newline:
+                out.write("\n")
+            counts, elapsed = scan(paths, out, args.workers, args.multi, args.verbose, args.debug)
+
+    total = sum(counts.values())
+    print(f"done: {total} images in {elapsed:.1f}s ({total / elapsed:.1f}/s), "
+          f"{counts['ok']} ok, {counts['no_card']} no card, {counts['error']} errors", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Adaptive order for a card's crop / rotation / flatten candidates: the ones
+that matched most often go first (the flattened warp first for a clean 4
+corner contour), and they are hashed in waves until one is within
+EARLY_EXIT_THRESHOLD. The counts are saved to a json file:
+
+    python candidate_scheduler.py [stats_file]
+"""
+
+import os
+import sys
+import json
+import threading
+
+# saved every n recorded cards (plus on save()), 0 = only on save()
+SAVE_EVERY = 25
+
+
+class CandidateScheduler:
+    """candidate order + win / evaluation counts, one per process and shared by every request"""
+
+    def __init__(self, specs, name_of, stats_path=None, wave_size=4):
+        self.specs = list(specs)
+        self.name_of = name_of
+        self.stats_path = stats_path
+        self.wave_size = max(1, wave_size)
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.cards = 0
+        self.early_exits = 0
+        self.evaluated_histogram = {}
+        self.variants = {}
+        if stats_path and os.path.exists(stats_path):
+            self.load(stats_path)
+
+    def _variant(self, name):
+        return self.variants.setdefault(name, {'evaluated': 0, 'wins': 0, 'early_exit_wins': 0})
+
+    def win_rate(self, name):
+        v = self.variants.get(name)
+        if v is None:
+            return 0.5
+        # laplace smoothing, unseen / rarely tried variants sit in the middle
+        return (v['wins'] + 1) / (v['evaluated'] + 2)
+
+    def _ranked(self):
+        # sorted() is stable, so equal win rates keep the candidate_specs() order
+        return sorted(self.specs, key=lambda spec: -self.win_rate(self.name_of(spec)))
+
+    def order(self, clean_quad=False):
+        """candidate specs, most likely winner first"""
+        with self._lock:
+            ordered = self._ranked()
+        if clean_quad:
+            flattened = [spec for spec in ordered if spec[0] == 'flattened']
+            ordered = flattened + [spec for spec in ordered if spec[0] != 'flattened']
+        return ordered
+
+    def waves(self, ordered):
+        """splits an order into the chunks evaluated between early exit checks"""
+        return [ordered[i:i + self.wave_size] for i in range(0, len(ordered), self.wave_size)]
+
+    def record(self, evaluated_names, winner_name, early_exit):
+        """one card: which candidates were hashed and which one matched (None when none did)"""
+        with self._lock:
+            self.cards += 1
+            self.early_exits += int(early_exit)
+            count = str(len(evaluated_names))
+            self.evaluated_histogram[count] = self.evaluated_histogram.get(count, 0) + 1
+            for name in evaluated_names:
+                self._variant(name)['evaluated'] += 1
+            if winner_name is not None:
+                self._variant(winner_name)['wins'] += 1
+                if early_exit:
+                    self._variant(winner_name)['early_exit_wins'] += 1
+            self._unsaved += 1
+            save_now = SAVE_EVERY and self._unsaved >= SAVE_EVERY
+        if save_now:
+            self.save()
+
+    def stats(self):
+        with self._lock:
+            evaluated_total = sum(int(k) * v for k, v in self.evaluated_histogram.items())
+            return {
+                'cards': self.cards,
+                'early_exits': self.early_exits,
+                'avg_evaluated': round(evaluated_total / self.cards, 2) if self.cards else None,
+                'evaluated_histogram': dict(self.evaluated_histogram),
+                'variants': {name: dict(v) for name, v in self.variants.items()},
+                'order': [self.name_of(spec) for spec in self._ranked()],
+            }
+
+    def load(self, path):
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read candidate stats {path}: {e}")
+            return
+        self.cards = data.get('cards', 0)
+        self.early_exits = data.get('early_exits', 0)
+        self.evaluated_histogram = data.get('evaluated_histogram', {})
+        self.variants = data.get('variants', {})
+
+    def save(self, path=None):
+        path = path or self.stats_path
+        if not path: return
+        data = self.stats()
+        with self._lock:
+            self._unsaved = 0
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not save candidate stats {path}: {e}")
+
+
+def print_stats(data):
+    print(f"{data['cards']} cards, {data['early_exits']} early exits, {data['avg_evaluated']} candidates evaluated on average")
+    print(f"{'variant':<16}{'evaluated':>10}{'wins':>8}{'early':>8}{'win rate':>10}")
+    for name, v in sorted(data['variants'].items(), key=lambda item: -item[1]['wins']):
+        rate = v['wins'] / v['evaluated'] if v['evaluated'] else 0.0
+        print(f"{name:<16}{v['evaluated']:>10}{v['wins']:>8}{v['early_exit_wins']:>8}{rate:>10.2f}")
+    print("evaluated per card:", dict(sorted(data['evaluated_histogram'].items(), key=lambda item: int(item[0]))))
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), 'candidate_stats.json')
+    with open(path, 'r') as f:
+        print_stats(json.load(f))
@@ -0,0 +1,441 @@
+"""
+Compiled card database: the csv is compiled once into a .cardb file that
+every worker memory maps, rows are decoded only when read (CardRow).
+
+    magic (8 bytes) | header length (uint64) | JSON header | arrays (64 byte aligned)
+
+Arrays: the string table (strings_blob / strings_offsets), one string id per
+row per csv column (col_<column>), the packed pHashes and their rows
+(hashes / hash_rows, p_hashes before extra_hashes), the name -> number ->
+rows text index, the fuzzy name index postings and the MIH tables.
+
+Each csv version gets its own file (artifact_path), so a recompile never
+replaces a file a running worker still maps.
+
+Build by hand with:  python card_database.py [csv_path] [out_path]
+"""
+
+import os
+import re
+import sys
+import csv
+import glob
+import json
+import mmap
+from bisect import bisect_left
+from contextlib import contextmanager
+from collections.abc import Mapping, Sequence
+from functools import cached_property
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # windows
+    fcntl = None
+    import msvcrt
+
+from name_index import NameIndex, build_postings, encode_gram_key, decode_gram_key
+from hash_index import chunk_tables, CHUNK_COUNT
+
+MAGIC = b'PKCARDB1'
+FORMAT_VERSION = 3
+ALIGNMENT = 64
+
+
+def normalize_string(s):
+    if not s: return ""
+    return s.lower().strip()
+
+
+def binary_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + '.cardb'
+
+
+def artifact_path(binary_path, stat):
+    """the compiled file of one csv version: <name>.<csv mtime_ns>-<csv size>.v<format>.cardb"""
+    root = os.path.splitext(binary_path)[0]
+    return f'{root}.{stat.st_mtime_ns}-{stat.st_size}.v{FORMAT_VERSION}.cardb'
+
+
+def old_artifacts(binary_path, keep):
+    """the other compiled versions next to keep, and the unversioned file of older builds"""
+    root = os.path.splitext(binary_path)[0]
+    pattern = re.compile(re.escape(os.path.basename(root)) + r'\.\d+-\d+\.v\d+\.cardb')
+    paths = [p for p in glob.glob(glob.escape(root) + '.*.cardb') if pattern.fullmatch(os.path.basename(p))]
+    if os.path.exists(binary_path):
+        paths.append(binary_path)
+    return [p for p in paths if os.path.abspath(p) != os.path.abspath(keep)]
+
+
+class StringTable:
+    """Interns strings while compiling."""
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def add(self, value):
+        sid = self.ids.get(value)
+        if sid is None:
+            sid = self.ids[value] = len(self.strings)
+            self.strings.append(value)
+        return sid
+
+    def to_arrays(self):
+        encoded = [s.encode('utf-8') for s in self.strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return blob, offsets
+
+
+def compile_database(csv_path, out_path=None, stat=None):
+    """Parses the csv once and writes the binary artifact. Returns its path."""
+    out_path = out_path or binary_path_for(csv_path)
+    strings = StringTable()
+    # before reading: a csv written while compiling must still look newer than the artifact
+    stat = stat or os.stat(csv_path)
+
+    with open(csv_path, 'r', newline='', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)
+        columns = list(reader.fieldnames or [])
+        column_ids = {col: [] for col in columns}
+        hash_rows = {}
+        extra_rows = []
+        text_index = {}
+
+        for row_idx, row in enumerate(reader):
+            for col in columns:
+                column_ids[col].append(strings.add(row.get(col) or ''))
+
+            if row.get('p_hash'):
+                # same semantics as the old hash_db dict: first position wins, last row wins
+                hash_rows[int(row['p_hash'], 16)] = row_idx
+            for extra in (row.get('extra_hashes') or '').split():
+                extra_rows.append((int(extra, 16), row_idx))
+
+            name_key = normalize_string(row.get('name', ''))
+            num_key = normalize_string(row.get('number', ''))
+            if name_key:
+                text_index.setdefault(name_key, {}).setdefault(num_key, []).append(row_idx)
+
+    # augmented hashes never take a p_hash over, between themselves the last row wins like above
+    main_hashes = set(hash_rows)
+    for card_hash, row_idx in extra_rows:
+        if card_hash not in main_hashes:
+            hash_rows[card_hash] = row_idx
+
+    arrays = {}
+    for col in columns:
+        arrays[f'col_{col}'] = np.asarray(column_ids[col], dtype=np.uint32)
+    arrays['hashes'] = np.fromiter(hash_rows.keys(), dtype=np.uint64, count=len(hash_rows))
+    arrays['hash_rows'] = np.fromiter(hash_rows.values(), dtype=np.int32, count=len(hash_rows))
+
+    for chunk, (order, offsets) in enumerate(chunk_tables(arrays['hashes'])):
+        arrays[f'mih_order_{chunk}'] = order
+        arrays[f'mih_offsets_{chunk}'] = offsets
+
+    name_keys, name_offsets, num_keys, num_offsets, text_rows = [], [0], [], [0], []
+    for name_key, number_map in text_index.items():
+        name_keys.append(strings.add(name_key))
+        for num_key, rows in number_map.items():
+            num_keys.append(strings.add(num_key))
+            text_rows.extend(rows)
+            num_offsets.append(len(text_rows))
+        name_offsets.append(len(num_keys))
+
+    names = list(text_index)
+    lengths, postings = build_postings(names)
+    gram_keys, gram_offsets, gram_names = [], [0], []
+    for key, ids in postings.items():
+        gram_keys.append(strings.add(encode_gram_key(key)))
+        gram_names.extend(ids)
+        gram_offsets.append(len(gram_names))
+
+    # after the name/number/gram keys so they are interned too
+    arrays['strings_blob'], arrays['strings_offsets'] = strings.to_arrays()
+    arrays['name_keys'] = np.asarray(name_keys, dtype=np.uint32)
+    arrays['name_offsets'] = np.asarray(name_offsets, dtype=np.int64)
+    arrays['num_keys'] = np.asarray(num_keys, dtype=np.uint32)
+    arrays['num_offsets'] = np.asarray(num_offsets, dtype=np.int64)
+    arrays['text_rows'] = np.asarray(text_rows, dtype=np.int32)
+    arrays['name_order'] = np.asarray(sorted(range(len(names)), key=names.__getitem__), dtype=np.int32)
+    arrays['name_lengths'] = lengths
+    arrays['gram_keys'] = np.asarray(gram_keys, dtype=np.uint32)
+    arrays['gram_offsets'] = np.asarray(gram_offsets, dtype=np.int64)
+    arrays['gram_names'] = np.asarray(gram_names, dtype=np.int32)
+
+    header = {
+        'version': FORMAT_VERSION,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'source_size': stat.st_size,
+        'rows': len(column_ids[columns[0]]) if columns else 0,
+        'columns': columns,
+        'arrays': {},
+    }
+    write_artifact(out_path, header, arrays)
+    return out_path
+
+
+def write_artifact(out_path, header, arrays):
+    # offsets depend on the header size, so lay the arrays out against a padded header
+    layout, offset = {}, 0
+    for name, arr in arrays.items():
+        layout[name] = {'offset': offset, 'dtype': arr.dtype.str, 'shape': list(arr.shape)}
+        offset += arr.nbytes
+        offset += -offset % ALIGNMENT
+    header['arrays'] = layout
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = len(MAGIC) + 8 + len(header_bytes)
+    data_start += -data_start % ALIGNMENT
+    header_bytes = header_bytes.ljust(data_start - len(MAGIC) - 8)
+
+    # per process, workers that start together may all rebuild a stale file
+    tmp_path = f'{out_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header_bytes)).tobytes())
+        f.write(header_bytes)
+        for name, arr in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(data_start + offset)
+    # readers never see a half written file
+    os.replace(tmp_path, out_path)
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None
+        header_len = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        header = json.loads(f.read(header_len))
+    header['data_start'] = len(MAGIC) + 8 + header_len
+    return header
+
+
+def is_stale(csv_path, binary_path, stat=None):
+    if not os.path.exists(binary_path):
+        return True
+    try:
+        header = read_header(binary_path)
+    except (OSError, ValueError):
+        return True
+    if header is None or header.get('version') != FORMAT_VERSION:
+        return True
+    stat = stat or os.stat(csv_path)
+    return header['source_mtime_ns'] != stat.st_mtime_ns or header['source_size'] != stat.st_size
+
+
+class CardRow(Mapping):
+    """Read-only dict view of one card, values are decoded from the string table on access."""
+    __slots__ = ('_db', '_idx')
+
+    def __init__(self, db, idx):
+        self._db = db
+        self._idx = int(idx)
+
+    def __getitem__(self, column):
+        return self._db.value(self._idx, column)
+
+    def __iter__(self):
+        return iter(self._db.columns)
+
+    def __len__(self):
+        return len(self._db.columns)
+
+    def __repr__(self):
+        return f"CardRow({dict(self)!r})"
+
+    @property
+    def row_index(self):
+        return self._idx
+
+
+class RowSequence(Sequence):
+    """Lazy sequence of CardRows for a list of row indices (the hash index rows)."""
+
+    def __init__(self, db, row_indices):
+        self._db = db
+        self._rows = row_indices
+
+    def __getitem__(self, i):
+        return CardRow(self._db, self._rows[i])
+
+    def __len__(self):
+        return len(self._rows)
+
+
+class NameSequence(Sequence):
+    """The normalized names in text index order, decoded on access."""
+
+    def __init__(self, db):
+        self._db = db
+        self._keys = db.arrays['name_keys']
+
+    def __getitem__(self, i):
+        return self._db.string(self._keys[i])
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class TextIndex(Mapping):
+    """
+    Drop-in for the old nested text_db dict: name -> {number -> [rows]}.
+    Names are found by binary search over name_order, number maps are built when looked up.
+    """
+
+    def __init__(self, db):
+        self._db = db
+        self._names = NameSequence(db)
+
+    def _find(self, name_key):
+        order = self._db.arrays['name_order']
+        pos = bisect_left(order, name_key, key=self._names.__getitem__)
+        if pos < len(order) and self._names[order[pos]] == name_key:
+            return int(order[pos])
+        return None
+
+    def __getitem__(self, name_key):
+        db, arrays = self._db, self._db.arrays
+        i = self._find(name_key)
+        if i is None:
+            raise KeyError(name_key)
+        number_map = {}
+        for j in range(arrays['name_offsets'][i], arrays['name_offsets'][i + 1]):
+            rows = arrays['text_rows'][arrays['num_offsets'][j]:arrays['num_offsets'][j + 1]]
+            number_map[db.string(arrays['num_keys'][j])] = [CardRow(db, r) for r in rows]
+        return number_map
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name_key):
+        return isinstance(name_key, str) and self._find(name_key) is not None
+
+    @cached_property
+    def name_index(self):
+        arrays = self._db.arrays
+        offsets, ids = arrays['gram_offsets'], arrays['gram_names']
+        # one small dict of views into the mapped postings
+        postings = {decode_gram_key(self._db.string(sid)): ids[offsets[i]:offsets[i + 1]]
+                    for i, sid in enumerate(arrays['gram_keys'])}
+        return NameIndex(self._names, arrays['name_lengths'], postings)
+
+
+class CardDatabase:
+    """Memory mapped view of a compiled .cardb file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.header = read_header(path)
+        if self.header is None:
+            raise ValueError(f"{path} is not a compiled card database")
+        self.columns = self.header['columns']
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.arrays = {}
+        for name, spec in self.header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape'], dtype=np.int64))
+            self.arrays[name] = np.frombuffer(
+                self._mmap, dtype=dtype, count=count, offset=self.header['data_start'] + spec['offset']
+            ).reshape(spec['shape'])
+        self._blob = self.arrays['strings_blob']
+        self._offsets = self.arrays['strings_offsets']
+
+    def __len__(self):
+        return self.header['rows']
+
+    def string(self, sid):
+        return self._blob[self._offsets[sid]:self._offsets[sid + 1]].tobytes().decode('utf-8')
+
+    def value(self, row_idx, column):
+        column_ids = self.arrays.get(f'col_{column}')
+        if column_ids is None:
+            raise KeyError(column)
+        return self.string(column_ids[row_idx])
+
+    def row(self, row_idx):
+        return CardRow(self, row_idx)
+
+    @property
+    def hashes(self):
+        return self.arrays['hashes']
+
+    def hash_row_sequence(self):
+        return RowSequence(self, self.arrays['hash_rows'])
+
+    def mih_tables(self):
+        """the precomputed MultiIndexHashIndex tables"""
+        return [(self.arrays[f'mih_order_{c}'], self.arrays[f'mih_offsets_{c}']) for c in range(CHUNK_COUNT)]
+
+    def text_index(self):
+        return TextIndex(self)
+
+
+def _lock_file(lock_file):
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return
+    # LK_LOCK gives up after 10 one second tries, a compile can take longer
+    while True:
+        try:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            pass
+
+
+def _unlock_file(lock_file):
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def compile_lock(binary_path):
+    """one process compiles, the others that found the file stale wait for it"""
+    with open(binary_path + '.lock', 'w') as lock_file:
+        _lock_file(lock_file)
+        try:
+            yield
+        finally:
+            _unlock_file(lock_file)
+
+
+def load_card_database(csv_path, binary_path=None):
+    """Memory maps the compiled database of the current csv, compiling it first if there is none yet."""
+    binary_path = binary_path or binary_path_for(csv_path)
+    stat = os.stat(csv_path)
+    path = artifact_path(binary_path, stat)
+    if is_stale(csv_path, path, stat):
+        with compile_lock(binary_path):
+            # compiled by another worker while this one waited
+            if is_stale(csv_path, path, stat):
+                print(f"Compiling {csv_path} -> {path}...")
+                compile_database(csv_path, path, stat)
+            for old_path in old_artifacts(binary_path, path):
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    # still mapped by a worker on windows, the next compile tries again
+                    pass
+    return CardDatabase(path)
+
+
+if __name__ == "__main__":
+    src = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), 'optimized_pokemon_database.csv')
+    stat = os.stat(src)
+    dst = sys.argv[2] if len(sys.argv) > 2 else artifact_path(binary_path_for(src), stat)
+    out = compile_database(src, dst, stat)
+    db = CardDatabase(out)
+    print(f"{out}: {len(db)} rows, {len(db.hashes)} hashes, {os.path.getsize(out) / 1e6:.1f} MB")
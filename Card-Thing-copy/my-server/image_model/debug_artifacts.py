@@ -0,0 +1,180 @@
+"""
+Debug images written by a background thread.
+
+Levels: 'off', 'winners' (the winning candidate per card) or 'all' (+ every
+candidate and the OCR ROIs). Only DEBUG_SAMPLE_RATE of the requests write, a
+full queue drops images, and prune() keeps the folder under max_files /
+max_mb / max_age_hours.
+"""
+
+import os
+import time
+import queue
+import atexit
+import random
+import threading
+
+import cv2
+
+DEBUG_LEVELS = ('off', 'winners', 'all')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+PRUNE_EVERY = 25
+JPEG_QUALITY = 90
+
+_default_writer = None
+
+
+class DebugArtifactWriter:
+
+    def __init__(self, folder, level='winners', sample_rate=1.0, queue_size=32, queue_mb=64,
+                 max_files=None, max_mb=None, max_age_hours=None):
+        if level not in DEBUG_LEVELS:
+            raise ValueError(f"Unknown debug level '{level}', expected one of {DEBUG_LEVELS}")
+        self.folder = folder
+        self.level = level
+        self.sample_rate = sample_rate
+        self.queue_bytes_limit = int(queue_mb * 1024 * 1024)
+        self.max_files = max_files
+        self.max_bytes = int(max_mb * 1024 * 1024) if max_mb else None
+        self.max_age_s = max_age_hours * 3600 if max_age_hours else None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._queued_bytes = 0
+        self._seq = 0
+        self._thread = None
+        self.counters = {'requests': 0, 'sampled': 0, 'queued': 0, 'written': 0, 'dropped': 0, 'errors': 0, 'pruned': 0}
+
+    def request_level(self):
+        """the level one request writes at: self.level for a sampled request, 'off' otherwise"""
+        if self.level == 'off':
+            return 'off'
+        with self._lock:
+            self.counters['requests'] += 1
+            if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                return 'off'
+            self.counters['sampled'] += 1
+        return self.level
+
+    def request_tag(self):
+        """unique file name prefix for one request"""
+        with self._lock:
+            self._seq += 1
+            return f"{time.strftime('%Y%m%d-%H%M%S')}-{self._seq:05d}"
+
+    def submit(self, name, image):
+        """queues image to be written as folder/name, False when it was dropped"""
+        if image is None or image.size == 0:
+            return False
+        # space reserved before the copy below, a dropped image costs nothing on the request thread
+        with self._lock:
+            if self._queued_bytes + image.nbytes > self.queue_bytes_limit or self._queue.full():
+                self.counters['dropped'] += 1
+                return False
+            self._queued_bytes += image.nbytes
+        # don't keep a whole photo alive for a view into it
+        if not image.flags['OWNDATA']:
+            image = image.copy()
+        try:
+            self._queue.put_nowait((name, image))
+        except queue.Full:
+            with self._lock:
+                self._queued_bytes -= image.nbytes
+                self.counters['dropped'] += 1
+            return False
+        with self._lock:
+            self.counters['queued'] += 1
+        self._ensure_thread()
+        return True
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='debug-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        os.makedirs(self.folder, exist_ok=True)
+        self.prune()
+        since_prune = 0
+        while True:
+            name, image = self._queue.get()
+            try:
+                ext = os.path.splitext(name)[1].lower()
+                params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY] if ext in ('.jpg', '.jpeg') else []
+                ok = cv2.imwrite(os.path.join(self.folder, name), image, params)
+                with self._lock:
+                    self.counters['written' if ok else 'errors'] += 1
+                since_prune += 1
+                if since_prune >= PRUNE_EVERY:
+                    since_prune = 0
+                    self.prune()
+            except Exception as e:
+                print(f"debug writer error: {e}")
+                with self._lock:
+                    self.counters['errors'] += 1
+            finally:
+                with self._lock:
+                    self._queued_bytes -= image.nbytes
+                self._queue.task_done()
+
+    def prune(self):
+        """applies max_age_hours, then max_files / max_mb (oldest first) to the folder's images"""
+        if not (self.max_files or self.max_bytes or self.max_age_s):
+            return 0
+        files = []
+        try:
+            for entry in os.scandir(self.folder):
+                if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return 0
+        files.sort()
+
+        now = time.time()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, path in files:
+            too_old = self.max_age_s and now - mtime > self.max_age_s
+            too_many = self.max_files and len(files) - removed > self.max_files
+            too_big = self.max_bytes and total > self.max_bytes
+            if not (too_old or too_many or too_big):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+            total -= size
+        with self._lock:
+            self.counters['pruned'] += removed
+        return removed
+
+    def flush(self, timeout=10.0):
+        """waits (up to timeout seconds) for the queued images to be written"""
+        if self._thread is None:
+            return True
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, level=self.level, sample_rate=self.sample_rate,
+                        pending=self._queue.qsize(), pending_mb=round(self._queued_bytes / (1024 * 1024), 1))
+
+
+def set_default_writer(writer):
+    global _default_writer
+    _default_writer = writer
+
+
+def write_image(name, image):
+    """queues image on the default writer (no-op without one), for modules that don't hold a writer"""
+    if _default_writer is None:
+        return False
+    return _default_writer.submit(name, image)
@@ -0,0 +1,227 @@
+"""
+Card detection backends behind one detect_batch(images, conf_threshold) ->
+[(x1, y1, x2, y2, conf), ...] per image:
+
+  'ultralytics' - YOLO(new_best.pt)
+  'onnx'        - exported to ONNX, run with ONNX Runtime (optionally INT8)
+  'openvino'    - exported to OpenVINO IR (optionally INT8)
+
+Export by hand with:  python detection_backends.py onnx|openvino [imgsz] [--int8]
+"""
+
+import os
+import sys
+import glob
+import shutil
+import threading
+
+import cv2
+import numpy as np
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+try:
+    import openvino as ov
+except ImportError:
+    ov = None
+
+DATA_YAML = os.path.join(os.path.dirname(__file__), 'data.yaml')
+NMS_IOU = 0.7          # ultralytics' predict default
+MAX_DETECTIONS = 300
+LETTERBOX_COLOR = (114, 114, 114)
+
+
+class UltralyticsBackend:
+    """YOLO through ultralytics, a list of images is one predict call."""
+
+    def __init__(self, model_path, imgsz=None):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+        self.imgsz = imgsz
+        # predictors aren't thread safe, service workers take turns
+        self._lock = threading.Lock()
+
+    def detect_batch(self, images, conf_threshold):
+        kwargs = {'verbose': False}
+        if self.imgsz:
+            kwargs['imgsz'] = self.imgsz
+        detections = []
+        with self._lock:
+            results = self.model(list(images), **kwargs)
+        for result in results:
+            boxes = []
+            for box in result.boxes:
+                if box.conf[0] > conf_threshold:
+                    x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
+                    boxes.append((x1, y1, x2, y2, float(box.conf[0])))
+            detections.append(boxes)
+        return detections
+
+
+class ExportedBackend:
+    """Shared pre / post processing of the exported models, subclasses only run inference."""
+
+    def __init__(self, imgsz=640, max_batch=None):
+        self.imgsz = imgsz
+        self.max_batch = max_batch
+
+    def letterbox(self, image):
+        """resize keeping the aspect ratio + pad to imgsz x imgsz, like ultralytics' LetterBox"""
+        h, w = image.shape[:2]
+        ratio = min(self.imgsz / h, self.imgsz / w)
+        new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+        pad_w, pad_h = (self.imgsz - new_w) / 2, (self.imgsz - new_h) / 2
+        if (new_w, new_h) != (w, h):
+            image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+        left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+        image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+        return image, ratio, (left, top)
+
+    def to_tensor(self, letterboxed):
+        # BGR HWC uint8 -> RGB CHW float 0..1
+        return np.ascontiguousarray(letterboxed[:, :, ::-1].transpose(2, 0, 1), dtype=np.float32) / 255.0
+
+    def detect_batch(self, images, conf_threshold):
+        prepared = [self.letterbox(image) for image in images]
+        step = self.max_batch or len(prepared) or 1
+        outputs = []
+        for start in range(0, len(prepared), step):
+            batch = np.stack([self.to_tensor(p[0]) for p in prepared[start:start + step]])
+            outputs.extend(self.infer(batch))
+        return [self.decode(output, ratio, pad, image.shape, conf_threshold)
+                for output, (_, ratio, pad), image in zip(outputs, prepared, images)]
+
+    def infer(self, batch):
+        """(B, 3, imgsz, imgsz) float32 -> (B, 4 + classes, anchors) raw YOLO output"""
+        raise NotImplementedError
+
+    def decode(self, output, ratio, pad, shape, conf_threshold):
+        """raw output of one image -> [(x1, y1, x2, y2, conf), ...] in original pixels"""
+        pred = np.asarray(output).T
+        scores = pred[:, 4:].max(axis=1)
+        keep = scores > conf_threshold
+        pred, scores = pred[keep], scores[keep]
+        if not len(pred):
+            return []
+
+        cx, cy, bw, bh = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+        xywh = np.stack([cx - bw / 2, cy - bh / 2, bw, bh], axis=1)
+        keep = cv2.dnn.NMSBoxes(xywh.tolist(), scores.tolist(), conf_threshold, NMS_IOU)
+        keep = np.asarray(keep, dtype=np.int64).reshape(-1)
+        keep = keep[np.argsort(-scores[keep], kind='stable')][:MAX_DETECTIONS]
+
+        h, w = shape[:2]
+        boxes = []
+        for i in keep:
+            x, y, bw_i, bh_i = xywh[i]
+            x1 = np.clip((x - pad[0]) / ratio, 0, w)
+            y1 = np.clip((y - pad[1]) / ratio, 0, h)
+            x2 = np.clip((x + bw_i - pad[0]) / ratio, 0, w)
+            y2 = np.clip((y + bh_i - pad[1]) / ratio, 0, h)
+            boxes.append((int(x1), int(y1), int(x2), int(y2), float(scores[i])))
+        return boxes
+
+
+class OnnxBackend(ExportedBackend):
+
+    def __init__(self, onnx_path, imgsz=640):
+        if ort is None:
+            raise ImportError("onnxruntime is not installed")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # a static export only takes batches of its fixed size
+        batch_dim = model_input.shape[0]
+        super().__init__(imgsz, batch_dim if isinstance(batch_dim, int) else None)
+
+    def infer(self, batch):
+        return list(self.session.run(None, {self.input_name: batch})[0])
+
+
+class OpenVINOBackend(ExportedBackend):
+
+    def __init__(self, xml_path, imgsz=640):
+        if ov is None:
+            raise ImportError("openvino is not installed")
+        core = ov.Core()
+        self.compiled = core.compile_model(core.read_model(xml_path), 'CPU')
+        # the compiled model's implicit infer request is shared, one call at a time
+        self._lock = threading.Lock()
+        batch_dim = self.compiled.input(0).get_partial_shape()[0]
+        super().__init__(imgsz, batch_dim.get_length() if batch_dim.is_static else None)
+
+    def infer(self, batch):
+        with self._lock:
+            return list(self.compiled(batch)[self.compiled.output(0)])
+
+
+def exported_model_path(model_path, backend, imgsz=640, int8=False):
+    """Where the export of model_path for backend / imgsz / int8 lives (an .onnx file or an IR directory)."""
+    stem = os.path.splitext(model_path)[0] + f"_{imgsz}" + ('_int8' if int8 else '')
+    return stem + '.onnx' if backend == 'onnx' else stem + '_openvino_model'
+
+
+def export_model(model_path, backend='onnx', imgsz=640, int8=False):
+    """Exports the .pt model with ultralytics (needs torch), returns exported_model_path()."""
+    from ultralytics import YOLO
+    target = exported_model_path(model_path, backend, imgsz, int8)
+    model = YOLO(model_path)
+
+    if backend == 'onnx':
+        exported = model.export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+        if int8:
+            # weights only, no calibration set needed
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(exported, target, weight_type=QuantType.QUInt8)
+            os.remove(exported)
+        else:
+            os.replace(exported, target)
+    elif backend == 'openvino':
+        # int8 calibrates on the val images listed in data.yaml
+        exported = model.export(format='openvino', imgsz=imgsz, dynamic=True, int8=int8, data=DATA_YAML)
+        if os.path.exists(target):
+            shutil.rmtree(target)
+        os.replace(exported, target)
+    else:
+        raise ValueError(f"Can't export to '{backend}'")
+    return target
+
+
+def make_detector(kind, model_path, imgsz=640, int8=False):
+    """Detection backend of the given kind, see DETECTION_BACKENDS."""
+    if kind not in DETECTION_BACKENDS:
+        raise ValueError(f"Unknown detection backend '{kind}', expected one of {sorted(DETECTION_BACKENDS)}")
+    if kind == 'ultralytics':
+        return UltralyticsBackend(model_path, imgsz)
+
+    # don't spend an export on a runtime that isn't there
+    if (kind == 'onnx' and ort is None) or (kind == 'openvino' and ov is None):
+        raise ImportError(f"the {kind} runtime is not installed")
+    path = exported_model_path(model_path, kind, imgsz, int8)
+    if not os.path.exists(path):
+        print(f"Exporting {model_path} -> {path}...")
+        export_model(model_path, kind, imgsz, int8)
+    if kind == 'openvino':
+        path = glob.glob(os.path.join(path, '*.xml'))[0]
+    return DETECTION_BACKENDS[kind](path, imgsz)
+
+
+DETECTION_BACKENDS = {
+    'ultralytics': UltralyticsBackend,
+    'onnx': OnnxBackend,
+    'openvino': OpenVINOBackend,
+}
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    backend = args[0] if args else 'onnx'
+    size = int(args[1]) if len(args) > 1 else 640
+    model_file = os.path.join(os.path.dirname(__file__), 'new_best.pt')
+    print(export_model(model_file, backend, size, '--int8' in sys.argv[1:]))
@@ -5,14 +5,22 @@ import sys
 import json
 import csv
 import cv2
-import imagehash
-from PIL import Image
-from ultralytics import YOLO
 import imutils
 from imutils.perspective import four_point_transform
 import numpy as np
 import time
-from pokemon_card_ocr import PokemonCardOCR
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from pokemon_card_ocr import get_ocr_pool
+from hash_index import build_hash_index, make_hash_index
+from card_database import load_card_database
+from name_index import IndexedTextDB
+from native_phash import phash_bgr_batch
+from candidate_scheduler import CandidateScheduler
+from result_cache import ResultCache, MISS, file_key
+from live_database import LiveDatabase, DatabaseSnapshot
+from detection_backends import make_detector
+from stage_metrics import StageMetrics, stage, count
+from debug_artifacts import DebugArtifactWriter, set_default_writer
 import Levenshtein
 
 
@@ -42,43 +50,123 @@ IMAGE_PATH = r'.\Card-Thing\test_images\FINAL_EXAMPLES\working_dialgaV.jpg'
 
 OUTPUT_FOLDER = os.path.join(os.path.dirname(__file__), 'predictions_identified')
 YOLO_CONFIDENCE_THRESHOLD = 0.85
+DETECTION_BACKEND = 'ultralytics'  # 'ultralytics' (PyTorch), 'onnx' (ONNX Runtime) or 'openvino', see detection_backends.py
+DETECTION_IMGSZ = 640      # detector input size (exported models are letterboxed to imgsz x imgsz)
+DETECTION_INT8 = False     # use the INT8 quantized export ('onnx' / 'openvino' only)
+DETECTION_MAX_SIDE = 1280  # photos are shrunk to this long side before detection, boxes are mapped back (None = full resolution)
+SAVE_ANNOTATED_IMAGE = False   # draw every box + label on a full resolution copy and save it as <request>_identified_all_cards.jpg (needs DEBUG_LEVEL != 'off')
 HASH_SIMILARITY_THRESHOLD = 14
 EARLY_EXIT_THRESHOLD = 6   # the confidence level to just return a card w/o checking other candidates
 CROP_LEVELS = [0.0, 0.05, 0.12]
+ROTATION_MODE = 'deskew'   # 'deskew' = rotate by the tilt measured from the card outline (Hough lines fallback), 1-2 candidates; 'sweep' = every ROTATION_ANGLES
+ROTATION_ANGLES = list(range(-6, 7, 2))   # 'sweep' mode only
+DESKEW_MAX_ANGLE = 20      # measured tilts beyond this are treated as a bad outline, not a tilted card
+DESKEW_MIN_ANGLE = 0.5     # below this the raw crops are already straight, no deskewed candidate
+DESKEW_SECOND_ANGLE = 1.0  # the Hough estimate becomes a second candidate when it's this far from the outline's
 OCR_CONFIDENCE_THRESHOLD = 0.6
+OCR_NAME_MODE = 'detect'   # 'recognize' = recognition model only on the name lines, detection below OCR_CONFIDENCE_THRESHOLD
+OCR_POOL_SIZE = 1          # max OCR engines per process (each one holds its own models), created on demand
+OCR_PRELOAD = False        # load one OCR engine at startup instead of on the first card that needs it
 MAX_NAME_DISTANCE = 4      # for fuzzy search
+USE_COMPILED_DATABASE = True   # memory map optimized_pokemon_database.cardb (rebuilt when the csv changes) instead of parsing the csv
+DB_RELOAD_CHECK_S = 30     # long-running processes reload a changed DATABASE_FILE in the background every ~this many seconds (None = never), see live_database.py
+CANDIDATE_POOL = 'thread'  # how crop/rotation/flatten candidates are built + hashed: None = serial, 'thread' or 'process'
+CANDIDATE_WORKERS = min(4, os.cpu_count() or 1)   # pool size cap, keep it small next to YOLO/torch's own threads (<= 1 means serial)
+HASH_INDEX = 'brute'       # 'brute' = exact scan of every hash, 'mih' = multi-index hashing (sub-linear, radius = HASH_SIMILARITY_THRESHOLD)
+ADAPTIVE_CANDIDATES = True # hash candidates in waves, most frequent winner first, stop at EARLY_EXIT_THRESHOLD (False = always all of them)
+CANDIDATE_WAVE_SIZE = 4    # candidates per card hashed + searched between early exit checks
+RESULT_CACHE_SIZE = 256    # recognitions remembered per cache layer (file bytes / crop pHash), 0 = no cache, see result_cache.py
+RESULT_CACHE_RADIUS = 3    # crops within this many bits of a cached crop reuse its card
+RESULT_CACHE_FILE = None   # sqlite file for a cache that survives restarts, e.g. os.path.join(os.path.dirname(__file__), 'result_cache.sqlite')
+RESULT_CACHE_DISK_MAX = 100000      # rows per layer kept in RESULT_CACHE_FILE, the oldest are pruned first
+RESULT_CACHE_DISK_MAX_DAYS = 30     # rows older than this are dropped from RESULT_CACHE_FILE (None = kept until the csv changes)
+CANDIDATE_STATS_FILE = os.path.join(os.path.dirname(__file__), 'candidate_stats.json')   # which candidates win, see candidate_scheduler.py (None = memory only)
+PROFILE_STAGES = False     # time every pipeline stage + count candidates / OCR calls per request, see stage_metrics.py
+PROFILE_LOG_FILE = None    # append one JSON line per profiled request here, e.g. os.path.join(os.path.dirname(__file__), 'stage_log.jsonl')
+DEBUG_LEVEL = 'winners'    # debug images in OUTPUT_FOLDER: 'off', 'winners' (winning candidate per card) or 'all' (+ every candidate, OCR ROIs)
+DEBUG_SAMPLE_RATE = 1.0    # fraction of requests that write debug images
+DEBUG_QUEUE_SIZE = 32      # images waiting for the background writer, more are dropped ...
+DEBUG_QUEUE_MB = 64        # ... as are images that would take the queue over this many MB
+DEBUG_MAX_FILES = 500      # retention: oldest debug images are deleted past this count (None = no limit)
+DEBUG_MAX_MB = None        # retention: ... or past this folder size
+DEBUG_MAX_AGE_HOURS = None # retention: ... and when older than this
+SERVICE_WORKERS = 1        # --serve: image requests recognized at the same time (threads sharing the loaded models)
+SERVICE_MAX_QUEUE = 16     # --serve: waiting requests before new ones are rejected (429)
+SERVICE_MAX_BULK_QUEUE = 8 # --serve: ... 'bulk' priority ones are rejected earlier, keeping room for uploads
+SERVICE_QUEUE_TIMEOUT_S = 120  # --serve: requests waiting longer than this are answered 'timeout' instead of run (None = wait forever)
 
 def load_image_from_args():
-    if len(sys.argv) < 3:
-        print("Usage: python final_main.py <image_path> <output_json>")
+    """(encoded image bytes, output json path) from the command line"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(args) < 2:
+        print("Usage: python final_main.py <image_path> <output_json> [--multi]")
+        print("       python final_main.py --bulk <dir | glob | @list.txt> -o results.jsonl  (see bulk_scan.py)")
+        print("       python final_main.py --build-db <reference image folder>  (see build_database.py)")
         sys.exit(2)
 
-    image_path = sys.argv[1]
-    output_json = sys.argv[2]
+    image_path = args[0]
+    output_json = args[1]
 
-    img = cv2.imread(image_path)
-    if img is None:
+    try:
+        with open(image_path, 'rb') as f:
+            image_bytes = f.read()
+    except OSError:
         print("Failed to load image")
         sys.exit(3)
 
-    return img, output_json
+    return image_bytes, output_json
+
+def decode_image(image_bytes):
+    return cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
 
 def normalize_string(s):
     if not s: return ""
     return s.lower().strip()
 
 def load_dual_database(filepath):
+    if USE_COMPILED_DATABASE:
+        return load_compiled_database(filepath)
+    return load_dual_database_csv(filepath)
+
+def load_compiled_database(filepath):
+    print(f"Loading compiled database for {filepath}...")
+    try:
+        card_db = load_card_database(filepath)
+    except FileNotFoundError:
+        print("check db file path name")
+        return None, None
+
+    # rows are CardRow views, only decoded when read (i.e. for the winning match)
+    # the MIH tables come precomputed with the file, like the hashes themselves
+    index_args = {'tables': card_db.mih_tables()} if HASH_INDEX == 'mih' else {}
+    hash_db = make_hash_index(card_db.hashes, card_db.hash_row_sequence(), HASH_INDEX,
+                              radius=HASH_SIMILARITY_THRESHOLD, **index_args)
+    text_db = card_db.text_index()
+    print(f"{len(hash_db)} hashes; {len(text_db)} unique names.")
+    return hash_db, text_db
+
+class CsvRow(dict):
+    """a csv row that knows its line, like card_database.CardRow.row_index"""
+    __slots__ = ('row_index',)
+
+def load_dual_database_csv(filepath):
     print(f"Loading database from {filepath}...")
-    hash_db = {}
-    text_db = {}
+    hash_pairs = []
+    extra_pairs = []
+    text_db = IndexedTextDB()
     
     try:
         with open(filepath, 'r', newline='', encoding='utf-8') as csvfile:
             reader = csv.DictReader(csvfile)
-            for row in reader:
+            for row_index, fields in enumerate(reader):
+                row = CsvRow(fields)
+                # live_database ranks cards sharing a pHash by their line, like this loader picks them
+                row.row_index = row_index
                 if row.get('p_hash'):
-                    card_hash = imagehash.hex_to_hash(row['p_hash'])
-                    hash_db[card_hash] = row
+                    hash_pairs.append((row['p_hash'], row))
+                # augmented hashes from build_database.py, a p_hash with the same value wins
+                for extra in (row.get('extra_hashes') or '').split():
+                    extra_pairs.append((extra, row))
                 
                 raw_name = row.get('name', '')
                 raw_num = row.get('number', '')
@@ -90,6 +178,10 @@ def load_dual_database(filepath):
                     if num_key not in text_db[name_key]: text_db[name_key][num_key] = []
                     text_db[name_key][num_key].append(row)
                     
+        main_hashes = {int(h, 16) for h, _ in hash_pairs}
+        hash_pairs += [(h, row) for h, row in extra_pairs if int(h, 16) not in main_hashes]
+        # pHashes packed into one uint64 array, see hash_index.py
+        hash_db = build_hash_index(hash_pairs, HASH_INDEX, radius=HASH_SIMILARITY_THRESHOLD)
         print(f"{len(hash_db)} hashes; {len(text_db)} unique names.")
         return hash_db, text_db
         
@@ -113,6 +205,20 @@ def parse_ocr_result(text):
             break
     return estimated_name, estimated_number
 
+def fuzzy_name_matches(target_name, database):
+    # names within MAX_NAME_DISTANCE or containing the target, in text_db order
+    name_index = getattr(database, 'name_index', None)
+    if name_index is not None:
+        return name_index.query(target_name, MAX_NAME_DISTANCE)
+
+    matches = []
+    for db_name_key in database.keys():
+        dist = calculate_distance(target_name, db_name_key)
+        is_substring = (target_name in db_name_key) if len(target_name) > 3 else False
+        if dist <= MAX_NAME_DISTANCE or is_substring:
+            matches.append(db_name_key)
+    return matches
+
 def find_candidates_fuzzy(ocr_name, ocr_number, database):
     candidates = []
     target_name = normalize_string(ocr_name)
@@ -120,35 +226,26 @@ def find_candidates_fuzzy(ocr_name, ocr_number, database):
     
     if not target_name: return []
 
-    for db_name_key in database.keys():
-        dist = calculate_distance(target_name, db_name_key)
-        is_substring = (target_name in db_name_key) if len(target_name) > 3 else False
-        
-        if dist <= MAX_NAME_DISTANCE or is_substring:
-            number_map = database[db_name_key]
-            if not target_num:
-                for card_list in number_map.values():
-                    candidates.extend(card_list)
+    for db_name_key in fuzzy_name_matches(target_name, database):
+        number_map = database[db_name_key]
+        if not target_num:
+            for card_list in number_map.values():
+                candidates.extend(card_list)
+        else:
+            if target_num in number_map:
+                candidates.extend(number_map[target_num])
             else:
-                if target_num in number_map:
-                    candidates.extend(number_map[target_num])
-                else:
-                    for db_num_key in number_map.keys():
-                        if calculate_distance(target_num, db_num_key) <= 1:
-                            candidates.extend(number_map[db_num_key])
+                for db_num_key in number_map.keys():
+                    if calculate_distance(target_num, db_num_key) <= 1:
+                        candidates.extend(number_map[db_num_key])
     return candidates
 
 def find_best_hash_match(cropped_card_hash, database):   
-    best_match = None
-    smallest_distance = float('inf')
-    for db_hash, card_info in database.items():
-        distance = cropped_card_hash - db_hash
-        if distance < smallest_distance:
-            smallest_distance = distance
-            best_match = card_info
-    if best_match and smallest_distance <= HASH_SIMILARITY_THRESHOLD:
-        return best_match, smallest_distance
-    return None, smallest_distance
+    return find_best_hash_matches([cropped_card_hash], database)[0]
+
+def find_best_hash_matches(cropped_card_hashes, database):
+    # scores every query hash against the whole db in one vectorized pass
+    return database.best_matches(cropped_card_hashes, HASH_SIMILARITY_THRESHOLD)
 
 def center_crop(image, crop_percent):
     if crop_percent <= 0: return image
@@ -159,178 +256,486 @@ def center_crop(image, crop_percent):
     return image[y_inset : h - y_inset, x_inset : w - x_inset]
 
 def find_card_contour(image):
+    return find_card_quad(image)[0]
+
+def find_card_quad(image):
+    """(contour, clean): clean is True when the outline simplified to exactly 4 corners"""
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
     kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (7, 7))
     closed_mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel, iterations=3)
     contours = cv2.findContours(closed_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     contours = imutils.grab_contours(contours)
-    if not contours: return None
+    if not contours: return None, False
     contours = sorted(contours, key=cv2.contourArea, reverse=True)
     card_contour = contours[0]
     peri = cv2.arcLength(card_contour, True)
     approx = cv2.approxPolyDP(card_contour, 0.02 * peri, True)
-    if len(approx) == 4: return approx
+    if len(approx) == 4: return approx, True
     rect = cv2.minAreaRect(card_contour)
-    return cv2.boxPoints(rect).astype(int)
-
-def identify_smart_hybrid(cv2_image, contour, crop_x1, crop_y1, raw_crop_pil, hash_db, text_db, debug_prefix, output_folder, ocr_pipeline=None):
+    return cv2.boxPoints(rect).astype(int), False
+
+def fold_angle(angle):
+    """line angle in degrees -> tilt in [-45, 45), a card edge is either horizontal or vertical when straight"""
+    return (angle + 45.0) % 90.0 - 45.0
+
+def weighted_tilt(angles, weights):
+    """length weighted median of the folded edge angles, None without edges inside DESKEW_MAX_ANGLE"""
+    angles, weights = np.asarray(angles, dtype=np.float64), np.asarray(weights, dtype=np.float64)
+    keep = (np.abs(angles) <= DESKEW_MAX_ANGLE) & (weights > 0)
+    if not keep.any(): return None
+    angles, weights = angles[keep], weights[keep]
+    order = np.argsort(angles)
+    cumulative = np.cumsum(weights[order])
+    return float(angles[order][np.searchsorted(cumulative, cumulative[-1] / 2)])
+
+def contour_tilt(contour):
+    """clockwise tilt of the card in degrees from the edges of its outline (image y points down)"""
+    if contour is None or len(contour) < 4: return None
+    points = np.asarray(contour, dtype=np.float64).reshape(-1, 2)
+    edges = np.roll(points, -1, axis=0) - points
+    angles = [fold_angle(np.degrees(np.arctan2(dy, dx))) for dx, dy in edges]
+    return weighted_tilt(angles, np.hypot(edges[:, 0], edges[:, 1]))
+
+def hough_tilt(image):
+    """same as contour_tilt from the long straight edges in the crop, for when the outline is unusable"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 50, 150)
+    min_length = 0.3 * min(gray.shape[:2])
+    lines = cv2.HoughLinesP(edges, 1, np.pi / 360, threshold=int(min_length / 2), minLineLength=min_length, maxLineGap=10)
+    if lines is None: return None
+    x1, y1, x2, y2 = lines.reshape(-1, 4).T.astype(np.float64)
+    angles = [fold_angle(a) for a in np.degrees(np.arctan2(y2 - y1, x2 - x1))]
+    return weighted_tilt(angles, np.hypot(x2 - x1, y2 - y1))
+
+def deskew_angles(image, contour, clean_quad=False):
+    """
+    rotate_bound angles that straighten the card, most likely first (0-2 of them).
+    A clean 4 corner outline is trusted alone, otherwise the Hough estimate is
+    added when it disagrees with the outline, or replaces it when there is none.
+    """
+    angles = []
+    tilt = contour_tilt(contour)
+    if tilt is not None:
+        angles.append(tilt)
+    if not clean_quad or tilt is None:
+        line_tilt = hough_tilt(image)
+        if line_tilt is not None and (tilt is None or abs(line_tilt - tilt) >= DESKEW_SECOND_ANGLE):
+            angles.append(line_tilt)
+    # undo the tilt; nearly straight cards are covered by the raw crops
+    return [round(-a, 1) for a in angles if abs(a) >= DESKEW_MIN_ANGLE]
+
+def candidate_specs():
+    # order matters: ties between candidates go to the earlier one
+    if ROTATION_MODE == 'sweep':
+        rotations = [('rotated', angle) for angle in ROTATION_ANGLES]
+    else:
+        # value = index into card['deskew'], the angles deskew_angles() measured
+        rotations = [('deskewed', 0), ('deskewed', 1)]
+    return [('raw', crop_pct) for crop_pct in CROP_LEVELS] + rotations + [('flattened', None)]
+
+def candidate_name(spec):
+    kind, value = spec
+    if kind == 'raw': return f"Raw_{int(value*100)}pct"
+    if kind == 'rotated': return f"Rotated_{value}deg"
+    if kind == 'deskewed': return 'Deskewed' if value == 0 else f"Deskewed_{value + 1}"
+    return 'Flattened'
+
+def flatten_card(cv2_image, contour, crop_x1, crop_y1):
+    # flattened card
+    if contour is None: return None
+    try:
+        full_image_contour = contour + (crop_x1, crop_y1)
+        warped_image = four_point_transform(cv2_image, full_image_contour.reshape(4, 2))
+        if warped_image.shape[1] > warped_image.shape[0]: 
+            warped_image = imutils.rotate_bound(warped_image, angle=90)
+        return warped_image
+    except Exception:
+        return None
+
+def rotate_center(raw_img_cv2, angle):
+    rotated = imutils.rotate_bound(center_crop(raw_img_cv2, 0.12), angle)
+    h, w = rotated.shape[:2]
+    return rotated[4:h-4, 4:w-4]
+
+def deskew_card(raw_img_cv2, angle):
+    """
+    the whole box rotated by angle, cut to the card: a w x h card tilted by a fills a
+    (w cos a + h sin a) x (w sin a + h cos a) box, so its size comes back from the box size
+    """
+    rotated = imutils.rotate_bound(raw_img_cv2, angle)
+    box_h, box_w = raw_img_cv2.shape[:2]
+    cos, sin = np.cos(np.radians(abs(angle))), np.sin(np.radians(abs(angle)))
+    det = cos * cos - sin * sin
+    w, h = (box_w * cos - box_h * sin) / det, (box_h * cos - box_w * sin) / det
+    if w < 16 or h < 16: return rotate_center(raw_img_cv2, angle)
+    rh, rw = rotated.shape[:2]
+    x0, y0 = int(round((rw - w) / 2)), int(round((rh - h) / 2))
+    return rotated[y0:y0 + int(h), x0:x0 + int(w)]
+
+def build_variant(spec, raw_img_cv2, warped_image, deskew=()):
+    kind, value = spec
+    if kind == 'raw':
+        return center_crop(raw_img_cv2, value)
+    if kind == 'rotated':
+        # rotated card
+        return rotate_center(raw_img_cv2, value)
+    if kind == 'deskewed':
+        # rotated by the card's measured tilt
+        return deskew_card(raw_img_cv2, deskew[value]) if value < len(deskew) else None
+    return warped_image
+
+def hash_variants(specs, raw_img_cv2, warped_image, keep_images=True, deskew=()):
+    """builds + hashes the given variants of one card, this is the unit of work handed to the pool"""
+    built = []
+    for spec in specs:
+        image_source = build_variant(spec, raw_img_cv2, warped_image, deskew)
+        if image_source is None or image_source.size == 0: continue
+        built.append((spec, image_source))
+    hashes = phash_bgr_batch([image_source for _, image_source in built])
+    return [(spec, int(c_hash), image_source if keep_images else None)
+            for (spec, image_source), c_hash in zip(built, hashes)]
+
+_candidate_pool = None
+
+def _init_candidate_worker():
+    # one opencv thread per worker process, the pool itself is the parallelism
+    cv2.setNumThreads(1)
+
+def get_candidate_pool():
+    """process-wide pool, created on first use and reused across cards and requests"""
+    global _candidate_pool
+    if CANDIDATE_POOL is None or CANDIDATE_WORKERS <= 1:
+        return None
+    if _candidate_pool is None:
+        if CANDIDATE_POOL == 'process':
+            _candidate_pool = ProcessPoolExecutor(max_workers=CANDIDATE_WORKERS, initializer=_init_candidate_worker)
+        else:
+            _candidate_pool = ThreadPoolExecutor(max_workers=CANDIDATE_WORKERS, thread_name_prefix='candidates')
+    return _candidate_pool
+
+_candidate_scheduler = None
+
+def get_candidate_scheduler():
+    """process-wide scheduler (loads CANDIDATE_STATS_FILE once), None when ADAPTIVE_CANDIDATES is off"""
+    global _candidate_scheduler
+    if not ADAPTIVE_CANDIDATES:
+        return None
+    if _candidate_scheduler is None:
+        _candidate_scheduler = CandidateScheduler(candidate_specs(), candidate_name, CANDIDATE_STATS_FILE, CANDIDATE_WAVE_SIZE)
+    return _candidate_scheduler
+
+_stage_metrics = None
+
+def get_stage_metrics():
+    """process-wide stage profiling collector, a no-op one when PROFILE_STAGES is off"""
+    global _stage_metrics
+    if _stage_metrics is None:
+        _stage_metrics = StageMetrics(PROFILE_STAGES, PROFILE_LOG_FILE)
+    return _stage_metrics
+
+_debug_writer = None
+
+def get_debug_writer():
+    """process-wide background writer for the debug images, see debug_artifacts.py"""
+    global _debug_writer
+    if _debug_writer is None:
+        _debug_writer = DebugArtifactWriter(OUTPUT_FOLDER, DEBUG_LEVEL, DEBUG_SAMPLE_RATE, DEBUG_QUEUE_SIZE, DEBUG_QUEUE_MB,
+                                            DEBUG_MAX_FILES, DEBUG_MAX_MB, DEBUG_MAX_AGE_HOURS)
+        # the OCR module queues its ROIs on this one too
+        set_default_writer(_debug_writer)
+    return _debug_writer
+
+def candidate_waves(card, scheduler):
+    """the card's candidate specs split into the waves they get hashed in"""
+    specs = candidate_specs() if scheduler is None else scheduler.order(card.get('clean_quad', False))
+    if card['warped'] is None:
+        specs = [spec for spec in specs if spec[0] != 'flattened']
+    deskew = card.get('deskew', ())
+    specs = [spec for spec in specs if spec[0] != 'deskewed' or spec[1] < len(deskew)]
+    if scheduler is None:
+        return [specs] if specs else []
+    return scheduler.waves(specs)
+
+def compute_candidates(cards, card_specs):
+    """
+    Hashes the given candidate specs of every card (serially or on the candidate pool).
+    Returns one candidate list per card, in the same order as its specs.
+    """
+    pool = get_candidate_pool()
+    # process workers only send hashes back, the winning image is rebuilt in candidate_image()
+    keep_images = CANDIDATE_POOL != 'process'
+
+    jobs = []
+    for card_index, (card, specs) in enumerate(zip(cards, card_specs)):
+        chunk_count = 1 if pool is None else min(CANDIDATE_WORKERS, len(specs))
+        for chunk in range(chunk_count):
+            chunk_specs = specs[chunk::chunk_count]
+            warped = card['warped'] if ('flattened', None) in chunk_specs else None
+            jobs.append((card_index, (chunk_specs, card['raw_img'], warped, keep_images, card.get('deskew', ()))))
+
+    if pool is None:
+        results = [hash_variants(*args) for _, args in jobs]
+    else:
+        futures = [pool.submit(hash_variants, *args) for _, args in jobs]
+        results = [future.result() for future in futures]
+
+    card_candidates = [[] for _ in cards]
+    for (card_index, _), hashed in zip(jobs, results):
+        for spec, c_hash, image_source in hashed:
+            card_candidates[card_index].append({'type': candidate_name(spec), 'spec': spec, 'match': None, 'dist': None, 'img': image_source, 'hash': c_hash})
+    for candidates, specs in zip(card_candidates, card_specs):
+        order = {spec: i for i, spec in enumerate(specs)}
+        candidates.sort(key=lambda cand: order[cand['spec']])
+    return card_candidates
+
+def search_candidates(cv2_image, cards, hash_db):
+    """
+    Hashes + searches the candidates of every card wave by wave, a card stops getting
+    new waves once one of its candidates is within EARLY_EXIT_THRESHOLD.
+    Returns (candidates, best candidate or None) per card.
+    """
+    scheduler = get_candidate_scheduler()
+    with stage('flatten'):
+        for card in cards:
+            card['warped'] = flatten_card(cv2_image, card['contour'], card['crop_x1'], card['crop_y1'])
+    if ROTATION_MODE == 'deskew':
+        with stage('deskew'):
+            for card in cards:
+                card['deskew'] = deskew_angles(card['raw_img'], card['contour'], card.get('clean_quad', False))
+    waves = [candidate_waves(card, scheduler) for card in cards]
+
+    # ties go to the earlier candidate_specs() entry, whatever order they were hashed in
+    rank = {spec: i for i, spec in enumerate(candidate_specs())}
+    card_candidates = [[] for _ in cards]
+    best_candidates = [None] * len(cards)
+    active = [i for i in range(len(cards)) if waves[i]]
+    wave = 0
+    while active:
+        with stage('candidate_hash'):
+            new_candidates = compute_candidates(cards, [waves[i][wave] if i in active else [] for i in range(len(cards))])
+        all_candidates = [cand for candidates in new_candidates for cand in candidates]
+        count('candidates_evaluated', len(all_candidates))
+
+        # this wave's candidates of all cards searched against the hash db in one batch
+        with stage('hash_search'):
+            matches = find_best_hash_matches([cand['hash'] for cand in all_candidates], hash_db)
+        for cand, (match, dist) in zip(all_candidates, matches):
+            cand['match'], cand['dist'] = match, dist
+
+        for i in active:
+            for cand in new_candidates[i]:
+                best = best_candidates[i]
+                if best is None or (cand['dist'], rank[cand['spec']]) < (best['dist'], rank[best['spec']]):
+                    best_candidates[i] = cand
+            card_candidates[i].extend(new_candidates[i])
+
+        wave += 1
+        active = [i for i in active if wave < len(waves[i]) and
+                  (best_candidates[i] is None or best_candidates[i]['dist'] > EARLY_EXIT_THRESHOLD)]
+
+    count('early_exits', sum(1 for best in best_candidates if best is not None and best['dist'] <= EARLY_EXIT_THRESHOLD))
+    if scheduler is not None:
+        for candidates, best in zip(card_candidates, best_candidates):
+            early_exit = best is not None and best['dist'] <= EARLY_EXIT_THRESHOLD
+            # a card nothing matched has no winner, its best is only the first candidate in rank order
+            matched = best is not None and best['dist'] <= HASH_SIMILARITY_THRESHOLD
+            scheduler.record([cand['type'] for cand in candidates], best['type'] if matched else None, early_exit)
+    return list(zip(card_candidates, best_candidates))
+
+def candidate_image(cand, card):
+    if cand['img'] is None:
+        cand['img'] = build_variant(cand['spec'], card['raw_img'], card['warped'], card.get('deskew', ()))
+    return cand['img']
+
+def compute_phash(image_source):
+    # same bits as imagehash.phash on the RGB PIL image, as a uint64 int (see native_phash.py)
+    return int(phash_bgr_batch([image_source])[0])
+
+def resolve_with_ocr(best_candidate, ocr_result, text_db):
+    """OCR text -> fuzzy name candidates re-ranked by hash distance. (card, dist) or None to fall back"""
+    ocr_text = ocr_result.get('text', '').strip()
+    ocr_conf = ocr_result.get('confidence', 0.0)
     
-    raw_img_cv2 = cv2.cvtColor(np.array(raw_crop_pil), cv2.COLOR_RGB2BGR)
+    if not ocr_text or ocr_conf < OCR_CONFIDENCE_THRESHOLD:
+        return None
 
-    candidates = []
-    best_candidate_so_far = None
-
-    def process_phash_candidate(name, image_source):
-        nonlocal best_candidate_so_far
-        if image_source is None or image_source.size == 0: return False
-        
-        pil_conv = Image.fromarray(cv2.cvtColor(image_source, cv2.COLOR_BGR2RGB))
-        c_hash = imagehash.phash(pil_conv)
-        match, dist = find_best_hash_match(c_hash, hash_db)
-        
-        cand = {'type': name, 'match': match, 'dist': dist, 'img': image_source, 'hash': c_hash}
-        candidates.append(cand)
-
-        if best_candidate_so_far is None or dist < best_candidate_so_far['dist']:
-            best_candidate_so_far = cand
-        return False
-
-    for crop_pct in CROP_LEVELS:
-        process_phash_candidate(f"Raw_{int(crop_pct*100)}pct", center_crop(raw_img_cv2, crop_pct))
+    print(f"OCR TEXT: '{ocr_text}' w/ CONFIDENCE: {ocr_conf:.2f}")
+    
+    with stage('fuzzy_search'):
+        est_name, est_num = parse_ocr_result(ocr_text)
+        text_candidates = find_candidates_fuzzy(est_name, est_num, text_db)
+    count('text_candidates', len(text_candidates))
+    
+    if not text_candidates:
+        return None
 
-    # rotated card
-    base_for_rotation = center_crop(raw_img_cv2, 0.12)
-    for angle in range(-6, 7, 2):
-        rotated = imutils.rotate_bound(base_for_rotation, angle)
-        h, w = rotated.shape[:2]
-        rotated_clean = rotated[4:h-4, 4:w-4] 
-        process_phash_candidate(f"Rotated_{angle}deg", rotated_clean)
+    print(f"There are {len(text_candidates)} candidates")
+    
+    current_hash = best_candidate['hash']
+    ranked_candidates = []
+    
+    for cand in text_candidates:
+        if cand.get('p_hash'):
+            # closest of the card's hashes, the augmented ones included
+            db_hashes = [cand['p_hash']] + (cand.get('extra_hashes') or '').split()
+            dist = min(bin(current_hash ^ int(db_hash, 16)).count('1') for db_hash in db_hashes)
+            # if the exact name is found give it more priority(?)
+            if normalize_string(cand['name']) == normalize_string(est_name):
+                dist -= 7
+            ranked_candidates.append((dist, cand))
+
+    ranked_candidates.sort(key=lambda x: x[0])
+    
+    if not ranked_candidates:
+        return None
 
-    # flattened card
-    if contour is not None:
-        try:
-            full_image_contour = contour + (crop_x1, crop_y1)
-            warped_image = four_point_transform(cv2_image, full_image_contour.reshape(4, 2))
-            if warped_image.shape[1] > warped_image.shape[0]: 
-                warped_image = imutils.rotate_bound(warped_image, angle=90)
-            process_phash_candidate('Flattened', warped_image)
-        except Exception: pass
-
-    # early exit if true ?
-    if best_candidate_so_far['dist'] <= EARLY_EXIT_THRESHOLD:
-        print(f"Early exit: {best_candidate_so_far['match']['name']} w/ Dist: {best_candidate_so_far['dist']}")
-        return best_candidate_so_far['match'], best_candidate_so_far['dist'], best_candidate_so_far['img']
+    best_hybrid_dist, best_hybrid_card = ranked_candidates[0]
+    print(f"Best OCR+search Match: {best_hybrid_card['name']} w/ Dist: {best_hybrid_dist}")
+    
+    # only accept OCR results if it meets the threshold, else fallbcak to original method
+    if best_hybrid_dist < 12:
+        return best_hybrid_card, best_hybrid_dist
+    print(f"RESULT has distance: {best_hybrid_dist} >= 12. Fallback")
+    return None
+
+def identify_cards_batch(cv2_image, cards, hash_db, text_db, output_folder, ocr_pipeline=None, cache=None, cache_version=None):
+    """
+    Identifies several cards from the same photo at once: candidates of every card are
+    hashed and searched in shared batches, and the cards without an early exit share one OCR batch.
+    cards: dicts with 'contour', 'crop_x1', 'crop_y1', 'raw_img' (BGR crop), 'debug_prefix'
+    and optionally 'clean_quad' (contour had exactly 4 corners, try the flattened warp first)
+    cache: ResultCache, cards whose crop pHash is near an already identified crop reuse that card
+    cache_version: version of the database hash_db / text_db come from (live_database.py), results of another one aren't cached
+    returns [(match, dist, best_img), ...] in the same order as cards
+    """
+    if cache is None:
+        return identify_cards_uncached(cv2_image, cards, hash_db, text_db, output_folder, ocr_pipeline)
+
+    results = [None] * len(cards)
+    misses = []
+    with stage('cache_lookup'):
+        crop_hashes = phash_bgr_batch([card['raw_img'] for card in cards])
+        for i, crop_hash in enumerate(crop_hashes):
+            cached = cache.get_phash(crop_hash, cache_version)
+            if cached is MISS:
+                misses.append(i)
+                continue
+            card, dist = cached
+            print(f"Cache hit: {card.get('name')} w/ Dist: {dist}")
+            results[i] = (card, dist, cards[i]['raw_img'])
+    count('crop_cache_hits', len(cards) - len(misses))
+
+    if misses:
+        identified = identify_cards_uncached(cv2_image, [cards[i] for i in misses], hash_db, text_db, output_folder, ocr_pipeline)
+        for i, result in zip(misses, identified):
+            results[i] = result
+            # only identified cards are remembered, a miss may work out on the next shot
+            if result[0] is not None:
+                cache.put_phash(crop_hashes[i], result[0], int(result[1]), cache_version)
+    return results
+
+def identify_cards_uncached(cv2_image, cards, hash_db, text_db, output_folder, ocr_pipeline=None):
+    searched = search_candidates(cv2_image, cards, hash_db)
+    write_candidate_images(cards, searched)
+
+    results = [None] * len(cards)
+    best_candidates = [best for _, best in searched]
+    needs_ocr = []
+    for i, (candidates, best_candidate_so_far) in enumerate(searched):
+        if best_candidate_so_far is None:
+            results[i] = (None, float('inf'), None)
+        # early exit if true ?
+        elif best_candidate_so_far['dist'] <= EARLY_EXIT_THRESHOLD:
+            print(f"Early exit: {best_candidate_so_far['match']['name']} w/ Dist: {best_candidate_so_far['dist']} ({best_candidate_so_far['type']}, {len(candidates)} candidates hashed)")
+            results[i] = (best_candidate_so_far['match'], best_candidate_so_far['dist'], candidate_image(best_candidate_so_far, cards[i]))
+        else:
+            candidate_image(best_candidate_so_far, cards[i])
+            needs_ocr.append(i)
 
     # OCR
-    if ocr_pipeline is not None:
+    if ocr_pipeline is not None and needs_ocr:
+        count('ocr_cards', len(needs_ocr))
+        ocr_results = [None] * len(needs_ocr)
         try:
-            best_aligned_img = best_candidate_so_far['img']
-            roi_path = os.path.join(output_folder, f"{debug_prefix}_OCR_ROI.jpg")
-            
-            ocr_result = ocr_pipeline.extract_text_from_card(
-                best_aligned_img, 
-                preprocess=True,
-                save_roi_path=roi_path
-            )
-            
-            ocr_text = ocr_result.get('text', '').strip()
-            ocr_conf = ocr_result.get('confidence', 0.0)
-            
-            if ocr_text and ocr_conf >= OCR_CONFIDENCE_THRESHOLD:
-                print(f"OCR TEXT: '{ocr_text}' w/ CONFIDENCE: {ocr_conf:.2f}")
-                
-                est_name, est_num = parse_ocr_result(ocr_text)
-                text_candidates = find_candidates_fuzzy(est_name, est_num, text_db)
-                
-                if text_candidates:
-                    print(f"There are {len(text_candidates)} candidates")
-                    
-                    current_hash = best_candidate_so_far['hash']
-                    ranked_candidates = []
-                    
-                    for cand in text_candidates:
-                        if cand.get('p_hash'):
-                            db_hash = imagehash.hex_to_hash(cand['p_hash'])
-                            dist = current_hash - db_hash
-                            # if the exact name is found give it more priority(?)
-                            if normalize_string(cand['name']) == normalize_string(est_name):
-                                dist -= 7
-                            ranked_candidates.append((dist, cand))
-                
-                    ranked_candidates.sort(key=lambda x: x[0])
-                    
-                    if ranked_candidates:
-                        best_hybrid_dist, best_hybrid_card = ranked_candidates[0]
-                        print(f"Best OCR+search Match: {best_hybrid_card['name']} w/ Dist: {best_hybrid_dist}")
-                        
-                        # only accept OCR results if it meets the threshold, else fallbcak to original method
-                        if best_hybrid_dist < 12:
-                            return best_hybrid_card, best_hybrid_dist, best_aligned_img
-                        else:
-                            print(f"RESULT has distance: {best_hybrid_dist} >= 12. Fallback")
-
+            # ROIs are only saved for cards of requests at debug level 'all'
+            roi_paths = [os.path.join(output_folder, f"{cards[i]['debug_prefix']}_OCR_ROI.jpg")
+                         if cards[i].get('debug_level') == 'all' else None for i in needs_ocr]
+            with stage('ocr'):
+                ocr_results = ocr_pipeline.extract_text_batch(
+                    [best_candidates[i]['img'] for i in needs_ocr],
+                    preprocess=True,
+                    save_roi_paths=roi_paths if any(roi_paths) else None
+                )
         except Exception as e:
             print(f"error: {e}")
 
+        for i, ocr_result in zip(needs_ocr, ocr_results):
+            if ocr_result is None: continue
+            try:
+                hybrid = resolve_with_ocr(best_candidates[i], ocr_result, text_db)
+                if hybrid:
+                    results[i] = (hybrid[0], hybrid[1], best_candidates[i]['img'])
+            except Exception as e:
+                print(f"error: {e}")
+
+    for i in needs_ocr:
+        if results[i] is None:
+            print(f"OCR failed, fallback")
+            best_candidate_so_far = best_candidates[i]
+            results[i] = (best_candidate_so_far['match'], best_candidate_so_far['dist'], best_candidate_so_far['img'])
+    return results
+
+def write_candidate_images(cards, searched):
+    """debug level 'all': queues every hashed candidate of the card, named after its type + distance"""
+    for card, (candidates, _) in zip(cards, searched):
+        if card.get('debug_level') != 'all': continue
+        writer = get_debug_writer()
+        with stage('debug_write'):
+            for cand in candidates:
+                writer.submit(f"{card['debug_prefix']}_{cand['type']}_d{cand['dist']}.jpg", candidate_image(cand, card))
 
-    print(f"OCR failed, fallback")
-    return best_candidate_so_far['match'], best_candidate_so_far['dist'], best_candidate_so_far['img']
+def identify_smart_hybrid(cv2_image, contour, crop_x1, crop_y1, raw_crop_pil, hash_db, text_db, debug_prefix, output_folder, ocr_pipeline=None):
+    
+    raw_img_cv2 = cv2.cvtColor(np.array(raw_crop_pil), cv2.COLOR_RGB2BGR)
+    card = {'contour': contour, 'crop_x1': crop_x1, 'crop_y1': crop_y1, 'raw_img': raw_img_cv2, 'debug_prefix': debug_prefix}
+    return identify_cards_batch(cv2_image, [card], hash_db, text_db, output_folder, ocr_pipeline)[0]
 
 
-def main():
-    model = YOLO(MODEL_PATH)
-    
-    hash_db, text_db = load_dual_database(DATABASE_FILE)
-    if hash_db is None: return 
+def load_resources():
+    model = make_detector(DETECTION_BACKEND, MODEL_PATH, DETECTION_IMGSZ, DETECTION_INT8)
     
-    ocr_pipeline = None
     try:
-        ocr_pipeline = PokemonCardOCR(use_gpu=False)
-        if ocr_pipeline.ocr is None:
-            print("OCR Engine not working?")
-            ocr_pipeline = None
-        else:
-            print("OCR initialized")
-    except Exception as e:
-        print(f" OCR error: {e}")
+        database = LiveDatabase(DATABASE_FILE, load_dual_database, DB_RELOAD_CHECK_S)
+    except FileNotFoundError:
+        return None
+    
+    # engines are loaded by the pool on the first card that needs OCR, not here
+    ocr_pipeline = get_ocr_pool(OCR_POOL_SIZE, use_gpu=False, name_mode=OCR_NAME_MODE, rec_min_confidence=OCR_CONFIDENCE_THRESHOLD)
+    if ocr_pipeline.unavailable:
+        print("OCR Engine not working?")
+        ocr_pipeline = None
+    elif OCR_PRELOAD and ocr_pipeline.preload():
+        print("OCR initialized")
     
+    cache = None
+    if RESULT_CACHE_SIZE > 0:
+        cache = ResultCache(DATABASE_FILE, RESULT_CACHE_SIZE, RESULT_CACHE_RADIUS, RESULT_CACHE_FILE,
+                            version_source=lambda: database.version, disk_max_entries=RESULT_CACHE_DISK_MAX,
+                            disk_max_age_s=RESULT_CACHE_DISK_MAX_DAYS * 86400 if RESULT_CACHE_DISK_MAX_DAYS else None)
+
     os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-    cv2_image, output_json_path = load_image_from_args()
+    return {'model': model, 'database': database, 'ocr_pipeline': ocr_pipeline, 'cache': cache}
 
-    if cv2_image is None: 
-        print(f"Error: Could not load image {IMAGE_PATH}")
-        return
-    
-    pil_image = Image.fromarray(cv2.cvtColor(cv2_image, cv2.COLOR_BGR2RGB))
-    annotated_image = cv2_image.copy()
-    results = model(cv2_image, verbose=False)
-    card_count = 0
-
-    for result in results:
-        for box in result.boxes:
-            if box.conf[0] > YOLO_CONFIDENCE_THRESHOLD:
-                print(f"\n--- Card #{card_count} ---")
-                x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                crop_x1, crop_y1 = max(0, x1), max(0, y1)
-                crop_x2, crop_y2 = min(cv2_image.shape[1], x2), min(cv2_image.shape[0], y2)
-                
-                card_crop_cv2 = cv2_image[crop_y1:crop_y2, crop_x1:crop_x2]
-                cropped_card_pil = pil_image.crop((crop_x1, crop_y1, crop_x2, crop_y2))
-                contour_in_crop = find_card_contour(card_crop_cv2)
-                
-                debug_prefix = f"debug_card_{card_count}_card"
-                start_time = time.time()
-                
-                identified_card, distance, best_image = identify_smart_hybrid(
-                    cv2_image, contour_in_crop, crop_x1, crop_y1, cropped_card_pil, 
-                    hash_db, text_db, debug_prefix, OUTPUT_FOLDER, ocr_pipeline
-                )
-                
-                elapsed_ms = (time.time() - start_time) * 1000
+def database_snapshot(resources):
+    """the database a request uses from start to end, a reload or delta meanwhile doesn't change it"""
+    database = resources.get('database')
+    if database is not None:
+        return database.current()
+    return DatabaseSnapshot(resources['hash_db'], resources['text_db'], None)
 
-    if identified_card:
-        output_data = {
+def build_output_data(identified_card):
+    return {
         "id": identified_card.get("id"),
         "name": identified_card.get("name"),
         "set_name": identified_card.get("set_name"),
@@ -339,48 +744,198 @@ def main():
         "types": identified_card.get("types"),
         "rarity": identified_card.get("rarity"),
         "image_url": identified_card.get("image_url")
-        }
-
-        with open(output_json_path, "w") as f:
-            json.dump(output_data, f, indent=2)
-
-        print("Card data exported to", output_json_path)
-    else:
-        print("No card identified")
-        sys.exit(3)
-
+    }
+
+def detect_cards(model, cv2_image):
+    """YOLO boxes above YOLO_CONFIDENCE_THRESHOLD as (x1, y1, x2, y2, conf)"""
+    return detect_cards_batch(model, [cv2_image])[0]
+
+def detect_cards_batch(model, cv2_images):
+    """detect_cards for several images in one inference call"""
+    scaled = [downscale_for_detection(img) for img in cv2_images]
+    detections = model.detect_batch([small for small, _, _ in scaled], YOLO_CONFIDENCE_THRESHOLD)
+    return [scale_boxes(boxes, sx, sy, img.shape) for boxes, (_, sx, sy), img in zip(detections, scaled, cv2_images)]
+
+def downscale_for_detection(cv2_image):
+    """(image, sx, sy): the photo with its long side <= DETECTION_MAX_SIDE and the factors back to full size"""
+    h, w = cv2_image.shape[:2]
+    if not DETECTION_MAX_SIDE or max(h, w) <= DETECTION_MAX_SIDE:
+        return cv2_image, 1.0, 1.0
+    # the detector letterboxes to DETECTION_IMGSZ anyway, INTER_AREA gives it a cleaner image than its own resize
+    scale = DETECTION_MAX_SIDE / max(h, w)
+    small = cv2.resize(cv2_image, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+    return small, w / small.shape[1], h / small.shape[0]
+
+def scale_boxes(boxes, sx, sy, shape):
+    """boxes found on the downscaled image -> full resolution pixels, rounded outwards"""
+    if sx == 1.0 and sy == 1.0:
+        return boxes
+    h, w = shape[:2]
+    return [(max(0, int(np.floor(x1 * sx))), max(0, int(np.floor(y1 * sy))),
+             min(w, int(np.ceil(x2 * sx))), min(h, int(np.ceil(y2 * sy))), conf)
+            for x1, y1, x2, y2, conf in boxes]
+
+def json_distance(distance):
+    return int(distance) if distance is not None and np.isfinite(distance) else None
+
+def recognize_image(cv2_image, resources, multi=False, snapshot=None):
+    """
+    single card mode: returns the output json dict of the last detected card, or None
+    multi card mode: returns a list with one entry per detected card (bbox, confidence, distance, card or None)
+    snapshot: the database to use (default: the current one, see database_snapshot)
+    """
+    model = resources['model']
+    snapshot = snapshot or database_snapshot(resources)
+    hash_db, text_db = snapshot.hash_db, snapshot.text_db
+    ocr_pipeline = resources['ocr_pipeline']
+
+    # debug images of this request, if it's sampled, go to the background writer under a unique prefix
+    debug_writer = get_debug_writer()
+    debug_level = debug_writer.request_level()
+    request_tag = debug_writer.request_tag() if debug_level != 'off' else None
+    # only debug output needs a full resolution copy to draw on
+    annotated_image = cv2_image.copy() if SAVE_ANNOTATED_IMAGE and debug_level != 'off' else None
+    with stage('detect'):
+        detections = detect_cards(model, cv2_image)
+    count('cards_detected', len(detections))
+
+    cards = []
+    with stage('contour'):
+        for card_count, (x1, y1, x2, y2, conf) in enumerate(detections):
+            crop_x1, crop_y1 = max(0, x1), max(0, y1)
+            crop_x2, crop_y2 = min(cv2_image.shape[1], x2), min(cv2_image.shape[0], y2)
+
+            # straight from the full resolution array, same pixels the PIL crop used to give
+            card_crop_cv2 = cv2_image[crop_y1:crop_y2, crop_x1:crop_x2]
+            contour, clean_quad = find_card_quad(card_crop_cv2)
+            cards.append({
+                'contour': contour, 'clean_quad': clean_quad,
+                'crop_x1': crop_x1, 'crop_y1': crop_y1,
+                'raw_img': card_crop_cv2,
+                'debug_prefix': f"{request_tag}_debug_card_{card_count}_card" if request_tag else f"debug_card_{card_count}_card",
+                'debug_level': debug_level,
+            })
+
+    start_time = time.time()
+    identified = identify_cards_batch(cv2_image, cards, hash_db, text_db, OUTPUT_FOLDER, ocr_pipeline, resources.get('cache'), snapshot.version)
+    elapsed_ms = (time.time() - start_time) * 1000
+
+    entries = []
+    identified_card = None
+    for card_count, ((x1, y1, x2, y2, conf), card, (identified_card, distance, best_image)) in enumerate(zip(detections, cards, identified)):
+        print(f"\n--- Card #{card_count} ---")
+        if identified_card:
+            c_name = identified_card.get('name', 'N/A')
+            c_set = identified_card.get('set_name', 'N/A')
+            c_id = identified_card.get('id', 'N/A')
+            c_num = identified_card.get('number', 'N/A')
+                            
+            print(f"    IDENTIFIED CARD:")
+            print(f"    - Name:   {c_name}")
+            print(f"    - Set:    {c_set}")
+            print(f"    - ID:     {c_id}")
+            print(f"    - Number: {c_num}")
+            print(f"    - Dist: {distance}")
+
+            label_text = f"{c_name} | {c_set} #{c_num}"
+        else:
+            label_text = f"No card w/ Dist: {distance}"
+            print(f"No confident match found.")
+
+        if annotated_image is not None:
+            color = (0, 255, 0) if (identified_card) else (0, 0, 255)
+            cv2.rectangle(annotated_image, (x1, y1), (x2, y2), color, 2)
+            cv2.putText(annotated_image, label_text, (x1, y1 - 10), 
+            cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+        
+        if best_image is not None and debug_level != 'off':
+            with stage('debug_write'):
+                debug_writer.submit(f"{card['debug_prefix']}_WINNER.jpg", best_image)
+
+        entries.append({
+            'bbox': [x1, y1, x2, y2],
+            'confidence': round(conf, 4),
+            'distance': json_distance(distance),
+            'card': build_output_data(identified_card) if identified_card else None,
+        })
+
+    print(f"Time: {elapsed_ms:.2f} ms aka {elapsed_ms/1000:.2f} secs for {len(cards)} card(s)")
                 
+    if annotated_image is not None:
+        with stage('debug_write'):
+            debug_writer.submit(f"{request_tag}_identified_all_cards.jpg", annotated_image)
+    if multi:
+        return entries
     if identified_card:
-        c_name = identified_card.get('name', 'N/A')
-        c_set = identified_card.get('set_name', 'N/A')
-        c_id = identified_card.get('id', 'N/A')
-        c_num = identified_card.get('number', 'N/A')
-                        
-        print(f"    IDENTIFIED CARD:")
-        print(f"    - Name:   {c_name}")
-        print(f"    - Set:    {c_set}")
-        print(f"    - ID:     {c_id}")
-        print(f"    - Number: {c_num}")
-        print(f"    - Dist: {distance}")
-
-        label_text = f"{c_name} | {c_set} #{c_num}"
-    else:
-        label_text = f"No card w/ Dist: {distance}"
-        print(f"No confident match found.")
+        return build_output_data(identified_card)
+    return None
+
+def recognize_image_bytes(image_bytes, resources, multi=False):
+    """
+    recognize_image for an uploaded file, a byte-identical upload is answered from the result cache.
+    returns (decoded, output_data), decoded is False when the bytes are not an image
+    """
+    cache = resources.get('cache')
+    snapshot = database_snapshot(resources)
+    key = file_key(image_bytes, multi) if cache is not None else None
+    if key is not None:
+        output_data = cache.get_file(key, snapshot.version)
+        if output_data is not MISS:
+            print("Cache hit for uploaded file")
+            count('file_cache_hits')
+            return True, output_data
+
+    with stage('decode'):
+        cv2_image = decode_image(image_bytes)
+    if cv2_image is None:
+        return False, None
+    output_data = recognize_image(cv2_image, resources, multi=multi, snapshot=snapshot)
+    if key is not None:
+        cache.put_file(key, output_data, snapshot.version)
+    return True, output_data
+
+def write_output_json(output_data, output_json_path):
+    with stage('json_export'), open(output_json_path, "w") as f:
+        json.dump(output_data, f, indent=2)
+    print("Card data exported to", output_json_path)
 
-        print(f"Time: {elapsed_ms:.2f} ms aka {elapsed_ms/1000:.2f} secs")
 
-        color = (0, 255, 0) if (identified_card) else (0, 0, 255)
-        cv2.rectangle(annotated_image, (x1, y1), (x2, y2), color, 2)
-        cv2.putText(annotated_image, label_text, (x1, y1 - 10), 
-        cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-                
-        if best_image is not None:
-            cv2.imwrite(os.path.join(OUTPUT_FOLDER, f"{debug_prefix}_WINNER.jpg"), best_image)
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        # long-lived worker: models + databases are loaded once, see recognition_service.py
+        from recognition_service import serve_jsonl
+        serve_jsonl()
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == '--bulk':
+        # whole collections: directory / glob / @list in, JSON lines out, see bulk_scan.py
+        from bulk_scan import main as bulk_main
+        bulk_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == '--build-db':
+        # rehash the database from reference images, see build_database.py
+        from build_database import main as build_main
+        build_main(sys.argv[2:])
+        return
+
+    resources = load_resources()
+    if resources is None: return
+    
+    image_bytes, output_json_path = load_image_from_args()
+
+    # --multi: every detected card goes into the json as an array instead of just the last one
+    multi = '--multi' in sys.argv[1:]
+    with get_stage_metrics().request(output_json_path):
+        decoded, output_data = recognize_image_bytes(image_bytes, resources, multi=multi)
+        found = decoded and (any(entry['card'] for entry in output_data) if multi else output_data)
+        if found:
+            write_output_json(output_data, output_json_path)
+    if not decoded:
+        print("Failed to load image")
+        sys.exit(3)
+    if not found:
+        print("No card identified")
+        sys.exit(3)
 
-            card_count += 1
-                
-    #cv2.imwrite(os.path.join(OUTPUT_FOLDER, f"identified_all_cards"), annotated_image)
     print("\nFinished")
 
 if __name__ == "__main__":
@@ -0,0 +1,334 @@
+"""
+Packed uint64 pHash indexes: 'brute' (XOR + popcount over every row) and
+'mih' (multi-index hashing over 4 x 16 bit chunks). LayeredHashIndex puts a
+live_database delta over either without rebuilding it.
+"""
+
+import copy
+from collections.abc import Sequence
+
+import numpy as np
+
+if hasattr(np, 'bitwise_count'):
+    # numpy >= 2.0
+    def popcount64(values):
+        return np.bitwise_count(values)
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcount64(values):
+        values = np.ascontiguousarray(values, dtype=np.uint64)
+        as_bytes = values.view(np.uint8).reshape(values.shape + (8,))
+        return _POPCOUNT_TABLE[as_bytes].sum(axis=-1, dtype=np.uint8)
+
+# max number of (query x db) distances materialised at once
+MAX_BATCH_CELLS = 1 << 22
+# distance of a hidden row, farther than any 64 bit hash can be
+HIDDEN_DISTANCE = 255
+
+
+def hash_to_int(value):
+    """ImageHash / hex string / int -> python int with the same bit order as str(ImageHash)."""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, str):
+        return int(value, 16)
+    bits = np.packbits(np.asarray(value.hash, dtype=bool).flatten())
+    return int.from_bytes(bits.tobytes(), 'big')
+
+
+def hamming_distances(query, hashes):
+    """Distances from one hash to every entry of a uint64 array."""
+    return popcount64(np.bitwise_xor(hashes, np.uint64(hash_to_int(query))))
+
+
+class BruteForceHashIndex:
+    """Linear XOR + popcount scan over the packed hash array."""
+
+    def __init__(self, hashes, rows, radius=None):
+        self.hashes = np.ascontiguousarray(hashes, dtype=np.uint64)
+        self.rows = rows
+        self.radius = radius
+        # bool per row, True = left out of every result (see masked)
+        self.hidden = None
+
+    def masked(self, hidden):
+        """the same index (arrays / tables shared, not copied) with the hidden rows left out"""
+        index = copy.copy(self)
+        index.hidden = hidden if hidden is not None and hidden.any() else None
+        return index
+
+    def _hide(self, dists, idx=Ellipsis):
+        # hidden rows get a distance no real match can have
+        if self.hidden is not None:
+            dists[..., self.hidden[idx]] = HIDDEN_DISTANCE
+        return dists
+
+    @classmethod
+    def from_pairs(cls, pairs, **kwargs):
+        """
+        Builds the index from (hash, row) pairs with the same semantics as
+        filling a dict: a repeated hash keeps its first position but takes
+        the row that was seen last.
+        """
+        by_hash = {}
+        for card_hash, row in pairs:
+            by_hash[hash_to_int(card_hash)] = row
+        hashes = np.fromiter(by_hash.keys(), dtype=np.uint64, count=len(by_hash))
+        return cls(hashes, list(by_hash.values()), **kwargs)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def search(self, query_hashes, radius=None):
+        """
+        Nearest neighbour for every query hash.
+        Returns (index, distance) arrays; ties go to the lowest index like the old linear scan.
+        radius is only a hint for sub-linear indexes, the brute force scan is always exact.
+        """
+        queries = np.asarray([hash_to_int(q) for q in query_hashes], dtype=np.uint64)
+        best_idx = np.full(len(queries), -1, dtype=np.int64)
+        best_dist = np.full(len(queries), np.iinfo(np.int64).max, dtype=np.int64)
+        if len(self.hashes) == 0 or len(queries) == 0:
+            return best_idx, best_dist
+
+        step = max(1, MAX_BATCH_CELLS // len(self.hashes))
+        for start in range(0, len(queries), step):
+            block = queries[start:start + step, None]
+            dists = self._hide(popcount64(np.bitwise_xor(block, self.hashes[None, :])))
+            idx = np.argmin(dists, axis=1)
+            best_idx[start:start + step] = idx
+            best_dist[start:start + step] = dists[np.arange(len(idx)), idx]
+        return best_idx, best_dist
+
+    def radius_query(self, query_hash, radius):
+        """(indices, distances) of every row within radius, sorted by distance then index."""
+        dists = self._hide(hamming_distances(query_hash, self.hashes))
+        idx = np.flatnonzero(dists <= radius)
+        order = np.lexsort((idx, dists[idx]))
+        return idx[order], dists[idx][order].astype(np.int64)
+
+    def topk(self, query_hash, k):
+        """(indices, distances) of the k nearest rows, ties broken by index."""
+        dists = self._hide(hamming_distances(query_hash, self.hashes).astype(np.int64))
+        k = min(k, len(dists))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        part = np.argpartition(dists, k - 1)[:k]
+        # rows tied with the k-th distance may sit outside the partition, pick the lowest indices
+        kth = dists[part].max()
+        idx = np.concatenate([np.flatnonzero(dists < kth), np.flatnonzero(dists == kth)])[:k]
+        order = np.lexsort((idx, dists[idx]))
+        return idx[order], dists[idx][order]
+
+    def best_matches(self, query_hashes, threshold):
+        """[(row or None, distance), ...] per query, same contract as find_best_hash_match."""
+        results = []
+        best_idx, best_dist = self.search(query_hashes, radius=threshold)
+        for idx, dist in zip(best_idx, best_dist):
+            if idx < 0:
+                results.append((None, float('inf')))
+            elif dist <= threshold:
+                results.append((self.rows[idx], int(dist)))
+            else:
+                results.append((None, int(dist)))
+        return results
+
+
+CHUNK_BITS = 16
+CHUNK_COUNT = 64 // CHUNK_BITS
+CHUNK_MASK = np.uint64((1 << CHUNK_BITS) - 1)
+# widest per-chunk radius worth enumerating, past this topk() falls back to a full scan
+MAX_CHUNK_RADIUS = 4
+
+# every 16 bit flip pattern, ordered by how many bits it flips
+_CHUNK_FLIPS = np.array(sorted(range(1 << CHUNK_BITS), key=lambda v: (bin(v).count('1'), v)), dtype=np.int64)
+_FLIPS_UP_TO = np.searchsorted(
+    np.array([bin(int(v)).count('1') for v in _CHUNK_FLIPS]), np.arange(CHUNK_BITS + 1), side='right')
+
+
+def chunk_tables(hashes):
+    """[(order, offsets)] per 16 bit chunk: rows sorted by chunk value and where each value starts"""
+    index_dtype = np.int32 if len(hashes) < 2 ** 31 else np.int64
+    tables = []
+    for chunk in range(CHUNK_COUNT):
+        keys = ((hashes >> np.uint64(chunk * CHUNK_BITS)) & CHUNK_MASK).astype(np.int64)
+        order = np.argsort(keys, kind='stable').astype(index_dtype)
+        counts = np.bincount(keys, minlength=1 << CHUNK_BITS)
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        tables.append((order, offsets))
+    return tables
+
+
+class MultiIndexHashIndex(BruteForceHashIndex):
+    """
+    Multi-index hashing (Norouzi et al.): each hash is split into 4 x 16 bit
+    chunks and every chunk gets its own lookup table. If two hashes are within
+    r bits, at least one chunk differs by at most r // 4 bits, so a radius
+    query only probes the table buckets near the query chunks and verifies
+    those rows, instead of scanning everything.
+
+    Matches within the radius are identical to the brute force index. A query
+    with nothing inside the radius reports radius + 1 as its distance (a lower
+    bound) because the real nearest row was never looked at.
+    """
+
+    def __init__(self, hashes, rows, radius=14, tables=None):
+        """tables: precomputed chunk_tables(hashes), e.g. mapped from the compiled card database"""
+        super().__init__(hashes, rows, radius)
+        self.tables = tables if tables is not None else chunk_tables(self.hashes)
+
+    def _probe(self, query, chunk_radius):
+        """Rows whose chunk differs from the query chunk by exactly chunk_radius bits, in any table."""
+        flips = _CHUNK_FLIPS[_FLIPS_UP_TO[chunk_radius - 1] if chunk_radius else 0:_FLIPS_UP_TO[chunk_radius]]
+        found = []
+        for chunk, (order, offsets) in enumerate(self.tables):
+            keys = ((query >> (chunk * CHUNK_BITS)) & ((1 << CHUNK_BITS) - 1)) ^ flips
+            starts, ends = offsets[keys], offsets[keys + 1]
+            lengths = ends - starts
+            total = int(lengths.sum())
+            if total == 0: continue
+            # gather order[start:end] for every probed bucket in one shot
+            shift = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+            found.append(order[np.arange(total) + shift])
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(found)
+
+    def _within(self, query, radius, stop_at_nearest=False):
+        """
+        Probes chunk radius 0, 1, .. radius // 4 and keeps verified rows within radius.
+        After chunk radius s every row within 4s + 3 bits has been seen, so a nearest
+        neighbour search can stop as soon as its best distance is inside that bound.
+        """
+        kept_idx, kept_dist = [], []
+        best = radius + 1
+        for chunk_radius in range(min(radius // CHUNK_COUNT, CHUNK_BITS) + 1):
+            idx = self._probe(query, chunk_radius)
+            if len(idx):
+                dists = self._hide(popcount64(np.bitwise_xor(self.hashes[idx], np.uint64(query))).astype(np.int64), idx)
+                keep = dists <= radius
+                kept_idx.append(idx[keep])
+                kept_dist.append(dists[keep])
+                if keep.any():
+                    best = min(best, int(dists[keep].min()))
+            if stop_at_nearest and best <= chunk_radius * CHUNK_COUNT + CHUNK_COUNT - 1:
+                break
+        if not kept_idx:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        # the same row can come out of several tables, dedupe only the survivors
+        idx, first = np.unique(np.concatenate(kept_idx).astype(np.int64), return_index=True)
+        dists = np.concatenate(kept_dist)[first]
+        order = np.lexsort((idx, dists))
+        return idx[order], dists[order]
+
+    def candidates(self, query_hash, radius):
+        """Sorted unique row indices a radius query has to verify (for stats / benchmarks)."""
+        query = hash_to_int(query_hash)
+        found = [self._probe(query, s) for s in range(min(radius // CHUNK_COUNT, CHUNK_BITS) + 1)]
+        return np.unique(np.concatenate(found)).astype(np.int64)
+
+    def radius_query(self, query_hash, radius):
+        return self._within(hash_to_int(query_hash), radius)
+
+    def topk(self, query_hash, k):
+        # grow the radius one chunk-bit at a time until k rows are inside it
+        for chunk_radius in range(MAX_CHUNK_RADIUS + 1):
+            radius = chunk_radius * CHUNK_COUNT + CHUNK_COUNT - 1
+            idx, dists = self.radius_query(query_hash, radius)
+            if len(idx) >= k:
+                return idx[:k], dists[:k]
+        return super().topk(query_hash, k)
+
+    def search(self, query_hashes, radius=None):
+        radius = self.radius if radius is None else radius
+        best_idx = np.full(len(query_hashes), -1, dtype=np.int64)
+        best_dist = np.full(len(query_hashes), radius + 1, dtype=np.int64)
+        for i, query in enumerate(query_hashes):
+            idx, dists = self._within(hash_to_int(query), radius, stop_at_nearest=True)
+            if len(idx):
+                best_idx[i], best_dist[i] = idx[0], dists[0]
+        return best_idx, best_dist
+
+
+class LayeredRows(Sequence):
+    """base rows followed by the added rows"""
+
+    def __init__(self, base, added):
+        self._base = base
+        self._added = added
+
+    def __getitem__(self, i):
+        return self._base[i] if i < len(self._base) else self._added[i - len(self._base)]
+
+    def __len__(self):
+        return len(self._base) + len(self._added)
+
+
+class LayeredHashIndex:
+    """
+    Base index minus the hidden rows, plus a brute force index of added rows.
+    Row numbers continue after the base rows; on equal distance the base row wins.
+    """
+
+    def __init__(self, base, hidden=None, added_pairs=()):
+        self.base = base.masked(hidden)
+        self.added = BruteForceHashIndex.from_pairs(added_pairs)
+        self.rows = LayeredRows(self.base.rows, self.added.rows)
+        self.radius = base.radius
+
+    def __len__(self):
+        return len(self.base) + len(self.added)
+
+    @property
+    def hashes(self):
+        return np.concatenate([self.base.hashes, self.added.hashes])
+
+    def search(self, query_hashes, radius=None):
+        best_idx, best_dist = self.base.search(query_hashes, radius)
+        if len(self.added):
+            added_idx, added_dist = self.added.search(query_hashes, radius)
+            closer = (added_idx >= 0) & (added_dist < best_dist)
+            best_idx = np.where(closer, added_idx + len(self.base), best_idx)
+            best_dist = np.where(closer, added_dist, best_dist)
+        return best_idx, best_dist
+
+    def radius_query(self, query_hash, radius):
+        idx, dists = self.base.radius_query(query_hash, radius)
+        added_idx, added_dists = self.added.radius_query(query_hash, radius)
+        idx, dists = np.concatenate([idx, added_idx + len(self.base)]), np.concatenate([dists, added_dists])
+        order = np.lexsort((idx, dists))
+        return idx[order], dists[order]
+
+    def topk(self, query_hash, k):
+        idx, dists = self.base.topk(query_hash, k)
+        added_idx, added_dists = self.added.topk(query_hash, k)
+        idx, dists = np.concatenate([idx, added_idx + len(self.base)]), np.concatenate([dists, added_dists])
+        keep = dists < HIDDEN_DISTANCE
+        idx, dists = idx[keep], dists[keep]
+        order = np.lexsort((idx, dists))[:k]
+        return idx[order], dists[order]
+
+    best_matches = BruteForceHashIndex.best_matches
+
+
+HASH_INDEX_TYPES = {
+    'brute': BruteForceHashIndex,
+    'mih': MultiIndexHashIndex,
+}
+
+
+def _index_type(kind):
+    if kind not in HASH_INDEX_TYPES:
+        raise ValueError(f"Unknown hash index '{kind}', expected one of {sorted(HASH_INDEX_TYPES)}")
+    return HASH_INDEX_TYPES[kind]
+
+
+def build_hash_index(pairs, kind='brute', **kwargs):
+    """(hash, row) pairs -> hash index of the given kind, see HASH_INDEX_TYPES."""
+    return _index_type(kind).from_pairs(pairs, **kwargs)
+
+
+def make_hash_index(hashes, rows, kind='brute', **kwargs):
+    """Index over an already packed (and deduped) uint64 array, e.g. the compiled card database."""
+    return _index_type(kind)(hashes, rows, **kwargs)
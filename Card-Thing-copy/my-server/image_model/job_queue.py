@@ -0,0 +1,169 @@
+"""
+Recognition job queue: a fixed number of worker threads, 'interactive' jobs
+before 'bulk' ones. A full queue rejects new jobs (429) and a job that
+waited past its timeout isn't run (504). Finished jobs can be polled with
+status(job_id).
+"""
+
+import time
+import heapq
+import threading
+import itertools
+from collections import OrderedDict
+
+PRIORITIES = {'interactive': 0, 'bulk': 10}
+
+
+class JobRejected(Exception):
+    """the queue is full, the caller should retry later (HTTP 429)"""
+    code = 429
+
+
+class Job:
+    __slots__ = ('id', 'request', 'priority', 'seq', 'submitted', 'deadline', 'started', 'finished',
+                 'status', 'result', 'on_done')
+
+    def __init__(self, job_id, request, priority, timeout, on_done):
+        self.id = job_id
+        self.request = request
+        self.priority = priority
+        self.seq = None
+        self.submitted = time.time()
+        self.deadline = self.submitted + timeout if timeout else None
+        self.started = None
+        self.finished = None
+        self.status = 'queued'
+        self.result = None
+        self.on_done = on_done
+
+    def as_dict(self):
+        info = {'job_id': self.id, 'job_status': self.status, 'priority': self.priority}
+        if self.started:
+            info['queued_ms'] = round((self.started - self.submitted) * 1000, 1)
+        if self.finished and self.started:
+            info['run_ms'] = round((self.finished - self.started) * 1000, 1)
+        if self.result is not None:
+            info['result'] = self.result
+        return info
+
+
+class JobQueue:
+
+    def __init__(self, handler, workers=1, max_depth=16, max_bulk_depth=8, timeout=None, keep_finished=256):
+        """handler(request) -> result dict, runs on the worker threads"""
+        self.handler = handler
+        self.max_depth = max_depth
+        self.max_bulk_depth = max_bulk_depth
+        self.timeout = timeout
+        self.keep_finished = keep_finished
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._jobs = OrderedDict()
+        self._running = 0
+        self._closed = False
+        self.counters = {'submitted': 0, 'rejected': 0, 'timed_out': 0, 'done': 0, 'failed': 0}
+        self._workers = [threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True) for i in range(max(1, workers))]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, job_id, request, priority='interactive', timeout=None, on_done=None):
+        """queues a job, raises JobRejected when the queue is full. Returns (job, position in the queue)"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}', expected one of {sorted(PRIORITIES)}")
+        with self._cond:
+            if self._closed:
+                raise JobRejected("shutting down")
+            depth = len(self._heap)
+            limit = self.max_bulk_depth if priority == 'bulk' and self.max_bulk_depth is not None else self.max_depth
+            if depth >= limit:
+                self.counters['rejected'] += 1
+                raise JobRejected(f"queue full ({depth} waiting)")
+            job = Job(job_id, request, priority, timeout if timeout is not None else self.timeout, on_done)
+            job.seq = next(self._seq)
+            heapq.heappush(self._heap, (PRIORITIES[priority], job.seq, job))
+            self._remember(job)
+            self.counters['submitted'] += 1
+            position = self._position(job)
+            self._cond.notify()
+        return job, position
+
+    def _position(self, job):
+        """how many waiting jobs run before this one"""
+        key = (PRIORITIES[job.priority], job.seq)
+        return sum(1 for rank, seq, _ in self._heap if (rank, seq) < key)
+
+    def _remember(self, job):
+        if job.id is None:
+            return
+        self._jobs[job.id] = job
+        self._jobs.move_to_end(job.id)
+        # forget the oldest finished jobs, never the waiting / running ones
+        finished = [jid for jid, j in self._jobs.items() if j.finished is not None]
+        for jid in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[jid]
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                _, _, job = heapq.heappop(self._heap)
+                self._running += 1
+                job.started = time.time()
+                timed_out = job.deadline is not None and job.started > job.deadline
+                job.status = 'timeout' if timed_out else 'running'
+
+            if timed_out:
+                job.result = {'status': 'timeout', 'code': 504, 'error': 'Waited too long in the queue'}
+                key = 'timed_out'
+            else:
+                try:
+                    job.result = self.handler(job.request)
+                    job.status, key = 'done', 'done'
+                except Exception as e:
+                    job.result = {'status': 'error', 'error': str(e)}
+                    job.status, key = 'failed', 'failed'
+
+            with self._cond:
+                job.finished = time.time()
+                self._running -= 1
+                self.counters[key] += 1
+                self._cond.notify_all()
+            if job.on_done is not None:
+                try:
+                    job.on_done(job)
+                except Exception as e:
+                    print(f"job callback error: {e}")
+
+    def status(self, job_id):
+        """job info dict (with 'result' once finished), None for unknown / forgotten jobs"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            info = job.as_dict()
+            if job.status == 'queued':
+                info['position'] = self._position(job)
+            return info
+
+    def stats(self):
+        with self._cond:
+            waiting = {name: sum(1 for _, _, j in self._heap if j.priority == name) for name in PRIORITIES}
+            return dict(self.counters, waiting=waiting, running=self._running, workers=len(self._workers),
+                        max_depth=self.max_depth, max_bulk_depth=self.max_bulk_depth)
+
+    def close(self, wait=True):
+        """stops accepting jobs; with wait the queued ones still run before the workers exit"""
+        with self._cond:
+            self._closed = True
+            if not wait:
+                for _, _, job in self._heap:
+                    job.status = 'cancelled'
+                self._heap = []
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
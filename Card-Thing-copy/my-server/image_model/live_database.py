@@ -0,0 +1,277 @@
+"""
+Hot reloadable card database for the service and bulk workers.
+
+Requests take one immutable DatabaseSnapshot and use it to the end.
+reload() loads a changed csv next to the current snapshot and swaps it in;
+apply_delta() masks removed ids and layers added rows over the loaded
+database without reloading. Deltas are laid over every reload until
+reload(drop_deltas=True).
+"""
+
+import csv
+import time
+import random
+import threading
+from collections.abc import Mapping
+from functools import cached_property
+
+import numpy as np
+
+from hash_index import LayeredHashIndex
+from name_index import LayeredNameIndex
+from card_database import normalize_string
+from result_cache import database_version
+
+WARM_UP_NAMES = ('pikachu', 'charizard ex')
+
+
+class DatabaseSnapshot:
+    """one consistent (hash_db, text_db) pair"""
+    __slots__ = ('hash_db', 'text_db', 'version', 'loaded_at', 'row_info')
+
+    def __init__(self, hash_db, text_db, version):
+        self.hash_db = hash_db
+        self.text_db = text_db
+        self.version = version
+        self.loaded_at = time.time()
+        # base_row_info(), built once per loaded file
+        self.row_info = None
+
+
+def base_row_info(snapshot):
+    """
+    (card id of every hash index row, {hash: [(rank, row)]} of every card) for a loaded snapshot.
+    The loaders keep one row per hash, the card ranked highest (a p_hash over an extra
+    hash, then the later csv row); the map has the cards that lost to it as well.
+    """
+    if snapshot.row_info is None:
+        row_ids = [row['id'] for row in snapshot.hash_db.rows]
+        rows_by_hash = {}
+        for name_key in snapshot.text_db:
+            for rows in snapshot.text_db[name_key].values():
+                for row in rows:
+                    # the csv line, both loaders' rows have it
+                    order = row.row_index
+                    if row.get('p_hash'):
+                        rows_by_hash.setdefault(int(row['p_hash'], 16), []).append(((1, order), row))
+                    for extra in (row.get('extra_hashes') or '').split():
+                        rows_by_hash.setdefault(int(extra, 16), []).append(((0, order), row))
+        snapshot.row_info = (row_ids, rows_by_hash)
+    return snapshot.row_info
+
+
+def add_text_rows(text_db, rows):
+    """rows into a nested name -> {number -> [rows]} dict, like load_dual_database_csv"""
+    for row in rows:
+        name_key = normalize_string(row.get('name', ''))
+        if name_key:
+            text_db.setdefault(name_key, {}).setdefault(normalize_string(row.get('number', '')), []).append(row)
+    return text_db
+
+
+def row_hash_pairs(rows):
+    """(hash, row) pairs of rows: every p_hash first, then the extra_hashes no p_hash already has"""
+    pairs = [(row['p_hash'], row) for row in rows if row.get('p_hash')]
+    main_hashes = {int(h, 16) for h, _ in pairs}
+    pairs += [(h, row) for row in rows for h in (row.get('extra_hashes') or '').split() if int(h, 16) not in main_hashes]
+    return pairs
+
+
+class LayeredTextDB(Mapping):
+    """text_db with a delta on top: rows of hidden ids left out, added rows merged in"""
+
+    def __init__(self, base, added_rows, hidden_ids):
+        self.base = base
+        self.hidden_ids = hidden_ids
+        self.added = add_text_rows({}, added_rows)
+
+    def _base_numbers(self, name_key):
+        if name_key not in self.base:
+            return {}
+        number_map = {}
+        for num_key, rows in self.base[name_key].items():
+            rows = [row for row in rows if row['id'] not in self.hidden_ids] if self.hidden_ids else rows
+            if rows:
+                number_map[num_key] = rows
+        return number_map
+
+    def is_live(self, name_key):
+        """the name still has cards after the delta"""
+        return name_key in self.added or bool(self._base_numbers(name_key))
+
+    def __getitem__(self, name_key):
+        number_map = self._base_numbers(name_key)
+        for num_key, rows in self.added.get(name_key, {}).items():
+            number_map[num_key] = number_map.get(num_key, []) + rows
+        if not number_map:
+            raise KeyError(name_key)
+        return number_map
+
+    def __contains__(self, name_key):
+        return self.is_live(name_key)
+
+    def __iter__(self):
+        for name_key in self.base:
+            if not self.hidden_ids or self.is_live(name_key):
+                yield name_key
+        for name_key in self.added:
+            if name_key not in self.base:
+                yield name_key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    @cached_property
+    def name_index(self):
+        base_index = getattr(self.base, 'name_index', None)
+        if base_index is None:
+            return None
+        new_names = [name for name in self.added if name not in self.base]
+        return LayeredNameIndex(base_index, new_names, self.is_live)
+
+
+class LiveDatabase:
+
+    def __init__(self, path, loader, check_interval=None):
+        """
+        loader(path) -> (hash_db, text_db) or (None, None), e.g. final_main.load_dual_database
+        check_interval: seconds between checks of the file in the background (None = only reload() / deltas)
+        """
+        self.path = path
+        self.loader = loader
+        self.check_interval = check_interval
+        # _lock only guards the delta state and the swap, _reload_lock keeps two reloads from loading at once
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._added = {}
+        self._removed = set()
+        self._delta_count = 0
+        self.counters = {'reloads': 0, 'reload_errors': 0, 'deltas': 0, 'last_reload_ms': None}
+
+        # version first: a change while loading is picked up by the next check
+        version = database_version(path)
+        hash_db, text_db = loader(path)
+        if hash_db is None:
+            raise FileNotFoundError(path)
+        self._base = DatabaseSnapshot(hash_db, text_db, version)
+        self._current = self._base
+
+        self._stop = threading.Event()
+        self._thread = None
+        if check_interval:
+            self._thread = threading.Thread(target=self._watch, name='db-reload', daemon=True)
+            self._thread.start()
+
+    def current(self):
+        """the snapshot a request should use from start to end"""
+        return self._current
+
+    @property
+    def version(self):
+        return self._current.version
+
+    # --- reload ---
+
+    def _watch(self):
+        # first check somewhere in the first interval, then every interval +-10%
+        wait = random.uniform(0, self.check_interval)
+        while not self._stop.wait(wait):
+            try:
+                self.reload()
+            except Exception as e:
+                self.counters['reload_errors'] += 1
+                print(f"database reload failed: {e}")
+            wait = self.check_interval * random.uniform(0.9, 1.1)
+
+    def reload(self, force=False, drop_deltas=False):
+        """loads the file again if it changed (or force), returns True when a new snapshot was swapped in"""
+        with self._reload_lock:
+            version = database_version(self.path)
+            if version is None or (version == self._base.version and not force and not drop_deltas):
+                return False
+            start = time.perf_counter()
+            # loaded and warmed up next to the current snapshot, which keeps answering requests meanwhile;
+            # deltas can still be applied to it, they are laid over the new base at the swap
+            hash_db, text_db = self.loader(self.path)
+            if hash_db is None:
+                raise FileNotFoundError(self.path)
+            base = DatabaseSnapshot(hash_db, text_db, version)
+            warm_up(base)
+            base_row_info(base)
+            with self._lock:
+                if drop_deltas:
+                    self._added, self._removed = {}, set()
+                    self._delta_count = 0
+                self._base = base
+                self._current = snapshot = self._layered() if self._added or self._removed else base
+                self.counters['reloads'] += 1
+                self.counters['last_reload_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        print(f"Card database reloaded ({self.counters['last_reload_ms']} ms, version {snapshot.version})")
+        return True
+
+    # --- deltas ---
+
+    def apply_delta(self, added=(), removed=()):
+        """adds / replaces rows (dicts with the csv columns, 'id' required) and removes ids, returns the new snapshot"""
+        added = [dict(row) for row in added]
+        if any(not row.get('id') for row in added):
+            raise ValueError("every added row needs an 'id'")
+        # the slow part for a new base, done before taking the lock
+        base_row_info(self._base)
+        with self._lock:
+            for card_id in removed:
+                self._added.pop(card_id, None)
+                self._removed.add(card_id)
+            for row in added:
+                self._added[row['id']] = row
+            self._delta_count += 1
+            self._current = snapshot = self._layered()
+            self.counters['deltas'] += 1
+        return snapshot
+
+    def apply_delta_csv(self, path):
+        """a csv with the database columns; rows with op=remove remove their id, the others are added / replaced"""
+        added, removed = [], []
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                op = (row.pop('op', None) or 'add').strip().lower()
+                (removed.append(row['id']) if op == 'remove' else added.append(row))
+        return self.apply_delta(added, removed)
+
+    def _layered(self):
+        """the base snapshot + the pending delta, called with self._lock held"""
+        base = self._base
+        row_ids, rows_by_hash = base_row_info(base)
+        hidden_ids = self._removed | set(self._added)
+        # index rows are hidden by card id, the delta rows are the first version of their id the loaders would see
+        hidden = np.fromiter((card_id in hidden_ids for card_id in row_ids), dtype=bool, count=len(row_ids))
+        # a hidden row's hash can belong to other cards too (reprints), the best ranked one that's left takes it over
+        restored = []
+        for i in np.flatnonzero(hidden):
+            card_hash = int(base.hash_db.hashes[i])
+            left = [(rank, row) for rank, row in rows_by_hash.get(card_hash, ()) if row['id'] not in hidden_ids]
+            if left:
+                restored.append((card_hash, max(left, key=lambda entry: entry[0])[1]))
+        added_rows = list(self._added.values())
+        # added rows come last, a hash they share with a restored card is theirs
+        hash_db = LayeredHashIndex(base.hash_db, hidden, restored + row_hash_pairs(added_rows))
+        text_db = LayeredTextDB(base.text_db, added_rows, hidden_ids)
+        return DatabaseSnapshot(hash_db, text_db, f"{base.version}+{self._delta_count}")
+
+    def stats(self):
+        snapshot = self._current
+        return dict(self.counters, version=snapshot.version, hashes=len(snapshot.hash_db),
+                    loaded_at=snapshot.loaded_at, added_rows=len(self._added), removed_ids=len(self._removed),
+                    check_interval=self.check_interval)
+
+    def close(self):
+        self._stop.set()
+
+
+def warm_up(snapshot):
+    """touches what the first request would have to load: the hash pages and the name index"""
+    snapshot.hash_db.search([0])
+    name_index = getattr(snapshot.text_db, 'name_index', None)
+    if name_index is not None:
+        for name in WARM_UP_NAMES:
+            name_index.query(name, 2)
@@ -0,0 +1,122 @@
+"""
+Bigram index for find_candidates_fuzzy: the names within MAX_NAME_DISTANCE
+edits of the OCR text (q-gram count filter, then Levenshtein) plus the names
+containing it, in text_db order like the full scan.
+"""
+
+from functools import cached_property
+
+import numpy as np
+import Levenshtein
+
+GRAM_SIZE = 2
+PAD_START = '\x02'
+PAD_END = '\x03'
+
+
+def gram_keys(s, padded=True):
+    """Bigrams of s as (gram, occurrence) pairs."""
+    if padded:
+        s = PAD_START + s + PAD_END
+    seen = {}
+    keys = []
+    for i in range(len(s) - GRAM_SIZE + 1):
+        gram = s[i:i + GRAM_SIZE]
+        seen[gram] = seen.get(gram, 0) + 1
+        keys.append((gram, seen[gram]))
+    return keys
+
+
+def encode_gram_key(key):
+    """(gram, occurrence) -> str, for storing the postings in the string table"""
+    gram, occurrence = key
+    return f"{gram}{occurrence}"
+
+
+def decode_gram_key(value):
+    return value[:GRAM_SIZE], int(value[GRAM_SIZE:])
+
+
+def build_postings(names):
+    """names -> (name lengths, {(gram, occurrence): int32 array of name ids})"""
+    lengths = np.fromiter((len(n) for n in names), dtype=np.int32, count=len(names))
+    postings = {}
+    for name_id, name in enumerate(names):
+        for key in gram_keys(name):
+            postings.setdefault(key, []).append(name_id)
+    return lengths, {key: np.asarray(ids, dtype=np.int32) for key, ids in postings.items()}
+
+
+class NameIndex:
+    """Bigram inverted index over the normalized names of text_db."""
+
+    def __init__(self, names, lengths=None, postings=None):
+        """names is kept as is (any sequence) when lengths / postings are given precomputed"""
+        if postings is None:
+            names = list(names)
+            lengths, postings = build_postings(names)
+        self.names = names
+        self.lengths = lengths
+        self.postings = postings
+
+    def __len__(self):
+        return len(self.names)
+
+    def _shared_counts(self, keys):
+        found = [self.postings[k] for k in keys if k in self.postings]
+        if not found:
+            return np.zeros(len(self.names), dtype=np.int64)
+        return np.bincount(np.concatenate(found), minlength=len(self.names))
+
+    def query(self, target, max_distance, substring_min_len=3):
+        """
+        Names with Levenshtein(target, name) <= max_distance, or containing target
+        when len(target) > substring_min_len. Same order as the names were indexed.
+        """
+        if not target or not self.names:
+            return []
+        target_len = len(target)
+
+        shared = self._shared_counts(gram_keys(target))
+        min_shared = np.maximum(self.lengths, target_len) + GRAM_SIZE - 1 - max_distance * GRAM_SIZE
+        maybe_close = (np.abs(self.lengths - target_len) <= max_distance) & (shared >= min_shared)
+
+        maybe_substring = np.zeros(len(self.names), dtype=bool)
+        if target_len > substring_min_len:
+            inner = gram_keys(target, padded=False)
+            maybe_substring = (self._shared_counts(inner) == len(inner)) & (self.lengths >= target_len)
+
+        matches = []
+        for name_id in np.flatnonzero(maybe_close | maybe_substring):
+            name = self.names[name_id]
+            if (maybe_close[name_id] and Levenshtein.distance(target, name) <= max_distance) or \
+                    (maybe_substring[name_id] and target in name):
+                matches.append(name)
+        return matches
+
+
+class IndexedTextDB(dict):
+    """The plain nested text_db dict, with a NameIndex built on first fuzzy lookup."""
+
+    @cached_property
+    def name_index(self):
+        return NameIndex(self.keys())
+
+
+class LayeredNameIndex:
+    """
+    Name lookup for a database delta (live_database.LayeredTextDB): the base index
+    minus the names that lost all their cards, then a small index of the added names.
+    """
+
+    def __init__(self, base, added_names, is_live):
+        self.base = base
+        self.added = NameIndex(added_names)
+        self.is_live = is_live
+
+    def __len__(self):
+        return len(self.base) + len(self.added)
+
+    def query(self, target, max_distance, substring_min_len=3):
+        matches = [name for name in self.base.query(target, max_distance, substring_min_len) if self.is_live(name)]
+        return matches + self.added.query(target, max_distance, substring_min_len)
@@ -0,0 +1,119 @@
+"""
+imagehash.phash straight from BGR arrays, bit for bit: Pillow's fixed point
+RGB -> L and LANCZOS resize, then imagehash's DCT. cv2's resize / cvtColor
+round differently and would flip bits against the p_hash column.
+"""
+
+import math
+from functools import lru_cache
+
+import cv2
+import numpy as np
+import scipy.fftpack
+
+HASH_SIZE = 8
+HIGHFREQ_FACTOR = 4
+IMG_SIZE = HASH_SIZE * HIGHFREQ_FACTOR
+
+# Pillow Resample.c constants
+PRECISION_BITS = 32 - 8 - 2
+LANCZOS_SUPPORT = 3.0
+# Pillow L24 weights in BGR order
+_LUMA_WEIGHTS = np.array([[7471, 38470, 19595]], dtype=np.float32)
+
+
+def _sinc(x):
+    if x == 0.0:
+        return 1.0
+    x = x * math.pi
+    return math.sin(x) / x
+
+
+def _lanczos(x):
+    if -3.0 <= x < 3.0:
+        return _sinc(x) * _sinc(x / 3)
+    return 0.0
+
+
+@lru_cache(maxsize=256)
+def resample_matrix(in_size, out_size=IMG_SIZE):
+    """
+    (out_size x in_size) fixed point LANCZOS weights exactly as Pillow's
+    precompute_coeffs + normalize_coeffs_8bpc compute them.
+    Stored as float64, every weight is an integer so the products stay exact.
+    """
+    weights = np.zeros((out_size, in_size), dtype=np.float64)
+    scale = float(in_size) / out_size
+    filterscale = max(scale, 1.0)
+    support = LANCZOS_SUPPORT * filterscale
+    inv_filterscale = 1.0 / filterscale
+
+    for xx in range(out_size):
+        center = (xx + 0.5) * scale
+        xmin = max(int(center - support + 0.5), 0)
+        xmax = min(int(center + support + 0.5), in_size) - xmin
+        k = [_lanczos((x + xmin - center + 0.5) * inv_filterscale) for x in range(xmax)]
+        ww = sum(k)
+        for x, w in enumerate(k):
+            if ww != 0.0:
+                w /= ww
+            weights[xx, xmin + x] = int(-0.5 + w * (1 << PRECISION_BITS)) if w < 0 else int(0.5 + w * (1 << PRECISION_BITS))
+    return weights
+
+
+def _fixed_point_round(acc):
+    # Pillow: clip8((1 << (PRECISION_BITS - 1)) + sum) == clip((acc + half) >> PRECISION_BITS, 0, 255)
+    out = np.floor((acc + (1 << (PRECISION_BITS - 1))) / (1 << PRECISION_BITS))
+    return np.clip(out, 0, 255)
+
+
+def pil_luma(image_bgr):
+    """
+    Pillow's RGB -> L conversion ((19595 R + 38470 G + 7471 B + 0x8000) >> 16) on a
+    BGR array, returned as float32. Every intermediate is an integer below 2**24,
+    so float32 holds it exactly and cv2.transform can do the weighted sum.
+    """
+    if image_bgr.ndim == 2:
+        return image_bgr.astype(np.float32)
+    weighted = cv2.transform(image_bgr.astype(np.float32), _LUMA_WEIGHTS)
+    return np.floor((weighted + 0x8000) * (1.0 / 65536))
+
+
+def resize_like_pil(gray, size=IMG_SIZE):
+    """Image.resize((size, size), LANCZOS) for 8 bit grayscale values, as float64."""
+    h, w = gray.shape
+    pixels = gray.astype(np.float64)
+    # Image.resize does the vertical pass first for strips over 100x taller than wide
+    if h > w * 100 and size < h:
+        pixels = _fixed_point_round(resample_matrix(h, size) @ pixels)
+        if w != size:
+            pixels = _fixed_point_round(pixels @ resample_matrix(w, size).T)
+        return pixels
+    # Pillow skips a pass when that dimension already has the target size
+    if w != size:
+        pixels = _fixed_point_round(pixels @ resample_matrix(w, size).T)
+    if h != size:
+        pixels = _fixed_point_round(resample_matrix(h, size) @ pixels)
+    return pixels
+
+
+def _dct_bits(stack):
+    """(n, 32, 32) resized pixels -> (n,) uint64 hashes, imagehash's DCT + median step."""
+    dct = scipy.fftpack.dct(scipy.fftpack.dct(stack, axis=1), axis=2)
+    lowfreq = dct[:, :HASH_SIZE, :HASH_SIZE].reshape(len(stack), -1)
+    med = np.median(lowfreq, axis=1, keepdims=True)
+    bits = np.packbits(lowfreq > med, axis=1)
+    return bits.view('>u8').reshape(-1).astype(np.uint64)
+
+
+def phash_bgr_batch(images):
+    """pHashes of several BGR (or grayscale) uint8 arrays as a uint64 array."""
+    if not len(images):
+        return np.empty(0, dtype=np.uint64)
+    stack = np.stack([resize_like_pil(pil_luma(img)) for img in images])
+    return _dct_bits(stack)
+
+
+def phash_bgr(image):
+    """pHash of one BGR array, as a python int."""
+    return int(phash_bgr_batch([image])[0])
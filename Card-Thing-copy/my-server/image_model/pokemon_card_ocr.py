@@ -5,39 +5,96 @@ Updated:
 1. Compatibility with PaddleOCR v3.0+ (Removed show_log)
 2. Speed Optimizations (Fast Mode, No Angle CLS)
 3. Accuracy Fix: Crops right 30% of name region to ignore HP/Health
+4. ROIs go to the engine as in-memory arrays (probed once at init), temp files only as a counted fallback
+5. Optional recognition-only name reading (name_mode='recognize'), detection only as a fallback
+6. PokemonCardOCRPool: paddleocr is imported and engines loaded only when a card needs OCR, shared by the whole process
+7. Debug ROIs are queued on the debug writer (debug_artifacts.py) instead of written inline
 """
 
 import os
+import time
+import threading
+import importlib.util
 import cv2
 import numpy as np
 
-# Try to import PP-StructureV3 first, fallback to PaddleOCR
+from debug_artifacts import write_image
+
+# filled in by import_paddle() when the first engine is created, importing paddle
+# takes seconds and a lot of memory that cache hits / hash-only cards never need
 PPSTRUCTURE_AVAILABLE = False
 PaddleOCR = None
 PPStructureV3 = None
+TextRecognition = None
+_paddle_imported = False
+_paddle_lock = threading.Lock()
+
+
+def paddle_installed():
+    """paddleocr can be imported, checked without importing it"""
+    return importlib.util.find_spec('paddleocr') is not None
 
-try:
-    from paddleocr import PPStructureV3
-    PPSTRUCTURE_AVAILABLE = True
-except (ImportError, Exception):
-    PPSTRUCTURE_AVAILABLE = False
 
-try:
-    from paddleocr import PaddleOCR
-except (ImportError, Exception):
-    PaddleOCR = None
+def import_paddle():
+    global PPSTRUCTURE_AVAILABLE, PaddleOCR, PPStructureV3, TextRecognition, _paddle_imported
+    with _paddle_lock:
+        if _paddle_imported:
+            return
+        _paddle_imported = True
+        
+        # Try to import PP-StructureV3 first, fallback to PaddleOCR
+        try:
+            from paddleocr import PPStructureV3
+            PPSTRUCTURE_AVAILABLE = True
+        except (ImportError, Exception):
+            PPSTRUCTURE_AVAILABLE = False
+        
+        try:
+            from paddleocr import PaddleOCR
+        except (ImportError, Exception):
+            PaddleOCR = None
+        
+        # text recognition model on its own, for name_mode='recognize' (PaddleOCR 3.x)
+        try:
+            from paddleocr import TextRecognition
+        except (ImportError, Exception):
+            TextRecognition = None
+
+
+OCR_LANG = 'en'
+MAX_ROI_WIDTH = 600
+# extract_text_batch: every name ROI is scaled to this height and stacked with a blank gap
+BATCH_ROI_HEIGHT = 80
+BATCH_ROI_GAP = 32
+BATCH_MAX_ROIS = 8      # ROIs per engine call, taller sheets get downscaled by the text detector
+# name_mode='recognize': projection profile line split of the name band
+LINE_MIN_INK = 0.02     # fraction of dark pixels for a row to count as text
+LINE_MIN_HEIGHT = 0.12  # of the ROI height, thinner bands are noise / underlines
+LINE_PAD = 3
 
 
 class PokemonCardOCR:
     """Pokemon card OCR text extraction."""
     
-    def __init__(self, use_gpu=False):
+    def __init__(self, use_gpu=False, name_mode='detect', rec_min_confidence=0.6):
         """
         Initialize the OCR pipeline.
+        name_mode: 'detect' runs text detection + recognition on the name ROI,
+                   'recognize' runs only the recognition model on the name lines and
+                   falls back to detection below rec_min_confidence
         """
         print("Initializing OCR pipeline...")
+        import_paddle()
         self.use_structure = False
         self.ocr = None
+        self.array_input = False
+        self.engine_calls = 0
+        self.disk_fallbacks = 0
+        self.rec = None
+        self.rec_kind = None
+        self.rec_min_confidence = rec_min_confidence
+        self.rec_calls = 0
+        self.detection_fallbacks = 0
         
         # 1. Try PP-StructureV3 (Layout Analysis)
         if PPSTRUCTURE_AVAILABLE:
@@ -56,13 +113,13 @@ class PokemonCardOCR:
                 try:
                     self.ocr = PaddleOCR(
                         use_textline_orientation=True, 
-                        lang='en',
+                        lang=OCR_LANG,
                         use_angle_cls=False
                     )
                 except (TypeError, ValueError):
                     self.ocr = PaddleOCR(
                         use_angle_cls=False, 
-                        lang='en'
+                        lang=OCR_LANG
                     )
                 self.use_structure = False
                 print("✓ Standard PaddleOCR initialized (Speed Optimized)")
@@ -75,6 +132,57 @@ class PokemonCardOCR:
         
         if self.ocr is None:
             print("⚠️  WARNING: OCR is not available. Text extraction will be skipped.")
+        else:
+            # decided once here instead of try/except around every call
+            self.array_input = self._probe_array_input()
+            if name_mode == 'recognize':
+                self._init_recognizer()
+    
+    def _rec_model(self):
+        """(model_name, model_dir) of the recognition model PaddleOCR(lang=OCR_LANG) reads with, name None if unknown"""
+        params = {}
+        if PaddleOCR is not None and isinstance(self.ocr, PaddleOCR):
+            params = getattr(self.ocr, '_params', None) or {}
+        name = params.get('text_recognition_model_name')
+        if name is None and PaddleOCR is not None and hasattr(PaddleOCR, '_get_ocr_model_names'):
+            # PP-StructureV3 is the detection engine, ask PaddleOCR which model lang=OCR_LANG would load
+            try:
+                name = PaddleOCR._get_ocr_model_names(self.ocr, OCR_LANG, params.get('ocr_version'))[1]
+            except Exception:
+                name = None
+        return name, params.get('text_recognition_model_dir')
+    
+    def _init_recognizer(self):
+        """Recognition-only model for the name band, self.rec stays None if there is none."""
+        if TextRecognition is not None:
+            # the same model as the detect + recognize path, TextRecognition() alone loads a different default
+            model_name, model_dir = self._rec_model()
+            if model_name is None:
+                print(f"⚠️  Can't tell which recognition model PaddleOCR(lang='{OCR_LANG}') uses")
+            else:
+                try:
+                    self.rec = TextRecognition(model_name=model_name, model_dir=model_dir)
+                    self.rec_kind = 'module'
+                    print(f"✓ Recognition-only model: {model_name}")
+                except Exception as e:
+                    print(f"⚠️  Error initializing TextRecognition: {e}")
+        # PaddleOCR 2.x: the same engine can skip detection with ocr(det=False)
+        if self.rec is None and not self.use_structure and hasattr(self.ocr, 'ocr'):
+            self.rec = self.ocr
+            self.rec_kind = 'legacy'
+        if self.rec is None:
+            print("⚠️  No recognition-only model, name_mode='recognize' falls back to detection")
+            return
+        
+        probe = np.full((48, 200, 3), 255, dtype=np.uint8)
+        cv2.putText(probe, 'Pikachu', (8, 34), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 2)
+        try:
+            self._recognize_crops([probe])
+            print("✓ Recognition-only name reading enabled")
+        except Exception as e:
+            print(f"⚠️  Recognition-only model failed ({e}), using detection")
+            self.rec = None
+            self.rec_kind = None
     
     def preprocess_for_ocr(self, image, fast_mode=True):
         """
@@ -103,14 +211,10 @@ class PokemonCardOCR:
         
         return processed
     
-    def extract_text_from_card(self, card_image, preprocess=True, save_roi_path=None, fast_mode=True):
+    def crop_name_roi(self, card_image):
         """
-        Extract card name from a card image using OCR.
+        Crop to precise ROI where card name is located.
         """
-        if self.ocr is None:
-            return {'text': '', 'confidence': 0.0, 'lines': []}
-        
-        # Crop to precise ROI where card name is located
         h, w = card_image.shape[:2]
         margin_pct = 0.02
         is_landscape = w > h
@@ -121,26 +225,28 @@ class PokemonCardOCR:
             end_x = min(w, int(w * (0.50 + margin_pct)))
             start_y = max(0, int(h * (0.05 - margin_pct)))
             end_y = min(h, int(h * (0.20 + margin_pct)))
-            name_roi = card_image[start_y:end_y, start_x:end_x]
-        else:
-            # Card is taller than wide - name at top
-            start_y = max(0, int(h * (0.03 - margin_pct)))
-            end_y = min(h, int(h * (0.15 + margin_pct)))
-            
-            # --- FIX: CROP RIGHT 30% TO REMOVE HP ---
-            start_x = max(0, int(w * margin_pct))
-            # Was 1.0 (100%), now 0.70 (70%) to avoid HP text on the right
-            end_x = min(w, int(w * 0.70)) 
-            
-            name_roi = card_image[start_y:end_y, start_x:end_x]
+            return card_image[start_y:end_y, start_x:end_x]
         
-        # Save ROI for debugging
-        if save_roi_path:
-            print("not saving image")
+        # Card is taller than wide - name at top
+        start_y = max(0, int(h * (0.03 - margin_pct)))
+        end_y = min(h, int(h * (0.15 + margin_pct)))
+        
+        # --- FIX: CROP RIGHT 30% TO REMOVE HP ---
+        start_x = max(0, int(w * margin_pct))
+        # Was 1.0 (100%), now 0.70 (70%) to avoid HP text on the right
+        end_x = min(w, int(w * 0.70)) 
+        
+        return card_image[start_y:end_y, start_x:end_x]
+    
+    def prepare_roi(self, card_image, preprocess=True, fast_mode=True):
+        """
+        Name ROI of a card, resized and preprocessed, as the BGR image handed to the engine.
+        """
+        name_roi = self.crop_name_roi(card_image)
         
         # Resize ROI if it is too huge
         roi_h, roi_w = name_roi.shape[:2]
-        max_width = 600
+        max_width = MAX_ROI_WIDTH
         if roi_w > max_width:
             scale = max_width / roi_w
             new_w = max_width
@@ -149,144 +255,446 @@ class PokemonCardOCR:
         
         # Preprocess the ROI
         if preprocess:
-            processed = self.preprocess_for_ocr(name_roi, fast_mode=fast_mode)
+            return self.preprocess_for_ocr(name_roi, fast_mode=fast_mode)
+        if len(name_roi.shape) == 2:
+            return cv2.cvtColor(name_roi, cv2.COLOR_GRAY2BGR)
+        return name_roi
+    
+    def extract_text_batch(self, card_images, preprocess=True, save_roi_paths=None, fast_mode=True):
+        """
+        Extract card names from several card images.
+        The name ROIs are resized to BATCH_ROI_HEIGHT and stacked into one sheet, so up to
+        BATCH_MAX_ROIS cards cost a single detection + recognition call. Lines are assigned
+        back to their card by position and go through the same font size filtering.
+        Returns one result dict per image, in the same order.
+        """
+        if self.ocr is None:
+            return [{'text': '', 'confidence': 0.0, 'lines': []} for _ in card_images]
+        
+        rois = [self.prepare_roi(card_image, preprocess=preprocess, fast_mode=fast_mode) for card_image in card_images]
+        
+        # Save ROI for debugging (queued, written by the debug writer thread)
+        for roi_path, roi in zip(save_roi_paths or [], rois):
+            if roi_path:
+                write_image(roi_path, roi)
+        return self.read_names(rois)
+    
+    def read_names(self, rois):
+        """
+        Prepared name ROIs -> result dicts. In 'recognize' mode the recognition model reads
+        the name lines directly, only the ROIs it is unsure about go through text detection.
+        """
+        results = [None] * len(rois)
+        todo = list(range(len(rois)))
+        if self.rec is not None:
+            for i, result in zip(todo, self.recognize_names(rois)):
+                if result['confidence'] >= self.rec_min_confidence:
+                    results[i] = result
+            todo = [i for i in todo if results[i] is None]
+            self.detection_fallbacks += len(todo)
+        
+        # PP-StructureV3 runs layout analysis on the whole input, sheets would mix cards up
+        if len(todo) > 1 and not self.use_structure:
+            sheet_rois = [self.resize_to_height(rois[i], BATCH_ROI_HEIGHT) for i in todo]
+            detected = []
+            for start in range(0, len(sheet_rois), BATCH_MAX_ROIS):
+                detected.extend(self.extract_text_sheet(sheet_rois[start:start + BATCH_MAX_ROIS]))
         else:
-            if len(name_roi.shape) == 2:
-                processed = cv2.cvtColor(name_roi, cv2.COLOR_GRAY2BGR)
-            else:
-                processed = name_roi
+            detected = [self.detect_text(rois[i]) for i in todo]
+        
+        for i, result in zip(todo, detected):
+            results[i] = result
+        return results
+    
+    def split_name_lines(self, roi):
+        """
+        Projection profile of the ROI: (y0, y1) bands of rows that contain text,
+        tallest first. The name is the largest font in the band so it comes first.
+        """
+        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if roi.ndim == 3 else roi
+        _, ink = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+        # light text on a dark card: the "ink" is the background
+        if ink.mean() > 0.5:
+            ink = 1 - ink
+        rows = ink.mean(axis=1) > LINE_MIN_INK
+        
+        bands = []
+        y = 0
+        h = len(rows)
+        while y < h:
+            if not rows[y]:
+                y += 1
+                continue
+            start = y
+            while y < h and rows[y]: y += 1
+            if y - start >= h * LINE_MIN_HEIGHT:
+                bands.append((max(0, start - LINE_PAD), min(h, y + LINE_PAD)))
+        bands.sort(key=lambda band: band[1] - band[0], reverse=True)
+        return bands
+    
+    def _recognize_crops(self, crops):
+        """Recognition model only, one call for all crops. [(text, score), ...]"""
+        self.rec_calls += 1
+        if self.rec_kind == 'legacy':
+            out = []
+            for crop in crops:
+                res = self.rec.ocr(crop, det=False, cls=False)
+                text, score = res[0][0] if res and res[0] else ('', 0.0)
+                out.append((str(text).strip(), float(score or 0.0)))
+            return out
+        
+        out = []
+        for res in self.rec.predict(input=list(crops)):
+            res = res.get('res', res) if hasattr(res, 'get') else res
+            out.append((str(res.get('rec_text', '')).strip(), float(res.get('rec_score', 0.0) or 0.0)))
+        return out
+    
+    def recognize_names(self, rois):
+        """
+        Reads the name lines of every ROI with the recognition model only (no detection).
+        Each band at least 70% as tall as the tallest one is read, every band of every
+        ROI in one call, then the usual font size filtering picks the name.
+        """
+        empty = {'text': '', 'confidence': 0.0, 'lines': []}
+        crops, owners = [], []
+        for i, roi in enumerate(rois):
+            h, w = roi.shape[:2]
+            bands = self.split_name_lines(roi) or [(0, h)]
+            tallest = bands[0][1] - bands[0][0]
+            for y0, y1 in bands:
+                if y1 - y0 >= tallest * 0.7:
+                    crops.append(roi[y0:y1])
+                    owners.append((i, [[0, y0], [w, y0], [w, y1], [0, y1]]))
+        
+        print(f"  [OCR] Reading {len(crops)} name lines without detection...")
+        try:
+            read = self._recognize_crops(crops) if crops else []
+        except Exception as e:
+            print(f"  [OCR] Error: {e}")
+            return [dict(empty) for _ in rois]
         
+        card_lines = [[] for _ in rois]
+        for (i, bbox), (text, score) in zip(owners, read):
+            if text:
+                card_lines[i].append({'text': text, 'confidence': score, 'bbox': bbox})
+        return [self.filter_name_lines(lines) if lines else dict(empty) for lines in card_lines]
+    
+    def resize_to_height(self, roi, height):
+        roi_h, roi_w = roi.shape[:2]
+        if roi_h == height or roi_h == 0:
+            return roi
+        new_w = max(1, min(MAX_ROI_WIDTH, int(round(roi_w * height / roi_h))))
+        interpolation = cv2.INTER_AREA if roi_h > height else cv2.INTER_CUBIC
+        return cv2.resize(roi, (new_w, height), interpolation=interpolation)
+    
+    def extract_text_sheet(self, rois):
+        """
+        One engine call for several same-height ROIs stacked top to bottom with a blank gap.
+        """
+        empty = {'text': '', 'confidence': 0.0, 'lines': []}
+        pitch = BATCH_ROI_HEIGHT + BATCH_ROI_GAP
+        sheet = np.full((BATCH_ROI_GAP + pitch * len(rois), max(r.shape[1] for r in rois), 3), 255, dtype=np.uint8)
+        for i, roi in enumerate(rois):
+            top = BATCH_ROI_GAP + i * pitch
+            sheet[top:top + roi.shape[0], :roi.shape[1]] = roi
+        
+        print(f"  [OCR] Extracting text from {len(rois)} cards in one call...")
+        try:
+            lines = self.paddle_lines(self.run_engine(sheet))
+        except Exception as e:
+            print(f"  [OCR] Error: {e}")
+            return [dict(empty) for _ in rois]
+        
+        card_lines = [[] for _ in rois]
+        for line in lines:
+            bbox = line.get('bbox', [])
+            try:
+                ys = [p[1] for p in bbox]
+            except (TypeError, IndexError):
+                continue
+            if not ys: continue
+            # the gap is split between the rows above and below it
+            center = (min(ys) + max(ys)) / 2
+            row = min(len(rois) - 1, max(0, int((center - BATCH_ROI_GAP / 2) // pitch)))
+            offset = BATCH_ROI_GAP + row * pitch
+            card_lines[row].append(dict(line, bbox=[[p[0], p[1] - offset] for p in bbox]))
+        
+        return [self.filter_name_lines(lines) if lines else dict(empty) for lines in card_lines]
+    
+    def extract_text_from_card(self, card_image, preprocess=True, save_roi_path=None, fast_mode=True):
+        """
+        Extract card name from a card image using OCR.
+        """
+        if self.ocr is None:
+            return {'text': '', 'confidence': 0.0, 'lines': []}
+        
+        processed = self.prepare_roi(card_image, preprocess=preprocess, fast_mode=fast_mode)
+        
+        # Save ROI for debugging (queued, written by the debug writer thread)
+        if save_roi_path:
+            write_image(save_roi_path, processed)
+        return self.read_names([processed])[0]
+    
+    def detect_text(self, processed):
+        """
+        Full text detection + recognition on one prepared ROI.
+        """
         # Run OCR
         print("  [OCR] Extracting text from card...")
         try:
+            result = self.run_engine(processed)
             if self.use_structure:
-                # PP-StructureV3 logic
-                import tempfile
-                with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
-                    tmp_path = tmp.name
-                    cv2.imwrite(tmp_path, processed)
-                
-                try:
-                    result = self.ocr(tmp_path)
-                    lines = []
-                    texts = []
-                    confidences = []
-                    
-                    if isinstance(result, list):
-                        for page in result:
-                            if isinstance(page, dict) and 'res' in page:
-                                res_data = page['res']
-                                if isinstance(res_data, list):
-                                    for item in res_data:
-                                        if isinstance(item, dict):
-                                            text = item.get('text', item.get('content', ''))
-                                            conf = item.get('confidence', item.get('score', 0.0))
-                                            if text:
-                                                lines.append({
-                                                    'text': str(text),
-                                                    'confidence': float(conf) if conf else 0.0,
-                                                    'bbox': item.get('bbox', [])
-                                                })
-                                                texts.append(str(text))
-                                                confidences.append(float(conf) if conf else 0.0)
-                    os.unlink(tmp_path)
-                    if texts:
-                        combined_text = ' '.join(texts)
-                        avg_confidence = np.mean(confidences) if confidences else 0.0
-                        return {'text': combined_text, 'confidence': float(avg_confidence), 'lines': lines}
-                except Exception as e:
-                    if os.path.exists(tmp_path): os.unlink(tmp_path)
-                    raise e
+                lines = self.structure_lines(result)
+                if lines:
+                    return {'text': ' '.join(l['text'] for l in lines),
+                            'confidence': float(np.mean([l['confidence'] for l in lines])), 'lines': lines}
             else:
-                # Standard PaddleOCR logic
-                if len(processed.shape) == 2:
-                    processed_bgr = cv2.cvtColor(processed, cv2.COLOR_GRAY2BGR)
-                else:
-                    processed_bgr = processed
-                
-                import tempfile
-                result = None
-                tmp_path = None
-                try:
-                    try:
-                        result = self.ocr.predict(processed_bgr)
-                    except (TypeError, AttributeError, Exception):
-                        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
-                            tmp_path = tmp.name
-                            cv2.imwrite(tmp_path, processed_bgr, [cv2.IMWRITE_JPEG_QUALITY, 90])
-                        result = self.ocr.predict(tmp_path)
-                finally:
-                    if tmp_path and os.path.exists(tmp_path): os.unlink(tmp_path)
-                
-                lines = []
-                texts = []
-                confidences = []
-                
-                if result:
-                    if isinstance(result, (list, tuple)) and len(result) > 0:
-                        ocr_result_obj = result[0]
-                        if hasattr(ocr_result_obj, 'get'):
-                            rec_texts = ocr_result_obj.get('rec_texts', [])
-                            rec_scores = ocr_result_obj.get('rec_scores', [])
-                            rec_polys = ocr_result_obj.get('rec_polys', ocr_result_obj.get('dt_polys', []))
-                        elif isinstance(ocr_result_obj, dict):
-                            rec_texts = ocr_result_obj.get('rec_texts', [])
-                            rec_scores = ocr_result_obj.get('rec_scores', [])
-                            rec_polys = ocr_result_obj.get('rec_polys', ocr_result_obj.get('dt_polys', []))
-                        else:
-                            rec_texts = getattr(ocr_result_obj, 'rec_texts', [])
-                            rec_scores = getattr(ocr_result_obj, 'rec_scores', [])
-                            rec_polys = getattr(ocr_result_obj, 'rec_polys', getattr(ocr_result_obj, 'dt_polys', []))
-                        
-                        if not isinstance(rec_texts, list): rec_texts = [rec_texts] if rec_texts else []
-                        if not isinstance(rec_scores, list): rec_scores = [rec_scores] if rec_scores else []
-                        if not isinstance(rec_polys, list): rec_polys = [rec_polys] if rec_polys else []
-                        
-                        for i, text in enumerate(rec_texts):
-                            if text and str(text).strip():
-                                conf = rec_scores[i] if i < len(rec_scores) else 0.0
-                                bbox = rec_polys[i] if i < len(rec_polys) else []
-                                if hasattr(bbox, 'tolist'): bbox = bbox.tolist()
-                                lines.append({'text': str(text).strip(), 'confidence': float(conf) if conf else 0.0, 'bbox': bbox})
-                                texts.append(str(text).strip())
-                                confidences.append(float(conf) if conf else 0.0)
-                    
-                    if texts:
-                        # Font Size Filtering (Unchanged)
-                        def calculate_font_size(bbox):
-                            if not bbox or len(bbox) < 4: return 0
-                            try:
-                                if isinstance(bbox[0], (list, tuple)):
-                                    y_coords = [p[1] for p in bbox]
-                                    return max(y_coords) - min(y_coords)
-                            except: pass
-                            return 0
-                        
-                        text_sizes = [(i, calculate_font_size(lines[i].get('bbox', [])), texts[i]) for i in range(len(texts))]
-                        text_sizes.sort(key=lambda x: x[1], reverse=True)
-                        
-                        filtered_texts = []
-                        filtered_confidences = []
-                        filtered_lines = []
-                        
-                        exclude_patterns = ['HP', 'STAGE', 'BASIC']
-                        largest_font_size = text_sizes[0][1] if text_sizes else 0
-                        
-                        for idx, font_size, text in text_sizes:
-                            text_upper = text.upper().strip()
-                            if (text.strip().isdigit() or any(pattern in text_upper for pattern in exclude_patterns) or len(text.strip()) < 2):
-                                continue
-                            if font_size >= largest_font_size * 0.7:
-                                filtered_texts.append(text)
-                                filtered_confidences.append(confidences[idx])
-                                filtered_lines.append(lines[idx])
-                        
-                        if filtered_texts:
-                            return {'text': ' '.join(filtered_texts), 'confidence': float(np.mean(filtered_confidences)), 'lines': filtered_lines}
-                        else:
-                            return {'text': ' '.join(texts), 'confidence': float(np.mean(confidences)), 'lines': lines}
-            
+                lines = self.paddle_lines(result)
+                if lines:
+                    return self.filter_name_lines(lines)
         except Exception as e:
             print(f"  [OCR] Error: {e}")
         
         return {'text': '', 'confidence': 0.0, 'lines': []}
+    
+    def _engine_call(self, image_input):
+        """One call of whichever engine is loaded, on an ndarray or a file path."""
+        if self.use_structure and callable(self.ocr):
+            return self.ocr(image_input)
+        return self.ocr.predict(image_input)
+    
+    def _probe_array_input(self):
+        """
+        Runs the engine once on a small in-memory image (this also warms it up).
+        Returns False if it only works with file paths.
+        """
+        probe = np.full((48, 200, 3), 255, dtype=np.uint8)
+        cv2.putText(probe, 'Pikachu', (8, 34), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 2)
+        try:
+            self._engine_call(probe)
+            return True
+        except Exception as e:
+            print(f"⚠️  OCR engine rejected an in-memory image ({e}), using temp files")
+            return False
+    
+    def run_engine(self, processed):
+        """
+        Runs OCR on a BGR ndarray. Arrays go straight to the engine, the temp
+        JPEG round trip is only used when the probe in __init__ failed.
+        """
+        self.engine_calls += 1
+        if self.array_input:
+            return self._engine_call(processed)
+        
+        self.disk_fallbacks += 1
+        import tempfile
+        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
+            tmp_path = tmp.name
+        try:
+            cv2.imwrite(tmp_path, processed, [cv2.IMWRITE_JPEG_QUALITY, 90])
+            return self._engine_call(tmp_path)
+        finally:
+            if os.path.exists(tmp_path): os.unlink(tmp_path)
+    
+    def stats(self):
+        return {'engine_calls': self.engine_calls, 'disk_fallbacks': self.disk_fallbacks, 'array_input': self.array_input,
+                'rec_calls': self.rec_calls, 'detection_fallbacks': self.detection_fallbacks, 'rec_kind': self.rec_kind}
+    
+    def structure_lines(self, result):
+        """PP-StructureV3 result -> [{'text', 'confidence', 'bbox'}, ...]"""
+        lines = []
+        if isinstance(result, list):
+            for page in result:
+                if isinstance(page, dict) and 'res' in page:
+                    res_data = page['res']
+                    if isinstance(res_data, list):
+                        for item in res_data:
+                            if isinstance(item, dict):
+                                text = item.get('text', item.get('content', ''))
+                                conf = item.get('confidence', item.get('score', 0.0))
+                                if text:
+                                    lines.append({
+                                        'text': str(text),
+                                        'confidence': float(conf) if conf else 0.0,
+                                        'bbox': item.get('bbox', [])
+                                    })
+        return lines
+    
+    def paddle_lines(self, result, page=0):
+        """PaddleOCR predict() result -> [{'text', 'confidence', 'bbox'}, ...] for one page"""
+        lines = []
+        if result and isinstance(result, (list, tuple)) and len(result) > page:
+            ocr_result_obj = result[page]
+            if hasattr(ocr_result_obj, 'get'):
+                rec_texts = ocr_result_obj.get('rec_texts', [])
+                rec_scores = ocr_result_obj.get('rec_scores', [])
+                rec_polys = ocr_result_obj.get('rec_polys', ocr_result_obj.get('dt_polys', []))
+            elif isinstance(ocr_result_obj, dict):
+                rec_texts = ocr_result_obj.get('rec_texts', [])
+                rec_scores = ocr_result_obj.get('rec_scores', [])
+                rec_polys = ocr_result_obj.get('rec_polys', ocr_result_obj.get('dt_polys', []))
+            else:
+                rec_texts = getattr(ocr_result_obj, 'rec_texts', [])
+                rec_scores = getattr(ocr_result_obj, 'rec_scores', [])
+                rec_polys = getattr(ocr_result_obj, 'rec_polys', getattr(ocr_result_obj, 'dt_polys', []))
+            
+            if not isinstance(rec_texts, list): rec_texts = [rec_texts] if rec_texts else []
+            if not isinstance(rec_scores, list): rec_scores = [rec_scores] if rec_scores else []
+            if not isinstance(rec_polys, list): rec_polys = [rec_polys] if rec_polys else []
+            
+            for i, text in enumerate(rec_texts):
+                if text and str(text).strip():
+                    conf = rec_scores[i] if i < len(rec_scores) else 0.0
+                    bbox = rec_polys[i] if i < len(rec_polys) else []
+                    if hasattr(bbox, 'tolist'): bbox = bbox.tolist()
+                    lines.append({'text': str(text).strip(), 'confidence': float(conf) if conf else 0.0, 'bbox': bbox})
+        return lines
+    
+    def filter_name_lines(self, lines):
+        """
+        Font Size Filtering: keeps the lines close to the largest text (the name),
+        drops numbers / HP / STAGE / BASIC. Returns the per-card result dict.
+        """
+        texts = [l['text'] for l in lines]
+        confidences = [l['confidence'] for l in lines]
+        
+        def calculate_font_size(bbox):
+            if not bbox or len(bbox) < 4: return 0
+            try:
+                if isinstance(bbox[0], (list, tuple)):
+                    y_coords = [p[1] for p in bbox]
+                    return max(y_coords) - min(y_coords)
+            except: pass
+            return 0
+        
+        text_sizes = [(i, calculate_font_size(lines[i].get('bbox', [])), texts[i]) for i in range(len(texts))]
+        text_sizes.sort(key=lambda x: x[1], reverse=True)
+        
+        filtered_texts = []
+        filtered_confidences = []
+        filtered_lines = []
+        
+        exclude_patterns = ['HP', 'STAGE', 'BASIC']
+        largest_font_size = text_sizes[0][1] if text_sizes else 0
+        
+        for idx, font_size, text in text_sizes:
+            text_upper = text.upper().strip()
+            if (text.strip().isdigit() or any(pattern in text_upper for pattern in exclude_patterns) or len(text.strip()) < 2):
+                continue
+            if font_size >= largest_font_size * 0.7:
+                filtered_texts.append(text)
+                filtered_confidences.append(confidences[idx])
+                filtered_lines.append(lines[idx])
+        
+        if filtered_texts:
+            return {'text': ' '.join(filtered_texts), 'confidence': float(np.mean(filtered_confidences)), 'lines': filtered_lines}
+        return {'text': ' '.join(texts), 'confidence': float(np.mean(confidences)), 'lines': lines}
+
+
+class PokemonCardOCRPool:
+    """
+    Process-wide pool of PokemonCardOCR engines, created lazily.
+    Nothing is loaded until the first card actually needs OCR (most clean scans
+    early exit before that), then at most `size` engines are created on demand so
+    concurrent recognitions don't queue behind one engine. Same extract_text_*
+    methods as PokemonCardOCR.
+    """
+    
+    def __init__(self, size=1, **engine_kwargs):
+        self.size = max(1, size)
+        self.engine_kwargs = engine_kwargs
+        self.engines = []
+        self.idle = []
+        self.unavailable = not paddle_installed()
+        self.init_seconds = 0.0
+        self.waits = 0
+        self._cond = threading.Condition()
+    
+    def _create_engine(self):
+        start = time.perf_counter()
+        try:
+            engine = PokemonCardOCR(**self.engine_kwargs)
+        except Exception as e:
+            print(f"⚠️  Error initializing OCR engine: {e}")
+            engine = None
+        self.init_seconds += time.perf_counter() - start
+        return engine
+    
+    def acquire(self):
+        """An idle engine, a new one if the pool isn't full yet, else waits. None if OCR is unavailable."""
+        with self._cond:
+            while True:
+                if self.unavailable:
+                    return None
+                if self.idle:
+                    return self.idle.pop()
+                if len(self.engines) < self.size:
+                    # reserve the slot, the (slow) model load happens outside the lock
+                    self.engines.append(None)
+                    break
+                self.waits += 1
+                self._cond.wait()
+        
+        engine = self._create_engine()
+        with self._cond:
+            self.engines.remove(None)
+            if engine is None or engine.ocr is None:
+                # no point retrying a model that can't load on every card
+                self.unavailable = True
+                self._cond.notify_all()
+                return None
+            self.engines.append(engine)
+            return engine
+    
+    def release(self, engine):
+        with self._cond:
+            self.idle.append(engine)
+            self._cond.notify()
+    
+    def preload(self):
+        """Loads one engine now, for workers that would rather pay at startup than on the first card."""
+        engine = self.acquire()
+        if engine is not None:
+            self.release(engine)
+        return engine is not None
+    
+    def _run(self, method, count, *args, **kwargs):
+        engine = self.acquire()
+        if engine is None:
+            return [{'text': '', 'confidence': 0.0, 'lines': []} for _ in range(count)]
+        try:
+            return getattr(engine, method)(*args, **kwargs)
+        finally:
+            self.release(engine)
+    
+    def extract_text_batch(self, card_images, preprocess=True, save_roi_paths=None, fast_mode=True):
+        return self._run('extract_text_batch', len(card_images), card_images, preprocess=preprocess,
+                         save_roi_paths=save_roi_paths, fast_mode=fast_mode)
+    
+    def extract_text_from_card(self, card_image, preprocess=True, save_roi_path=None, fast_mode=True):
+        return self._run('extract_text_batch', 1, [card_image], preprocess=preprocess,
+                         save_roi_paths=[save_roi_path], fast_mode=fast_mode)[0]
+    
+    def stats(self):
+        with self._cond:
+            engines = [e for e in self.engines if e is not None]
+            totals = {}
+            for engine in engines:
+                for key, value in engine.stats().items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        totals[key] = totals.get(key, 0) + value
+            return dict(totals, engines=len(engines), pool_size=self.size, idle=len(self.idle),
+                        waits=self.waits, init_seconds=round(self.init_seconds, 2), unavailable=self.unavailable)
+
+
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+
+def get_ocr_pool(size=1, **engine_kwargs):
+    """The process-wide PokemonCardOCRPool (created on first call, later arguments are ignored)."""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = PokemonCardOCRPool(size, **engine_kwargs)
+        return _ocr_pool
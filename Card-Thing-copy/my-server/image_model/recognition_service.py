@@ -0,0 +1,244 @@
+"""
+Long-lived recognition worker: loads the models and databases once, then
+answers one JSON request per stdin line with one JSON line on stdout.
+
+    request:  {"id": "abc", "image_path": "/tmp/up.jpg", "output_json": "/tmp/card.json"}
+              {"id": "abc", "image_b64": "<base64 jpg/png bytes>"}
+              {"id": "abc", "image_path": "/tmp/binder.jpg", "multi": true}
+              {"id": "abc", "image_path": "/tmp/old.jpg", "priority": "bulk", "timeout_s": 600, "async": true,
+               "callback_url": "http://localhost:3001/recognized"}
+              {"id": "abc", "command": "stats" | "metrics"}
+              {"id": "q", "command": "status", "job_id": "abc"}
+              {"id": "r", "command": "db_reload", "drop_deltas": false}
+              {"id": "d", "command": "db_delta", "add": [{"id": "sv9-1", "name": .., "p_hash": .., ..}], "remove": ["sv9-2"]}
+              {"id": "d", "command": "db_delta", "path": "/tmp/new_cards.csv"}
+    response: {"id": "abc", "status": "ok", "card": {...}}   ("cards": [..] with multi)
+              {"id": "abc", "status": "no_card" | "error", "error": ..}
+              {"id": "abc", "status": "queued", "job_id": "abc", "position": 3}   (async, right away)
+              {"id": "abc", "status": "rejected", "code": 429, ..} / {"status": "timeout", "code": 504, ..}
+              {"id": "q", "status": "ok", "job_id": "abc", "job_status": .., "result": {..}}
+              {"id": "r", "status": "ok", "reloaded": true, "database_stats": {..}}
+
+{"status": "ready"} is written once everything is loaded; pipeline prints go
+to stderr. Image requests run on a JobQueue, so responses can come back out
+of order: match them by id. db_reload runs on its own thread.
+
+Run with:  python final_main.py --serve   (or python recognition_service.py)
+"""
+
+import sys
+import json
+import base64
+import threading
+import traceback
+import urllib.request
+
+import final_main
+from job_queue import JobQueue, JobRejected
+
+CALLBACK_TIMEOUT_S = 5
+# commands that can take seconds, run on their own thread so the stdin loop keeps going
+BACKGROUND_COMMANDS = ('db_reload',)
+
+
+def read_request_image(request):
+    """Returns the encoded image bytes of a request, or None if there are none."""
+    if request.get('image_b64'):
+        return base64.b64decode(request['image_b64'])
+    if request.get('image_path'):
+        try:
+            with open(request['image_path'], 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+    return None
+
+
+def handle_request(request, resources, jobs=None):
+    """Runs one recognition request (or command) and returns the response dict."""
+    response = {'id': request.get('id')}
+    database = resources.get('database')
+
+    if request.get('command') == 'stats':
+        scheduler = final_main.get_candidate_scheduler()
+        cache, ocr_pipeline = resources.get('cache'), resources.get('ocr_pipeline')
+        metrics = final_main.get_stage_metrics()
+        response.update(status='ok', candidate_stats=scheduler.stats() if scheduler else None,
+                        cache_stats=cache.stats() if cache else None,
+                        ocr_stats=ocr_pipeline.stats() if ocr_pipeline else None,
+                        stage_stats=metrics.stats() if metrics.enabled else None,
+                        debug_stats=final_main.get_debug_writer().stats(),
+                        queue_stats=jobs.stats() if jobs else None,
+                        database_stats=database.stats() if database else None)
+        return response
+
+    if request.get('command') == 'db_reload':
+        if database is None:
+            response.update(status='error', error='No live database')
+            return response
+        reloaded = database.reload(force=True, drop_deltas=bool(request.get('drop_deltas')))
+        response.update(status='ok', reloaded=reloaded, database_stats=database.stats())
+        return response
+
+    if request.get('command') == 'db_delta':
+        if database is None:
+            response.update(status='error', error='No live database')
+            return response
+        if request.get('path'):
+            database.apply_delta_csv(request['path'])
+        else:
+            database.apply_delta(request.get('add') or [], request.get('remove') or [])
+        response.update(status='ok', database_stats=database.stats())
+        return response
+
+    if request.get('command') == 'status':
+        info = jobs.status(request.get('job_id')) if jobs else None
+        if info is None:
+            response.update(status='error', error='Unknown job')
+        else:
+            response.update(info, status='ok')
+        return response
+
+    if request.get('command') == 'metrics':
+        response.update(status='ok', metrics=final_main.get_stage_metrics().prometheus_text())
+        return response
+
+    with final_main.get_stage_metrics().request(request.get('id')):
+        return handle_image_request(request, resources, response)
+
+
+def handle_image_request(request, resources, response):
+    image_bytes = read_request_image(request)
+    multi = bool(request.get('multi'))
+    decoded, output_data = final_main.recognize_image_bytes(image_bytes, resources, multi=multi) if image_bytes else (False, None)
+    if not decoded:
+        response.update(status='error', error='Failed to load image')
+        return response
+    if not output_data or (multi and not any(entry['card'] for entry in output_data)):
+        response['status'] = 'no_card'
+        return response
+
+    if request.get('output_json'):
+        final_main.write_output_json(output_data, request['output_json'])
+
+    response.update(status='ok')
+    response['cards' if multi else 'card'] = output_data
+    return response
+
+
+def run_job(request, resources):
+    """JobQueue handler: one image request on a worker thread"""
+    try:
+        return handle_request(request, resources)
+    except Exception as e:
+        traceback.print_exc()
+        return {'id': request.get('id'), 'status': 'error', 'error': str(e)}
+
+
+def post_callback(url, payload):
+    data = json.dumps(payload).encode('utf-8')
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'}, method='POST')
+    try:
+        urllib.request.urlopen(req, timeout=CALLBACK_TIMEOUT_S).close()
+    except Exception as e:
+        print(f"callback to {url} failed: {e}")
+
+
+def submit_job(request, jobs, respond):
+    """queues an image request, its response is written when the job finishes"""
+    request_id = request.get('id')
+    # a fast job must not answer before its "queued" acknowledgement
+    acknowledged = threading.Event()
+
+    def on_done(job):
+        result = dict(job.result, id=request_id)
+        if request.get('callback_url'):
+            post_callback(request['callback_url'], result)
+        acknowledged.wait()
+        respond(result)
+
+    try:
+        _, position = jobs.submit(request_id, request, request.get('priority', 'interactive'),
+                                  request.get('timeout_s'), on_done)
+    except JobRejected as e:
+        respond({'id': request_id, 'status': 'rejected', 'code': JobRejected.code, 'error': str(e)})
+        return
+    except ValueError as e:
+        respond({'id': request_id, 'status': 'error', 'error': str(e)})
+        return
+    if request.get('async'):
+        respond({'id': request_id, 'status': 'queued', 'job_id': request_id, 'position': position})
+    acknowledged.set()
+
+
+def run_command(request, resources, jobs, respond):
+    try:
+        respond(handle_request(request, resources, jobs))
+    except Exception as e:
+        traceback.print_exc()
+        respond({'id': request.get('id'), 'status': 'error', 'error': str(e)})
+
+
+def serve_jsonl(stdin=None, stdout=None):
+    """stdin/stdout JSON-lines loop, one request per line until EOF."""
+    stdin = stdin or sys.stdin
+    out = stdout or sys.stdout
+    # keep the pipeline's prints away from the response channel
+    sys.stdout = sys.stderr
+    out_lock = threading.Lock()
+
+    def respond(payload):
+        # worker threads answer as their jobs finish
+        with out_lock:
+            out.write(json.dumps(payload) + "\n")
+            out.flush()
+
+    resources = final_main.load_resources()
+    if resources is None:
+        respond({'status': 'fatal', 'error': 'Failed to load card database'})
+        return
+
+    # create the lazy process-wide helpers now, not racing in several workers
+    final_main.get_candidate_scheduler()
+    final_main.get_candidate_pool()
+    final_main.get_stage_metrics()
+    final_main.get_debug_writer()
+    jobs = JobQueue(lambda request: run_job(request, resources), final_main.SERVICE_WORKERS,
+                    final_main.SERVICE_MAX_QUEUE, final_main.SERVICE_MAX_BULK_QUEUE, final_main.SERVICE_QUEUE_TIMEOUT_S)
+
+    respond({'status': 'ready'})
+
+    background = []
+    for line in stdin:
+        line = line.strip()
+        if not line: continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            respond({'id': None, 'status': 'error', 'error': f"Bad request: {e}"})
+            continue
+
+        if not request.get('command'):
+            submit_job(request, jobs, respond)
+            continue
+        if request['command'] in BACKGROUND_COMMANDS:
+            thread = threading.Thread(target=run_command, args=(request, resources, jobs, respond),
+                                      name=request['command'], daemon=True)
+            thread.start()
+            background = [t for t in background if t.is_alive()] + [thread]
+            continue
+        run_command(request, resources, jobs, respond)
+
+    # the jobs and reloads still running at EOF are answered before exiting
+    for thread in background:
+        thread.join()
+    jobs.close(wait=True)
+    scheduler = final_main.get_candidate_scheduler()
+    if scheduler is not None:
+        scheduler.save()
+    final_main.get_debug_writer().flush()
+    resources['database'].close()
+
+
+if __name__ == "__main__":
+    serve_jsonl()
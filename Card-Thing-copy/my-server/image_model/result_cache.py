@@ -0,0 +1,271 @@
+"""
+Recognition result cache, an LRU in memory with an optional bounded sqlite
+tier on disk:
+
+  'file'  - sha256 of the uploaded bytes -> the whole recognition output
+  'phash' - card crop pHash -> (card, distance), reused within RESULT_CACHE_RADIUS bits
+
+Entries belong to one database version (csv mtime + size, or the live
+snapshot's version) and are dropped when it changes.
+"""
+
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from hash_index import popcount64
+
+# returned by the get_* methods when nothing is cached (None is a valid cached result)
+MISS = object()
+# tables of an older layout are dropped when the disk tier is opened
+DISK_SCHEMA = '2'
+# the disk tier is pruned back to disk_max_entries once a layer is this much over it
+DISK_PRUNE_SLACK = 0.1
+
+
+def database_version(csv_path):
+    try:
+        stat = os.stat(csv_path)
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def file_key(image_bytes, multi=False):
+    return hashlib.sha256(image_bytes).hexdigest() + (':multi' if multi else '')
+
+
+def _signed(value):
+    # sqlite integers are signed 64 bit
+    return int(np.uint64(value).astype(np.int64))
+
+
+class ResultCache:
+    """both cache layers for one csv, shared by every request of the process"""
+
+    def __init__(self, csv_path, max_entries=256, radius=3, disk_path=None, version_source=None,
+                 disk_max_entries=100000, disk_max_age_s=None):
+        """
+        version_source: callable returning the current database version (default: the csv's mtime + size)
+        disk_max_entries / disk_max_age_s: bounds of the sqlite tier per layer (None = no bound)
+        """
+        self.csv_path = csv_path
+        self.version_source = version_source
+        self.max_entries = max_entries
+        self.radius = radius
+        self.disk_max_entries = disk_max_entries
+        self.disk_max_age_s = disk_max_age_s
+        self._lock = threading.RLock()
+        self._files = OrderedDict()
+        self._phashes = OrderedDict()
+        self.counters = {layer: {'hits': 0, 'disk_hits': 0, 'misses': 0} for layer in ('file', 'phash')}
+        self.version = self._source_version()
+        self._db = None
+        # pHashes of the phash_results rows: the first _disk_count slots of a buffer that doubles when full
+        self._disk_hashes = np.empty(0, dtype=np.uint64)
+        self._disk_count = 0
+        self._disk_hash_set = set()
+        self._disk_rows = {'file_results': 0, 'phash_results': 0}
+        if disk_path:
+            self._open_disk(disk_path)
+
+    # --- disk tier ---
+
+    def _open_disk(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+        if row is None or row[0] != DISK_SCHEMA:
+            with self._db:
+                self._db.execute("DROP TABLE IF EXISTS file_results")
+                self._db.execute("DROP TABLE IF EXISTS phash_results")
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (DISK_SCHEMA,))
+        self._db.execute("CREATE TABLE IF NOT EXISTS file_results (key TEXT PRIMARY KEY, value TEXT, stored REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS phash_results (phash INTEGER PRIMARY KEY, value TEXT, stored REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS file_results_stored ON file_results (stored)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS phash_results_stored ON phash_results (stored)")
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'db_version'").fetchone()
+        if row is None or row[0] != self.version:
+            self._clear_disk()
+        self._prune_disk()
+
+    def _clear_disk(self):
+        with self._db:
+            self._db.execute("DELETE FROM file_results")
+            self._db.execute("DELETE FROM phash_results")
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('db_version', ?)", (self.version,))
+        self._load_disk_hashes()
+
+    def _load_disk_hashes(self):
+        rows = self._db.execute("SELECT phash FROM phash_results").fetchall()
+        self._disk_hashes = np.array([r[0] for r in rows], dtype=np.int64).view(np.uint64)
+        self._disk_count = len(self._disk_hashes)
+        self._disk_hash_set = set(self._disk_hashes.tolist())
+        for table in self._disk_rows:
+            self._disk_rows[table] = self._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def _add_disk_hash(self, phash):
+        if phash in self._disk_hash_set:
+            return
+        if self._disk_count == len(self._disk_hashes):
+            grown = np.empty(max(64, 2 * len(self._disk_hashes)), dtype=np.uint64)
+            grown[:self._disk_count] = self._disk_hashes[:self._disk_count]
+            self._disk_hashes = grown
+        self._disk_hashes[self._disk_count] = phash
+        self._disk_count += 1
+        self._disk_hash_set.add(phash)
+
+    def _prune_disk(self):
+        """drops rows past disk_max_age_s and the oldest rows past disk_max_entries, then reloads the hashes"""
+        try:
+            with self._db:
+                for table in self._disk_rows:
+                    if self.disk_max_age_s is not None:
+                        self._db.execute(f"DELETE FROM {table} WHERE stored < ?", (time.time() - self.disk_max_age_s,))
+                    if self.disk_max_entries is not None:
+                        self._db.execute(f"DELETE FROM {table} WHERE rowid IN "
+                                         f"(SELECT rowid FROM {table} ORDER BY stored DESC LIMIT -1 OFFSET ?)",
+                                         (self.disk_max_entries,))
+        except sqlite3.Error as e:
+            print(f"result cache prune failed: {e}")
+        self._load_disk_hashes()
+
+    def _disk_get(self, sql, params):
+        """the value column of a row that isn't past disk_max_age_s, or None"""
+        oldest = time.time() - self.disk_max_age_s if self.disk_max_age_s is not None else float('-inf')
+        row = self._db.execute(sql + " AND stored >= ?", params + (oldest,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _disk_put(self, table, sql, params, is_new):
+        try:
+            with self._db:
+                self._db.execute(sql, params + (time.time(),))
+        except sqlite3.Error as e:
+            print(f"result cache write failed: {e}")
+            return False
+        self._disk_rows[table] += int(is_new)
+        if self.disk_max_entries is not None and self._disk_rows[table] > self.disk_max_entries * (1 + DISK_PRUNE_SLACK):
+            self._prune_disk()
+        return True
+
+    # --- invalidation ---
+
+    def _source_version(self):
+        return self.version_source() if self.version_source else database_version(self.csv_path)
+
+    def _stale(self, version):
+        """True when a request recognized with another database version than the cache holds"""
+        return version is not None and version != self.version
+
+    def check_version(self):
+        """drops everything if the database changed since the entries were stored"""
+        version = self._source_version()
+        with self._lock:
+            if version == self.version:
+                return
+            print("Card database changed, clearing result cache")
+            self.version = version
+            self._files.clear()
+            self._phashes.clear()
+            if self._db is not None:
+                self._clear_disk()
+
+    # --- exact layer ---
+
+    def get_file(self, key, version=None):
+        self.check_version()
+        with self._lock:
+            if self._stale(version):
+                self.counters['file']['misses'] += 1
+                return MISS
+            if key in self._files:
+                self._files.move_to_end(key)
+                self.counters['file']['hits'] += 1
+                return self._files[key]
+            if self._db is not None:
+                stored = self._disk_get("SELECT value FROM file_results WHERE key = ?", (key,))
+                if stored is not None:
+                    value = json.loads(stored)
+                    self._remember(self._files, key, value)
+                    self.counters['file']['disk_hits'] += 1
+                    return value
+            self.counters['file']['misses'] += 1
+            return MISS
+
+    def put_file(self, key, value, version=None):
+        self.check_version()
+        with self._lock:
+            if self._stale(version): return
+            self._remember(self._files, key, value)
+            if self._db is not None:
+                is_new = self._db.execute("SELECT 1 FROM file_results WHERE key = ?", (key,)).fetchone() is None
+                self._disk_put('file_results', "INSERT OR REPLACE INTO file_results VALUES (?, ?, ?)",
+                               (key, json.dumps(value)), is_new)
+
+    # --- near duplicate layer ---
+
+    def _nearest(self, hashes, query):
+        if not len(hashes):
+            return None
+        dists = popcount64(np.bitwise_xor(hashes, np.uint64(query)))
+        idx = int(np.argmin(dists))
+        return idx if dists[idx] <= self.radius else None
+
+    def get_phash(self, phash, version=None):
+        """(card dict, distance) stored for a crop within radius bits of phash, or MISS"""
+        self.check_version()
+        with self._lock:
+            if self._stale(version):
+                self.counters['phash']['misses'] += 1
+                return MISS
+            keys = list(self._phashes)
+            idx = self._nearest(np.array(keys, dtype=np.uint64), phash)
+            if idx is not None:
+                self._phashes.move_to_end(keys[idx])
+                self.counters['phash']['hits'] += 1
+                return self._phashes[keys[idx]]
+            if self._db is not None:
+                idx = self._nearest(self._disk_hashes[:self._disk_count], phash)
+                if idx is not None:
+                    stored_hash = int(self._disk_hashes[idx])
+                    stored = self._disk_get("SELECT value FROM phash_results WHERE phash = ?", (_signed(stored_hash),))
+                    if stored is not None:
+                        value = tuple(json.loads(stored))
+                        self._remember(self._phashes, stored_hash, value)
+                        self.counters['phash']['disk_hits'] += 1
+                        return value
+            self.counters['phash']['misses'] += 1
+            return MISS
+
+    def put_phash(self, phash, card, distance, version=None):
+        value = (dict(card), distance)
+        self.check_version()
+        with self._lock:
+            if self._stale(version): return
+            self._remember(self._phashes, int(phash), value)
+            if self._db is not None:
+                phash = int(phash)
+                is_new = phash not in self._disk_hash_set
+                if self._disk_put('phash_results', "INSERT OR REPLACE INTO phash_results VALUES (?, ?, ?)",
+                                  (_signed(phash), json.dumps(value)), is_new):
+                    self._add_disk_hash(phash)
+
+    def _remember(self, entries, key, value):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': {'file': len(self._files), 'phash': len(self._phashes)},
+                'disk_entries': dict(self._disk_rows) if self._db is not None else None,
+                'counters': {layer: dict(c) for layer, c in self.counters.items()},
+            }
@@ -0,0 +1,210 @@
+"""
+Per-request stage profiling.
+
+    with stage('detect'):              # wall time, summed over calls
+        detections = detect_cards(...)
+    count('candidates_evaluated', 11)  # per request counters
+
+Both are no-ops outside a profiled request. StageMetrics appends one JSON
+line per request to a log file and keeps Prometheus histograms
+(prometheus_text()).
+"""
+
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# seconds, Prometheus convention
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_PREFIX = 'card_recognition'
+
+_local = threading.local()
+
+
+class RequestProfile:
+    """stage durations + counters of one request"""
+
+    def __init__(self, request_id=None):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.total_ms = None
+        self.stages = {}
+        self.counts = {}
+
+    def add_stage(self, name, ms):
+        entry = self.stages.get(name)
+        if entry is None:
+            self.stages[name] = [ms, 1]
+        else:
+            entry[0] += ms
+            entry[1] += 1
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+        return self
+
+    def as_dict(self):
+        return {
+            'ts': round(time.time(), 3),
+            'request_id': self.request_id,
+            'total_ms': round(self.total_ms, 3) if self.total_ms is not None else None,
+            'stages': {name: {'ms': round(ms, 3), 'calls': calls} for name, (ms, calls) in self.stages.items()},
+            'counts': dict(self.counts),
+        }
+
+
+class _Stage:
+    __slots__ = ('profile', 'name', 'start')
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.add_stage(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def current_profile():
+    return getattr(_local, 'profile', None)
+
+
+def stage(name):
+    """context manager timing one pipeline stage of the current request (no-op without one)"""
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        return _NO_STAGE
+    return _Stage(profile, name)
+
+
+def count(name, n=1):
+    """adds n to a counter of the current request (no-op without one)"""
+    profile = getattr(_local, 'profile', None)
+    if profile is not None:
+        profile.count(name, n)
+
+
+class _Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class StageMetrics:
+    """process wide collector of finished request profiles"""
+
+    def __init__(self, enabled=False, log_path=None, buckets=DURATION_BUCKETS):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._stage_histograms = {}
+        self._request_histogram = _Histogram(self.buckets)
+        self._counters = {}
+        self.requests = 0
+
+    @contextmanager
+    def request(self, request_id=None):
+        """profiles everything the current thread runs inside the block, yields the profile (None when disabled)"""
+        if not self.enabled or current_profile() is not None:
+            # disabled, or nested inside a request that is already being profiled
+            yield None
+            return
+        profile = RequestProfile(request_id)
+        _local.profile = profile
+        try:
+            yield profile
+        finally:
+            _local.profile = None
+            self.observe(profile.finish())
+
+    def observe(self, profile):
+        with self._lock:
+            self.requests += 1
+            self._request_histogram.observe(profile.total_ms / 1000)
+            for name, (ms, _) in profile.stages.items():
+                histogram = self._stage_histograms.get(name)
+                if histogram is None:
+                    histogram = self._stage_histograms[name] = _Histogram(self.buckets)
+                histogram.observe(ms / 1000)
+            for name, n in profile.counts.items():
+                self._counters[name] = self._counters.get(name, 0) + n
+            if self.log_path:
+                try:
+                    with open(self.log_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(profile.as_dict()) + "\n")
+                except OSError as e:
+                    print(f"Couldn't write the stage log: {e}")
+
+    def prometheus_text(self):
+        """all histograms + counters in the Prometheus text exposition format"""
+        lines = []
+
+        def histogram_lines(name, histogram, labels=''):
+            sep = ',' if labels else ''
+            for bound, n in zip(histogram.buckets, histogram.counts):
+                lines.append(f'{name}_bucket{{{labels}{sep}le="{bound:g}"}} {n}')
+            lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {histogram.total}')
+            suffix = f'{{{labels}}}' if labels else ''
+            lines.append(f'{name}_sum{suffix} {histogram.sum:.6f}')
+            lines.append(f'{name}_count{suffix} {histogram.total}')
+
+        with self._lock:
+            name = f'{METRIC_PREFIX}_request_duration_seconds'
+            lines.append(f'# HELP {name} Wall time of a whole recognition request.')
+            lines.append(f'# TYPE {name} histogram')
+            histogram_lines(name, self._request_histogram)
+
+            name = f'{METRIC_PREFIX}_stage_duration_seconds'
+            lines.append(f'# HELP {name} Wall time per request spent in one pipeline stage.')
+            lines.append(f'# TYPE {name} histogram')
+            for stage_name in sorted(self._stage_histograms):
+                histogram_lines(name, self._stage_histograms[stage_name], f'stage="{stage_name}"')
+
+            name = f'{METRIC_PREFIX}_events_total'
+            lines.append(f'# HELP {name} Pipeline counters summed over all requests.')
+            lines.append(f'# TYPE {name} counter')
+            for counter in sorted(self._counters):
+                lines.append(f'{name}{{event="{counter}"}} {self._counters[counter]}')
+        return "\n".join(lines) + "\n"
+
+    def stats(self):
+        """per stage request count / mean ms, for the service stats command"""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'stages': {name: {'requests': h.total, 'mean_ms': round(h.sum / h.total * 1000, 3)}
+                           for name, h in self._stage_histograms.items() if h.total},
+                'counts': dict(self._counters),
+            }
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules are imported flat, like final_main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
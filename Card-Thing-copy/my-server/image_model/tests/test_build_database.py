@@ -0,0 +1,49 @@
+import os
+import csv
+
+import cv2
+import numpy as np
+
+import build_database
+from native_phash import phash_bgr
+
+COLUMNS = ['id', 'name', 'number', 'image_url', 'p_hash', 'extra_hashes']
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def read_csv(path):
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        return {row['id']: row for row in csv.DictReader(f)}
+
+
+def card(card_id, p_hash, extra=''):
+    return {'id': card_id, 'name': card_id, 'number': '1', 'image_url': '', 'p_hash': p_hash, 'extra_hashes': extra}
+
+
+def test_build_keeps_p_hash_and_drops_trims_of_missing_images(tmp_path):
+    images = tmp_path / 'images'
+    images.mkdir()
+    image = np.random.default_rng(0).integers(0, 256, (280, 200, 3), dtype=np.uint8)
+    cv2.imwrite(str(images / 'set1-1.png'), image)
+    os.utime(images / 'set1-1.png', ns=(10**18, 10**18))
+
+    csv_path = str(tmp_path / 'db.csv')
+    write_csv(csv_path, [card('set1-1', '0123456789abcdef'), card('set1-2', 'fedcba9876543210', '1111222233334444')])
+    os.utime(csv_path, ns=(2 * 10**18, 2 * 10**18))
+
+    build_database.build(str(images), csv_path, workers=1, trims=[0.05, 0.12])
+    rows = read_csv(csv_path)
+    # the image is older than the csv: its p_hash stays, its trims are added
+    assert rows['set1-1']['p_hash'] == '0123456789abcdef'
+    assert rows['set1-1']['extra_hashes']
+    # no image any more: the old trims go, the p_hash stays
+    assert rows['set1-2'] == card('set1-2', 'fedcba9876543210')
+
+    build_database.build(str(images), csv_path, workers=1, trims=[0.05, 0.12], rehash=True)
+    assert read_csv(csv_path)['set1-1']['p_hash'] == '%016x' % phash_bgr(image)
@@ -0,0 +1,33 @@
+import io
+import os
+import json
+
+import bulk_scan
+
+
+def _init_stub(verbose, debug):
+    pass
+
+
+def _scan_stub(path, multi):
+    if path.endswith('die.jpg'):
+        # a worker killed mid image, e.g. by the OOM killer
+        os._exit(1)
+    return {'path': path, 'status': 'ok', 'card': None, 'ms': 0.0}
+
+
+def test_dead_worker_every_path_written_once(monkeypatch):
+    monkeypatch.setattr(bulk_scan, '_init_worker', _init_stub)
+    monkeypatch.setattr(bulk_scan, '_scan_one', _scan_stub)
+    paths = [f'/photos/{i:03d}.jpg' for i in range(40)]
+    paths.insert(17, '/photos/die.jpg')
+
+    out = io.StringIO()
+    counts, _ = bulk_scan.scan(paths, out, workers=2)
+
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    written = [result['path'] for result in results]
+    assert sorted(written) == sorted(paths)
+    assert len(written) == len(set(written))
+    assert {'path': '/photos/die.jpg', 'status': 'error', 'error': 'Worker process died'} in results
+    assert sum(counts.values()) == len(paths)
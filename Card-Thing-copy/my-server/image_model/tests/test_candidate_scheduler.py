@@ -0,0 +1,39 @@
+import final_main
+from candidate_scheduler import CandidateScheduler
+
+
+def _search(monkeypatch, distances):
+    """search_candidates for one card whose candidates get the given hash distances"""
+    monkeypatch.setattr(final_main, 'ROTATION_MODE', 'sweep')
+    monkeypatch.setattr(final_main, 'ADAPTIVE_CANDIDATES', True)
+    scheduler = CandidateScheduler(final_main.candidate_specs(), final_main.candidate_name, wave_size=100)
+    monkeypatch.setattr(final_main, '_candidate_scheduler', scheduler)
+    monkeypatch.setattr(final_main, 'flatten_card', lambda *args: None)
+
+    def compute_candidates(cards, card_specs):
+        return [[{'spec': spec, 'type': final_main.candidate_name(spec), 'hash': i, 'img': None}
+                 for i, spec in enumerate(specs)] for specs in card_specs]
+
+    def find_best_hash_matches(hashes, hash_db):
+        return [({'id': 'card'}, distances.get(h, distances['rest'])) for h in hashes]
+
+    monkeypatch.setattr(final_main, 'compute_candidates', compute_candidates)
+    monkeypatch.setattr(final_main, 'find_best_hash_matches', find_best_hash_matches)
+    card = {'contour': None, 'crop_x1': 0, 'crop_y1': 0, 'raw_img': None}
+    final_main.search_candidates(None, [card], None)
+    return scheduler
+
+
+def test_unmatched_card_records_no_winner(monkeypatch):
+    # every candidate past the match threshold, e.g. the MIH radius + 1 sentinel
+    scheduler = _search(monkeypatch, {'rest': final_main.HASH_SIMILARITY_THRESHOLD + 1})
+    stats = scheduler.stats()
+    assert stats['cards'] == 1
+    assert all(v['wins'] == 0 for v in stats['variants'].values())
+    assert all(v['evaluated'] == 1 for v in stats['variants'].values())
+
+
+def test_matched_card_credits_best_candidate(monkeypatch):
+    scheduler = _search(monkeypatch, {2: final_main.HASH_SIMILARITY_THRESHOLD, 'rest': 40})
+    wins = {name: v['wins'] for name, v in scheduler.stats()['variants'].items() if v['wins']}
+    assert wins == {final_main.candidate_name(final_main.candidate_specs()[2]): 1}
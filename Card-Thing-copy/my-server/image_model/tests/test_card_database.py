@@ -0,0 +1,31 @@
+import os
+import csv
+
+from card_database import load_card_database
+
+COLUMNS = ['id', 'name', 'number', 'p_hash']
+
+
+def write_csv(path, rows, mtime_ns):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_recompile_leaves_the_mapped_file_alone(tmp_path):
+    csv_path = str(tmp_path / 'db.csv')
+    binary_path = str(tmp_path / 'db.cardb')
+    write_csv(csv_path, [['a-1', 'Pikachu', '1', '0f0f0f0f0f0f0f0f']], 10**18)
+    old = load_card_database(csv_path, binary_path)
+    assert load_card_database(csv_path, binary_path).path == old.path
+
+    write_csv(csv_path, [['a-1', 'Pikachu', '1', '0f0f0f0f0f0f0f0f'], ['a-2', 'Raichu', '2', 'f0f0f0f0f0f0f0f0']], 2 * 10**18)
+    new = load_card_database(csv_path, binary_path)
+    # a new file for the new csv, the running worker's map still reads the old one
+    assert new.path != old.path
+    assert len(new) == 2 and len(old) == 1
+    assert old.row(0)['name'] == 'Pikachu'
+    # the old version is cleaned up, only the new one (+ the lock file) is left
+    assert sorted(os.listdir(tmp_path)) == sorted(['db.csv', 'db.cardb.lock', os.path.basename(new.path)])
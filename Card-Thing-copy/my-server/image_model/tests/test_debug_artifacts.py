@@ -0,0 +1,27 @@
+import numpy as np
+
+from debug_artifacts import DebugArtifactWriter
+
+
+class TrackedArray(np.ndarray):
+    copies = 0
+
+    def copy(self, *args, **kwargs):
+        TrackedArray.copies += 1
+        return super().copy(*args, **kwargs)
+
+
+def test_dropped_view_is_not_copied(tmp_path):
+    writer = DebugArtifactWriter(str(tmp_path), 'all', queue_mb=1)
+    photo = np.zeros((2000, 1000, 3), dtype=np.uint8).view(TrackedArray)
+    TrackedArray.copies = 0
+
+    # 3 MB crop, over the 1 MB queue limit
+    assert not writer.submit('big.jpg', photo[:1000])
+    assert TrackedArray.copies == 0 and writer.counters['dropped'] == 1
+
+    assert writer.submit('small.jpg', photo[:100, :100])
+    assert TrackedArray.copies == 1
+    writer.flush()
+    assert writer.counters['written'] == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['small.jpg']
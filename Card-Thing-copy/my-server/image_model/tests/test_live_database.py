@@ -0,0 +1,113 @@
+import csv
+import time
+import threading
+
+import pytest
+
+import final_main
+from live_database import LiveDatabase
+
+COLUMNS = ['lookup_key', 'id', 'name', 'supertype', 'set_name', 'number', 'image_url', 'p_hash', 'hp',
+           'subtypes', 'types', 'rarity', 'extra_hashes']
+SHARED = 'a5a5a5a5a5a5a5a5'
+
+
+def card(card_id, name, number, p_hash, extra=''):
+    return {'lookup_key': f'{name.lower()}_{number}', 'id': card_id, 'name': name, 'supertype': 'Pokémon',
+            'set_name': 'Test', 'number': number, 'image_url': '', 'p_hash': p_hash, 'hp': '60',
+            'subtypes': 'Basic', 'types': 'Fire', 'rarity': 'Common', 'extra_hashes': extra}
+
+
+BASE_ROWS = [
+    card('t1-1', 'Charmander', '1', '0f0f0f0f0f0f0f0f'),
+    # a reprint with the same artwork: one hash, two cards, the later row is the one indexed
+    card('t1-2', 'Charmander', '2', SHARED),
+    card('t2-2', 'Charmander', '2', SHARED),
+    card('t1-3', 'Pikachu', '3', 'ffff0000ffff0000', 'ffff0000ffff00ff'),
+    card('t1-4', 'Squirtle', '4', '123456789abcdef0'),
+]
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+@pytest.fixture(params=[True, False], ids=['compiled', 'csv'])
+def compiled(request, monkeypatch):
+    monkeypatch.setattr(final_main, 'USE_COMPILED_DATABASE', request.param)
+    return request.param
+
+
+def best_id(snapshot, card_hash):
+    match, _ = snapshot.hash_db.best_matches([int(card_hash, 16)], 0)[0]
+    return match['id'] if match is not None else None
+
+
+def test_removing_a_card_keeps_the_one_sharing_its_hash(tmp_path, compiled):
+    live = LiveDatabase(write_csv(tmp_path / 'db.csv', BASE_ROWS), final_main.load_dual_database)
+    assert best_id(live.current(), SHARED) == 't2-2'
+    assert best_id(live.apply_delta(removed=['t2-2']), SHARED) == 't1-2'
+    assert best_id(live.apply_delta(removed=['t1-2']), SHARED) is None
+    assert best_id(live.apply_delta(added=[card('t1-2', 'Charmander', '2', SHARED)]), SHARED) == 't1-2'
+
+
+def test_removed_hash_goes_to_the_card_a_reload_would_pick(tmp_path, compiled):
+    # t-a comes after t-b in the csv but its name was seen first, so it's earlier in text_db order
+    rows = [card('t-p', 'Pikachu', '1', '0f0f0f0f0f0f0f0f'), card('t-b', 'Charmander', '5', SHARED),
+            card('t-a', 'Pikachu', '2', SHARED), card('t-c', 'Squirtle', '7', SHARED)]
+    live = LiveDatabase(write_csv(tmp_path / 'db.csv', rows), final_main.load_dual_database)
+    assert best_id(live.current(), SHARED) == 't-c'
+    hash_db, _ = final_main.load_dual_database(write_csv(tmp_path / 'full.csv', rows[:3]))
+    assert best_id(live.apply_delta(removed=['t-c']), SHARED) == hash_db.best_matches([int(SHARED, 16)], 0)[0][0]['id'] == 't-a'
+
+
+def test_delta_matches_a_full_reload(tmp_path, compiled):
+    added = [card('t3-9', 'Zorbatron', '9', 'aaaaaaaaaaaaaaaa'), card('t1-4', 'Squirtle', '4', '0123012301230123')]
+    removed = ['t2-2', 't1-3']
+    live = LiveDatabase(write_csv(tmp_path / 'db.csv', BASE_ROWS), final_main.load_dual_database)
+    snapshot = live.apply_delta(added, removed)
+
+    by_id = {row['id']: row for row in added}
+    edited = [by_id.pop(row['id'], row) for row in BASE_ROWS if row['id'] not in removed] + list(by_id.values())
+    hash_db, text_db = final_main.load_dual_database(write_csv(tmp_path / 'full.csv', edited))
+
+    queries = [int(h, 16) for row in BASE_ROWS + added for h in [row['p_hash']] + row['extra_hashes'].split()]
+    got = [(m and m['id'], d) for m, d in snapshot.hash_db.best_matches(queries, final_main.HASH_SIMILARITY_THRESHOLD)]
+    expected = [(m and m['id'], d) for m, d in hash_db.best_matches(queries, final_main.HASH_SIMILARITY_THRESHOLD)]
+    assert got == expected
+    for name in ('charmander', 'pikachu', 'zorbatron', 'squirtle'):
+        assert sorted(c['id'] for c in final_main.find_candidates_fuzzy(name, '', snapshot.text_db)) == \
+            sorted(c['id'] for c in final_main.find_candidates_fuzzy(name, '', text_db))
+
+
+def test_slow_reload_does_not_block_deltas_or_lookups(tmp_path, compiled):
+    path = write_csv(tmp_path / 'db.csv', BASE_ROWS)
+    loading = threading.Event()
+
+    def slow_loader(csv_path):
+        if live_ref:
+            loading.set()
+            time.sleep(1.0)
+        return final_main.load_dual_database(csv_path)
+
+    live_ref = []
+    live = LiveDatabase(path, slow_loader)
+    live_ref.append(live)
+    reloader = threading.Thread(target=live.reload, kwargs={'force': True})
+    reloader.start()
+    assert loading.wait(5)
+
+    start = time.perf_counter()
+    snapshot = live.apply_delta(added=[card('t3-9', 'Zorbatron', '9', 'aaaaaaaaaaaaaaaa')])
+    assert best_id(snapshot, SHARED) == 't2-2'
+    assert time.perf_counter() - start < 0.5
+    assert reloader.is_alive()
+
+    reloader.join()
+    # the delta applied during the load is laid over the new base
+    assert live.version.endswith('+1')
+    assert best_id(live.current(), 'aaaaaaaaaaaaaaaa') == 't3-9'
@@ -0,0 +1,56 @@
+import pytest
+
+import final_main
+from card_database import compile_database, CardDatabase
+
+# OCR text the way PokemonCardOCR returns it: misread letters, missing suffixes,
+# partial names (substring hits) and the card number in different shapes
+OCR_TEXTS = [
+    "Dialga V 113/189", "Dlalga V", "DialgaV", "Kleavor VSTAR 146", "Kleavor VSTAP", "Darkral VSTAR 99/189",
+    "Turtwlg 1/130", "Ferrosee", "M Charizard EX 69/106", "Charlzard ex 6", "Pikachv V 43", "Pikachu 58/102",
+    "Mewtwo GX", "Mew 151", "Radiant Charizard 11/78", "Professor's Research 147", "Boss's Orders",
+    "Ultra Bal 150", "Arceus VSTAR 123/172", "Umbreon VMAX 95/203", "Gardevoir ex", "Zard", "chu 25",
+    "Origin Forme Palkia V", "Iron Hands ex 70", "Mr. Mime", "Farfetch'd", "Porygon-Z", "Ho-Oh",
+    "Flabébé", "Basic Pikachu 60", "Snorlax 143/236", "Giratina 130",
+]
+
+
+def full_scan_db(text_db):
+    """same nested dict without a name_index, fuzzy_name_matches falls back to the Levenshtein scan"""
+    return {name_key: text_db[name_key] for name_key in text_db}
+
+
+@pytest.fixture(scope='module')
+def databases(tmp_path_factory):
+    _, indexed = final_main.load_dual_database_csv(final_main.DATABASE_FILE)
+    binary_path = str(tmp_path_factory.mktemp('cardb') / 'db.cardb')
+    compile_database(final_main.DATABASE_FILE, binary_path)
+    compiled = CardDatabase(binary_path).text_index()
+    return full_scan_db(indexed), {'csv': indexed, 'compiled': compiled}
+
+
+@pytest.mark.parametrize('source', ['csv', 'compiled'])
+@pytest.mark.parametrize('ocr_text', OCR_TEXTS)
+def test_indexed_candidates_equal_full_scan(databases, source, ocr_text):
+    scan_db, indexed_dbs = databases
+    text_db = indexed_dbs[source]
+    assert text_db.name_index is not None
+
+    name, number = final_main.parse_ocr_result(ocr_text)
+    target = final_main.normalize_string(name)
+    assert final_main.fuzzy_name_matches(target, text_db) == final_main.fuzzy_name_matches(target, scan_db)
+
+    for num in (number, ''):
+        expected = [card['id'] for card in final_main.find_candidates_fuzzy(name, num, scan_db)]
+        got = [card['id'] for card in final_main.find_candidates_fuzzy(name, num, text_db)]
+        assert got == expected
+
+
+def test_samples_cover_substring_hits_and_numbers(databases):
+    scan_db, _ = databases
+    # 'zard' is more than MAX_NAME_DISTANCE edits from e.g. 'radiant charizard', only the substring rule finds it
+    assert 'radiant charizard' in final_main.fuzzy_name_matches('zard', scan_db)
+    # a number narrows the candidates down
+    all_pikachu = final_main.find_candidates_fuzzy('Pikachu', '', scan_db)
+    numbered = final_main.find_candidates_fuzzy('Pikachu', '12', scan_db)
+    assert 0 < len(numbered) < len(all_pikachu)
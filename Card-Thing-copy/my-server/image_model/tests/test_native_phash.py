@@ -0,0 +1,63 @@
+import os
+import glob
+
+import cv2
+import numpy as np
+import pytest
+import imagehash
+from PIL import Image
+
+from native_phash import phash_bgr, phash_bgr_batch
+
+IMAGE_MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_IMAGES = sorted(glob.glob(os.path.join(IMAGE_MODEL_DIR, 'runs', 'detect', '*', 'val_batch*.jpg')) +
+                       glob.glob(os.path.join(IMAGE_MODEL_DIR, '..', '..', 'my-client', 'src', 'images', '*.jpg')))
+
+# odd sizes and aspect ratios: smaller than the 32x32 resize, prime sides, very thin strips, upscales
+ODD_SIZES = [(1, 1), (1, 7), (7, 1), (2, 2), (5, 17), (31, 33), (33, 31), (32, 32), (64, 64), (97, 3),
+             (3, 97), (1000, 2), (2, 1000), (300, 3), (301, 3), (3000, 31), (127, 89), (590, 420), (421, 589), (1201, 853), (4000, 30)]
+
+
+def reference_hash(image_bgr):
+    """what the p_hash column was computed with"""
+    return int(str(imagehash.phash(Image.fromarray(cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)))), 16)
+
+
+def sample_crops(rng, per_image=6):
+    crops = []
+    for path in SAMPLE_IMAGES:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None: continue
+        h, w = image.shape[:2]
+        crops.append(image)
+        for _ in range(per_image):
+            x1, y1 = int(rng.integers(0, w - 8)), int(rng.integers(0, h - 8))
+            x2, y2 = int(rng.integers(x1 + 8, w + 1)), int(rng.integers(y1 + 8, h + 1))
+            crops.append(image[y1:y2, x1:x2])
+    return crops
+
+
+@pytest.mark.skipif(not SAMPLE_IMAGES, reason="no sample images in the tree")
+def test_sample_crops_match_imagehash():
+    crops = sample_crops(np.random.default_rng(0))
+    expected = [reference_hash(crop) for crop in crops]
+    assert [phash_bgr(crop) for crop in crops] == expected
+    # non-contiguous views and a mixed batch go through the same path
+    assert [int(h) for h in phash_bgr_batch(crops)] == expected
+
+
+@pytest.mark.parametrize('height,width', ODD_SIZES)
+def test_odd_sizes_match_imagehash(height, width):
+    rng = np.random.default_rng(height * 10007 + width)
+    noise = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    # smooth content too: near-equal DCT coefficients around the median are where rounding flips bits
+    smooth = cv2.GaussianBlur(noise, (0, 0), 3) if min(height, width) > 1 else noise
+    for image in (noise, smooth):
+        assert phash_bgr(image) == reference_hash(image)
+
+
+def test_flat_and_gradient_images_match_imagehash():
+    images = [np.full((50, 40, 3), value, np.uint8) for value in (0, 128, 255)]
+    ramp = np.tile(np.linspace(0, 255, 300).astype(np.uint8), (200, 1))
+    images += [cv2.merge([ramp, np.flip(ramp, axis=1), 255 - ramp]), cv2.cvtColor(ramp, cv2.COLOR_GRAY2BGR)]
+    assert [int(h) for h in phash_bgr_batch(images)] == [reference_hash(image) for image in images]
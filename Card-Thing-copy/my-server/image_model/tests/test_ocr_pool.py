@@ -0,0 +1,13 @@
+import os
+import sys
+import subprocess
+
+IMAGE_MODEL = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_the_pipeline_does_not_load_paddle():
+    # a fresh interpreter, other tests may have created an engine already
+    code = ("import sys, final_main, recognition_service, bulk_scan; "
+            "print(sorted(m for m in sys.modules if m.split('.')[0] in ('paddle', 'paddleocr', 'paddlex')))")
+    out = subprocess.run([sys.executable, '-c', code], cwd=IMAGE_MODEL, capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1] == '[]'
@@ -0,0 +1,34 @@
+import io
+import sys
+import json
+import time
+import threading
+
+import final_main
+import recognition_service
+from live_database import LiveDatabase
+from test_live_database import BASE_ROWS, write_csv
+
+
+def test_db_reload_does_not_block_other_requests(tmp_path, monkeypatch):
+    reloading = threading.Event()
+
+    def slow_loader(csv_path):
+        if reloading.is_set():
+            time.sleep(1.0)
+        return final_main.load_dual_database(csv_path)
+
+    database = LiveDatabase(write_csv(tmp_path / 'db.csv', BASE_ROWS), slow_loader)
+    reloading.set()
+    monkeypatch.setattr(final_main, 'load_resources', lambda: {'database': database, 'cache': None, 'ocr_pipeline': None})
+    monkeypatch.setattr(final_main, 'CANDIDATE_POOL', None)
+    monkeypatch.setattr(sys, 'stdout', sys.stdout)
+
+    requests = [{'id': 'r', 'command': 'db_reload'}, {'id': 's', 'command': 'stats'}, {'id': 'm', 'command': 'metrics'}]
+    out = io.StringIO()
+    recognition_service.serve_jsonl(io.StringIO(''.join(json.dumps(r) + '\n' for r in requests)), out)
+
+    responses = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r.get('id') for r in responses] == [None, 's', 'm', 'r']
+    assert responses[-1]['status'] == 'ok' and responses[-1]['reloaded'] is True
+    assert responses[-1]['database_stats']['reloads'] == 1
@@ -0,0 +1,67 @@
+import sqlite3
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache, MISS
+
+CARD = {'id': 'base1-58', 'name': 'Pikachu'}
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / 'db.csv'
+    path.write_text('id,name\n')
+    return str(path)
+
+
+def rows(path, table):
+    with sqlite3.connect(path) as db:
+        return db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_storing_a_hash_again_does_not_grow_the_disk_hashes(tmp_path, csv_path):
+    disk = str(tmp_path / 'cache.sqlite')
+    cache = ResultCache(csv_path, max_entries=4, disk_path=disk)
+    for _ in range(50):
+        cache.put_phash(0x0123456789abcdef, CARD, 2)
+    assert cache._disk_count == 1
+    assert cache.stats()['disk_entries'] == {'file_results': 0, 'phash_results': 1}
+    assert rows(disk, 'phash_results') == 1
+
+
+def test_disk_tier_keeps_the_newest_rows(tmp_path, csv_path, monkeypatch):
+    clock = iter(range(10**6))
+    monkeypatch.setattr(result_cache.time, 'time', lambda: float(next(clock)))
+    disk = str(tmp_path / 'cache.sqlite')
+    cache = ResultCache(csv_path, max_entries=1, disk_path=disk, disk_max_entries=20)
+    for i in range(100):
+        cache.put_phash(i << 32, CARD, 0)
+        cache.put_file(f'file-{i}', {'status': 'ok'})
+    # pruned back to the cap whenever a layer grows past it + the slack
+    assert rows(disk, 'phash_results') <= 22 and rows(disk, 'file_results') <= 22
+    assert cache._disk_count == rows(disk, 'phash_results')
+    assert cache.get_phash(99 << 32) == (CARD, 0)
+    assert cache.get_file('file-99') == {'status': 'ok'}
+    assert cache.get_file('file-0') is MISS
+
+    # reopening prunes to the cap
+    reopened = ResultCache(csv_path, max_entries=1, disk_path=disk, disk_max_entries=20)
+    assert rows(disk, 'phash_results') == 20
+    assert sorted(reopened._disk_hashes[:reopened._disk_count].tolist()) == [i << 32 for i in range(80, 100)]
+
+
+def test_disk_rows_expire(tmp_path, csv_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, 'time', lambda: now[0])
+    disk = str(tmp_path / 'cache.sqlite')
+    cache = ResultCache(csv_path, max_entries=1, disk_path=disk, disk_max_age_s=60)
+    cache.put_phash(1 << 40, CARD, 1)
+    cache.put_file('a', {'status': 'ok'})
+    # pushes 'a' out of memory, it's only on disk now
+    cache.put_file('b', {'status': 'ok'})
+
+    now[0] += 61
+    assert cache.get_file('a') is MISS
+    assert ResultCache(csv_path, max_entries=1, disk_path=disk, disk_max_age_s=60).get_phash(1 << 40) is MISS
+    assert rows(disk, 'phash_results') == 0 and rows(disk, 'file_results') == 0
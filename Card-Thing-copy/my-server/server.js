@@ -1,6 +1,7 @@
 import express from "express";
 import cors from "cors";
-import { execFile } from "child_process";
+import { execFile, spawn } from "child_process";
+import readline from "readline";
 import mysql from "mysql2";
 import multer from "multer";
 import path from "path";
@@ -44,6 +45,108 @@ app.use(express.json());
 
 const upload = multer({ dest: "uploads/" }); //this is where all uploaded cards go (folder)
 
+// long running python recognition worker, loads the model + card database once instead of every upload
+const RECOGNITION_TIMEOUT_MS = 3 * 60 * 1000; //longer than the worker's own queue timeout (SERVICE_QUEUE_TIMEOUT_S), only a hung worker gets here
+const RESTART_BACKOFF_MIN_MS = 1000; //a worker that keeps crashing is restarted after 1s, 2s, 4s ... up to the max
+const RESTART_BACKOFF_MAX_MS = 60 * 1000;
+const WORKER_STABLE_MS = 60 * 1000; //a worker that ran this long before exiting was healthy, the backoff starts over
+let recognizer = null;
+let restartDelayMs = 0;
+let restartAfter = 0; //no new worker before this time (ms)
+const pendingRecognitions = new Map(); //request id -> { callback, timer, worker }
+
+function finishRecognition(id, msg) {
+  const pending = pendingRecognitions.get(id);
+  if (!pending) return; //already timed out / failed
+  pendingRecognitions.delete(id);
+  clearTimeout(pending.timer);
+  pending.callback(msg);
+}
+
+function failRecognitions(worker, error) { //fail anything still waiting on this worker
+  for (const [id, pending] of [...pendingRecognitions]) {
+    if (pending.worker === worker) finishRecognition(id, { status: "error", error });
+  }
+}
+
+function startRecognizer() {
+  const worker = spawn("python3", [path.join(__dirname, "image_model", "final_main.py"), "--serve"], {
+    stdio: ["pipe", "pipe", "inherit"], //worker logs go to stderr
+  });
+  recognizer = worker;
+  const startedAt = Date.now();
+
+  readline.createInterface({ input: worker.stdout }).on("line", (line) => {
+    let msg;
+    try {
+      msg = JSON.parse(line);
+    }
+    catch (err) {
+      return console.error("Bad recognizer output:", line);
+    }
+    if (msg.status === "ready") return console.log("Recognition worker ready");
+
+    finishRecognition(msg.id, msg);
+  });
+
+  // spawn failures (python3 missing) and a dead worker's pipe come as 'error' events, unhandled they crash the server
+  const workerGone = (error) => {
+    if (recognizer === worker) {
+      recognizer = null;
+      // crashing right after starting again (bad install, broken database) shouldn't respawn python on every upload
+      restartDelayMs = Date.now() - startedAt >= WORKER_STABLE_MS ? 0
+        : Math.min(RESTART_BACKOFF_MAX_MS, Math.max(RESTART_BACKOFF_MIN_MS, restartDelayMs * 2));
+      restartAfter = Date.now() + restartDelayMs;
+    }
+    if (worker.exitCode === null) worker.kill();
+    failRecognitions(worker, error);
+  };
+
+  worker.on("error", (err) => {
+    console.error("Recognition worker failed:", err.message);
+    workerGone("Recognition worker failed to run");
+  });
+
+  worker.stdin.on("error", (err) => {
+    console.error("Could not write to recognition worker:", err.message);
+    workerGone("Recognition worker is not reachable");
+  });
+
+  worker.on("exit", (code) => {
+    console.error("Recognition worker exited with code", code);
+    workerGone("Recognition worker exited");
+  });
+}
+
+// same result codes as running final_main.py directly: ok / no_card / error
+// plus rejected (worker queue full) and timeout (waited too long in the queue), see recognition_service.py
+// and unavailable (worker crashed, waiting to restart it)
+function recognizeCard(imagePath, outputJson, callback, priority = "interactive") {
+  if (!recognizer) {
+    if (Date.now() < restartAfter) {
+      return callback({ status: "unavailable", error: "Recognition worker is restarting" });
+    }
+    startRecognizer();
+  }
+  const id = crypto.randomBytes(8).toString("hex");
+  const timer = setTimeout(() => { //a worker that hangs without exiting mustn't keep the upload open forever
+    console.error("Recognition timed out:", imagePath);
+    finishRecognition(id, { status: "error", error: "Recognition timed out" });
+  }, RECOGNITION_TIMEOUT_MS);
+  const worker = recognizer;
+  pendingRecognitions.set(id, { callback, timer, worker });
+  const request = JSON.stringify({ id, image_path: imagePath, output_json: outputJson, priority }) + "\n";
+  // a worker that failed to start / already died: its stdin errors, the request fails instead of the server
+  if (!worker.stdin.writable) {
+    return finishRecognition(id, { status: "error", error: "Recognition worker is not reachable" });
+  }
+  worker.stdin.write(request, (err) => {
+    if (err) finishRecognition(id, { status: "error", error: "Recognition worker is not reachable" });
+  });
+}
+
+startRecognizer();
+
 //connect to MySQL, info below
 const db = mysql.createConnection({
   host: "127.0.0.1",
@@ -154,7 +257,7 @@ app.post("/login", (req, res) => {
 
 
 
-//uploading logic, should disallow any uploads while one card is being uploaded already
+//uploading logic, the python worker queues uploads (limited concurrency) and rejects them when it's backed up
 app.post("/upload", upload.single("cardImage"), (req, res) => {
   const filePath = path.resolve(req.file.path);
   console.log("Received image:", filePath); //see if image was sent to backend
@@ -169,21 +272,33 @@ app.post("/upload", upload.single("cardImage"), (req, res) => {
 
   const jsonPath = path.join(jobDir, "detected_card.json"); //make the path
 
-  // first, run Python predictor
-  execFile("python3", [path.join(__dirname, "image_model", "final_main.py"), filePath, jsonPath], (pyErr, pyOut, pyErrOut) => { //file path to the code
-    if (pyErr) {
-      // if predictor exited with code 3 then there was no detection
-      if (pyErr.code === 3) {
+  // first, run Python predictor (warm worker, writes the same json final_main.py does)
+  recognizeCard(filePath, jsonPath, (pyResult) => {
+    if (pyResult.status !== "ok") {
+      // no_card is the same as final_main.py exiting with code 3
+      if (pyResult.status === "no_card") {
         console.error("No card detected in image.");
         fs.rm(jobDir, { recursive: true, force: true }, () => { });
         return res.status(400).json({ error: "No card detected" });
       }
-      console.error("Python error:", pyErrOut || pyErr.message);
+      if (pyResult.status === "rejected" || pyResult.status === "timeout") { //too many uploads at once, try again later
+        console.error("Recognition queue busy:", pyResult.error);
+        fs.rm(jobDir, { recursive: true, force: true }, () => { });
+        res.set("Retry-After", "5");
+        return res.status(pyResult.status === "rejected" ? 429 : 503).json({ error: "Too many uploads right now, try again shortly" });
+      }
+      if (pyResult.status === "unavailable") { //worker keeps crashing, backing off before the next restart
+        console.error("Recognition worker unavailable:", pyResult.error);
+        fs.rm(jobDir, { recursive: true, force: true }, () => { });
+        res.set("Retry-After", String(Math.max(1, Math.ceil((restartAfter - Date.now()) / 1000))));
+        return res.status(503).json({ error: "Card recognition is temporarily unavailable, try again shortly" });
+      }
+      console.error("Python error:", pyResult.error);
       fs.rm(jobDir, { recursive: true, force: true }, () => { });
       return res.status(500).json({ error: "Python processing failed" });
     }
 
-    console.log("Python output:", pyOut);
+    console.log("Python output:", pyResult.card);
 
     // checking the JSON for this job exists
     if (!fs.existsSync(jsonPath)) {